@@ -1,13 +1,43 @@
 import requests
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import asyncio
+import base64
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
+import multiprocessing
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from threading import Condition, Lock
+import hmac
 import os
+import re
+import secrets
+import signal
+import struct
+import uuid
+import zlib
+from array import array
 from datetime import datetime, timedelta
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import PoolError
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
+    BasePersistence,
+    BaseUpdateProcessor,
+    PersistenceInput,
+    PicklePersistence,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
@@ -18,8 +48,14 @@ from telegram.ext import (
 
 # Environment variables
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Point at a local Bot API server or a stub for load tests, e.g. http://127.0.0.1:8081/bot
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL')
 DATABASE_URL = os.getenv('DATABASE_URL')
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
+# Extra people allowed to work the review queue, comma separated
+REVIEWER_IDS = {ADMIN_ID} | {int(x) for x in os.getenv('REVIEWER_IDS', '').split(',') if x.strip()}
+# Seconds a reviewer's claim on a submission lasts without activity
+REVIEW_LEASE_SECONDS = int(os.getenv('REVIEW_LEASE_SECONDS', 600))
 
 # Conversation states - User
 STORY_TYPE, WALLET, CONTRACT, AMOUNT, STORY, CONFIRM = range(6)
@@ -50,45 +86,523 @@ REJECTION_REASONS = {
     'multiaccounts': '👤 Multiple Account Abuse'
 }
 
-# Database connection
-def get_db():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+# ==================== CALLBACK DATA ====================
+# Buttons carry a compact token instead of "review_approve_123" strings:
+# base64url(version, tag, varint fields..., 4-byte HMAC). Fields are either
+# an index into a choice tuple or a non-negative int.
+# Tags and choice order are part of the wire format - only ever append.
+CALLBACK_VERSION = 1
+CALLBACK_SECRET = (os.getenv('CALLBACK_SECRET') or f"callback:{BOT_TOKEN}").encode()
+CALLBACK_MAC_BYTES = 4
+# Telegram rejects callback_data longer than this many bytes
+CALLBACK_DATA_LIMIT = 64
+# Unsigned "review_approve_123" data is accepted until this UTC time
+# (ISO format), so buttons sent before the switch keep working for a
+# deploy window. Unset means never.
+CALLBACK_LEGACY_UNTIL = os.getenv('CALLBACK_LEGACY_UNTIL')
+CALLBACK_LEGACY_UNTIL = datetime.fromisoformat(CALLBACK_LEGACY_UNTIL) if CALLBACK_LEGACY_UNTIL else None
 
-# Initialize database
-def init_db():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
+CALLBACK_SCHEMAS = {
+    'type': (1, (('rekt', 'moon'),)),
+    'confirm': (2, (('yes', 'no', 'back'),)),
+    'review': (3, (('approve', 'reject', 'skip', 'back'), int)),
+    'reject': (4, (tuple(REJECTION_REASONS), int)),
+    'score': (5, (tuple(CRITERIA), int)),
+    'scoring': (6, (('back', 'cancel', 'confirm', 'redo'),)),
+    'broadcast': (7, (('send', 'cancel'),)),
+}
+CALLBACK_NAMES = {tag: name for name, (tag, _) in CALLBACK_SCHEMAS.items()}
+
+def _callback_mac(body):
+    return hmac.new(CALLBACK_SECRET, body, hashlib.sha256).digest()[:CALLBACK_MAC_BYTES]
+
+def encode_callback(name, *values):
+    tag, fields = CALLBACK_SCHEMAS[name]
+    if len(values) != len(fields):
+        raise ValueError(f"callback {name} takes {len(fields)} values")
+    body = bytearray((CALLBACK_VERSION, tag))
+    for field, value in zip(fields, values):
+        n = value if field is int else field.index(value)
+        if n < 0:
+            raise ValueError(f"callback {name} value out of range: {value}")
+        # LEB128 varint
+        while n >= 0x80:
+            body.append((n & 0x7F) | 0x80)
+            n >>= 7
+        body.append(n)
+    body += _callback_mac(bytes(body))
+    data = base64.urlsafe_b64encode(bytes(body)).rstrip(b'=').decode()
+    if len(data) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback {name} data is {len(data)} bytes, over {CALLBACK_DATA_LIMIT}")
+    return data
+
+def _decode_compact(data):
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (ValueError, TypeError):
+        return None
+    body, mac = raw[:-CALLBACK_MAC_BYTES], raw[-CALLBACK_MAC_BYTES:]
+    if len(body) < 2 or body[0] != CALLBACK_VERSION:
+        return None
+    if not hmac.compare_digest(mac, _callback_mac(body)):
+        return None
+    name = CALLBACK_NAMES.get(body[1])
+    if name is None:
+        return None
+    values = [name]
+    pos = 2
+    for field in CALLBACK_SCHEMAS[name][1]:
+        n = shift = 0
+        while True:
+            if pos >= len(body):
+                return None
+            b = body[pos]
+            pos += 1
+            n |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                break
+        if field is not int:
+            if n >= len(field):
+                return None
+            n = field[n]
+        values.append(n)
+    if pos != len(body):
+        return None
+    return tuple(values)
+
+# "review_approve_123" style data from before the compact format
+def _decode_legacy(data):
+    parts = data.split('_')
+    if parts[0] == 'score' and len(parts) == 2:
+        parts[0] = 'scoring'
+    schema = CALLBACK_SCHEMAS.get(parts[0])
+    if schema is None or len(parts) != len(schema[1]) + 1:
+        return None
+    values = [parts[0]]
+    for field, part in zip(schema[1], parts[1:]):
+        if field is int:
+            if not part.isdigit():
+                return None
+            values.append(int(part))
+        elif part in field:
+            values.append(part)
+        else:
+            return None
+    return tuple(values)
+
+@lru_cache(maxsize=4096)
+def _decode_cached(data):
+    return _decode_compact(data), _decode_legacy(data)
+
+# (name, *values) or None for anything forged, stale or unknown. Cached, so
+# the route check and the handler can both call it for one click; the
+# legacy cutoff is checked on every call.
+def decode_callback(data):
+    if not data:
+        return None
+    compact, legacy = _decode_cached(data)
+    if compact is None and legacy is not None and CALLBACK_LEGACY_UNTIL and datetime.utcnow() < CALLBACK_LEGACY_UNTIL:
+        return legacy
+    return compact
+
+# CallbackQueryHandler pattern matching one callback type
+def callback_pattern(name):
+    def check(data):
+        decoded = decode_callback(data) if isinstance(data, str) else None
+        return decoded is not None and decoded[0] == name
+    return check
+
+# ==================== KEYBOARDS & TEMPLATES ====================
+# Built once at import. Telegram objects are frozen after construction, so
+# the same markup can be handed to every send/edit without copying.
+
+SCORE_VALUES = (200, 400, 600, 800, 1000)
+
+STORY_TYPE_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📉 REKT Story", callback_data=encode_callback('type', 'rekt')),
+        InlineKeyboardButton("🚀 MOON Story", callback_data=encode_callback('type', 'moon'))
+    ]
+])
+
+CONFIRM_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ Submit", callback_data=encode_callback('confirm', 'yes')),
+        InlineKeyboardButton("❌ Cancel", callback_data=encode_callback('confirm', 'no'))
+    ],
+    [InlineKeyboardButton("⬅️ Edit Story", callback_data=encode_callback('confirm', 'back'))]
+])
+
+SCORE_SUMMARY_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ Confirm", callback_data=encode_callback('scoring', 'confirm')),
+        InlineKeyboardButton("🔄 Redo", callback_data=encode_callback('scoring', 'redo'))
+    ],
+    [InlineKeyboardButton("❌ Cancel", callback_data=encode_callback('scoring', 'cancel'))]
+])
+
+BROADCAST_CONFIRM_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📣 Send", callback_data=encode_callback('broadcast', 'send')),
+        InlineKeyboardButton("❌ Cancel", callback_data=encode_callback('broadcast', 'cancel'))
+    ]
+])
+
+# One score keyboard per criterion; the first has no Back button
+SCORE_KEYBOARDS = {}
+SCORE_PROMPTS = {}
+for _i, _criteria in enumerate(CRITERIA):
+    _controls = [InlineKeyboardButton("❌ Cancel", callback_data=encode_callback('scoring', 'cancel'))]
+    if _i > 0:
+        _controls.insert(0, InlineKeyboardButton("⬅️ Back", callback_data=encode_callback('scoring', 'back')))
+    SCORE_KEYBOARDS[_criteria] = InlineKeyboardMarkup([
+        [InlineKeyboardButton(str(v), callback_data=encode_callback('score', _criteria, v)) for v in SCORE_VALUES],
+        _controls
+    ])
+    SCORE_PROMPTS[_criteria] = (
+        f" ({_i + 1}/{len(CRITERIA)})\n\n{CRITERIA_NAMES[_criteria]}:\n\nSelect score (200-1000):"
+    )
+
+def score_prompt(submission_id, criteria):
+    return f"📊 SCORING #{submission_id}" + SCORE_PROMPTS[criteria]
+
+# Review and rejection keyboards only vary by submission id
+@lru_cache(maxsize=1024)
+def review_keyboard(submission_id):
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("✅ Approve", callback_data=encode_callback('review', 'approve', submission_id)),
+            InlineKeyboardButton("❌ Reject", callback_data=encode_callback('review', 'reject', submission_id))
+        ],
+        [InlineKeyboardButton("⏭️ Skip", callback_data=encode_callback('review', 'skip', submission_id))]
+    ])
+
+@lru_cache(maxsize=256)
+def rejection_keyboard(submission_id):
+    keyboard = [
+        [InlineKeyboardButton(reason, callback_data=encode_callback('reject', key, submission_id))]
+        for key, reason in REJECTION_REASONS.items()
+    ]
+    keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data=encode_callback('review', 'back', submission_id))])
+    return InlineKeyboardMarkup(keyboard)
+
+# Welcome text, split around the only part that changes
+WELCOME_HEAD = """🎭 Welcome to Rekterapy Story Submission
+
+🏆 WIN 5000 STARS WEEKLY!
+
+Submit your best crypto story - wins or losses!
+
+⏰ Week closes in: """
+
+WELCOME_TAIL = """
+
+✅ What Makes a Winning Story:
+- Authentic & verifiable (we check on-chain!)
+- Emotional impact & lessons learned  
+- Specific details (dates, amounts, tx hash)
+- Helps the community learn
+
+⚠️ INSTANT BAN for:
+- Fake stories or stolen content
+- Wrong wallet/CA addresses
+- Multiple accounts or spam
+- AI-generated content
+
+📝 Scoring (Max 5000 Moondust):
+- Authenticity: up to 1000
+- Emotional Impact: up to 1000
+- Lesson Learned: up to 1000
+- Detail Quality: up to 1000
+- Storytelling: up to 1000
+
+💡 Commands: /cancel to exit, /back to go back
+
+Choose your story type:"""
+
+SUBMISSIONS_CLOSED_TEXT = (
+    "⏰ Submissions are closed!\n\n"
+    "Saturday is review day. Winners announced at 20:00 UTC.\n\n"
+    "New week starts Sunday 00:00 UTC. Come back then! 🙏"
+)
+
+ALREADY_SUBMITTED_TEXT = (
+    "⏰ You've already submitted a story today!\n\n"
+    "One submission per account per 24 hours.\n\n"
+    "Come back tomorrow to share another story! 🙏"
+)
+
+REKT_PROMPT = "📉 REKT STORY SUBMISSION\n\nLet's document your loss for the community.\n\nFirst, what's your wallet address?\n\n(/cancel to exit | /back to go back)"
+MOON_PROMPT = "🚀 MOON STORY SUBMISSION\n\nLet's celebrate your win!\n\nFirst, what's your wallet address?\n\n(/cancel to exit | /back to go back)"
+
+# Database executor - psycopg2 is blocking, so every query from a handler
+# runs on this bounded pool instead of on the event loop
+DB_MAX_WORKERS = int(os.getenv('DB_MAX_WORKERS', 8))
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix='db')
+
+# Connection pool sizing - keep DB_POOL_MAX within Postgres max_connections
+# (and at least DB_MAX_WORKERS so executor threads never queue on the pool)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', DB_MAX_WORKERS))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+# Idle connections older than this are pinged with SELECT 1 on checkout
+DB_POOL_CHECK_IDLE = float(os.getenv('DB_POOL_CHECK_IDLE', 30))
+
+# Remembers which statements have been prepared on this session
+class PreparingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class DBPool:
+    def __init__(self, dsn, minconn, maxconn, timeout=10, check_idle=30):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._idle = []  # (conn, returned_at)
+        self._size = 0
+        self._cond = Condition()
+        # Metrics
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.checkout_max = 0.0
+        self.discarded = 0
+        self.timeouts = 0
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, connection_factory=PreparingConnection, cursor_factory=RealDictCursor)
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    # Open the minimum number of connections up front
+    def fill(self):
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolError(f"No database connection free after {self.timeout}s")
+                    self.waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, returned_at):
+                self._discard(conn)
+                continue
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self.checkouts += 1
+                self.checkout_seconds += elapsed
+                self.checkout_max = max(self.checkout_max, elapsed)
+            return conn
+
+    def putconn(self, conn):
+        if conn.closed:
+            self._discard(conn)
+            return
+        # Never hand out a connection with an open transaction
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self.waiting,
+                'max': self.maxconn,
+                'checkouts': self.checkouts,
+                'checkout_avg_ms': (self.checkout_seconds / self.checkouts * 1000) if self.checkouts else 0.0,
+                'checkout_max_ms': self.checkout_max * 1000,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts
+            }
+
+DB_POOL = DBPool(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_CHECK_IDLE)
+
+# Database connection - checked out from the pool and returned on exit
+@contextmanager
+def db_conn():
+    conn = DB_POOL.getconn()
+    try:
+        yield conn
+    finally:
+        DB_POOL.putconn(conn)
+
+# Hot read queries, parsed and planned once per pooled connection.
+# name -> (parameter types, SQL using $n placeholders; no % signs)
+PREPARED_STATEMENTS = {
+    # Everything /mystats shows apart from the rank, in one round trip
+    'user_stats': (('bigint',), '''
+        SELECT
+            COALESCE((SELECT total_moondust FROM users WHERE telegram_id = $1), 0) AS total_moondust,
+            s.total + COALESCE(a.total, 0) AS total,
+            s.approved + COALESCE(a.approved, 0) AS approved,
+            s.rejected + COALESCE(a.rejected, 0) AS rejected,
+            s.pending,
+            (SELECT COUNT(*) FROM champions WHERE user_id = $1) AS wins
+        FROM (
+            SELECT
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE status = 'approved') AS approved,
+                COUNT(*) FILTER (WHERE status = 'rejected') AS rejected,
+                COUNT(*) FILTER (WHERE status = 'pending') AS pending
+            FROM submissions WHERE user_id = $1
+        ) s
+        LEFT JOIN archived_user_stats a ON a.user_id = $1
+    ''')
+}
+
+# The first use on a connection sends PREPARE and EXECUTE together, so it
+# costs no extra round trip
+def execute_prepared(cursor, name, params):
+    placeholders = ', '.join(['%s'] * len(params))
+    execute = f"EXECUTE {name} ({placeholders})"
+    prepared = cursor.connection.prepared
+    if name in prepared:
+        cursor.execute(execute, params)
+        return
+    types, sql = PREPARED_STATEMENTS[name]
+    try:
+        cursor.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}; {execute}", params)
+    except Exception:
+        # Unknown whether PREPARE went through; let the pool drop this session
+        cursor.connection.close()
+        raise
+    prepared.add(name)
+
+# run_db() calls made while handling the current update, a one-item list
+# so tasks the handlers spawn count towards it too. Set by the update processor.
+UPDATE_DB_CALLS = contextvars.ContextVar('update_db_calls', default=None)
+
+# Run a blocking database helper without stalling the event loop
+async def run_db(func, *args):
+    loop = asyncio.get_running_loop()
+    metrics = DB_METRICS.get(func.__name__)
+    calls = UPDATE_DB_CALLS.get()
+    if calls is not None:
+        calls[0] += 1
+    DB_METRICS.in_flight += 1
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(DB_EXECUTOR, func, *args)
+    except Exception:
+        metrics.errors += 1
+        raise
+    finally:
+        metrics.observe(time.perf_counter() - start)
+        DB_METRICS.in_flight -= 1
+
+# A naive timestamp column written with CURRENT_TIMESTAMP, in UTC like the
+# competition calendar
+def utc_sql(column):
+    return f"({column}::timestamptz AT TIME ZONE 'UTC')"
+
+# ISO year that goes with a stored ISO week number: the ISO year of the UTC
+# timestamp, moved to the neighbouring year when the week number only fits
+# there, e.g. a week 52 champion announced in January
+def iso_year_sql(column, week_column):
+    utc = utc_sql(column)
+    return f'''CASE
+        WHEN {week_column} >= 52 AND EXTRACT(WEEK FROM {utc}) <= 1 THEN EXTRACT(ISOYEAR FROM {utc}) - 1
+        WHEN {week_column} <= 1 AND EXTRACT(WEEK FROM {utc}) >= 52 THEN EXTRACT(ISOYEAR FROM {utc}) + 1
+        ELSE EXTRACT(ISOYEAR FROM {utc})
+    END'''
+
+# Schema migrations - (version, name, statements), applied in order once each.
+# Never edit an applied migration; append a new one instead.
+MIGRATIONS = [
+    (1, 'base tables', [
+        '''
         CREATE TABLE IF NOT EXISTS users (
             telegram_id BIGINT PRIMARY KEY,
             username VARCHAR(255),
             total_moondust BIGINT DEFAULT 0,
             joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    
-    # Add missing columns to existing submissions table
-    alter_statements = [
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS week_number INT",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS rejection_reason VARCHAR(100)",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_authenticity INT DEFAULT 0",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_emotional INT DEFAULT 0",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_lesson INT DEFAULT 0",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_detail INT DEFAULT 0",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_storytelling INT DEFAULT 0",
-        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS total_moondust INT DEFAULT 0"
-    ]
-    
-    for stmt in alter_statements:
-        try:
-            cursor.execute(stmt)
-        except Exception as e:
-            print(f"Column may already exist: {e}")
-    
-    # Submissions table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS submissions (
             id SERIAL PRIMARY KEY,
             user_id BIGINT NOT NULL,
@@ -110,10 +624,8 @@ def init_db():
             submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             reviewed_at TIMESTAMP
         )
-    ''')
-    
-    # Champions table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS champions (
             id SERIAL PRIMARY KEY,
             week_number INT UNIQUE,
@@ -124,193 +636,2601 @@ def init_db():
             total_moondust INT,
             announced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
+        '''
+    ]),
+    # Columns added after the first deploy - no-ops on databases created by migration 1
+    (2, 'submission review columns', [
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS week_number INT",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS rejection_reason VARCHAR(100)",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_authenticity INT DEFAULT 0",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_emotional INT DEFAULT 0",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_lesson INT DEFAULT 0",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_detail INT DEFAULT 0",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS score_storytelling INT DEFAULT 0",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS total_moondust INT DEFAULT 0"
+    ]),
+    (3, 'submission indexes', [
+        # check_user_rate_limit, get_user_stats
+        "CREATE INDEX IF NOT EXISTS idx_submissions_user_submitted ON submissions (user_id, submitted_at)",
+        # check_wallet_rate_limit
+        "CREATE INDEX IF NOT EXISTS idx_submissions_wallet_submitted ON submissions (LOWER(wallet_address), submitted_at)",
+        # count_week_submissions, get_admin_status, set_week_champion
+        "CREATE INDEX IF NOT EXISTS idx_submissions_week_status_score ON submissions (week_number, status, total_moondust DESC, submitted_at)",
+        # get_admin_status
+        "CREATE INDEX IF NOT EXISTS idx_submissions_status_submitted ON submissions (status, submitted_at)",
+        # get_user_stats champion wins
+        "CREATE INDEX IF NOT EXISTS idx_champions_user ON champions (user_id)"
+    ]),
+    (4, 'bot persistence', [
+        '''
+        CREATE TABLE IF NOT EXISTS bot_persistence (
+            kind VARCHAR(20) NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            data TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, name, key)
+        )
+        '''
+    ]),
+    (5, 'outbound messages', [
+        '''
+        CREATE TABLE IF NOT EXISTS outbound_messages (
+            id VARCHAR(32) PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup TEXT,
+            status VARCHAR(20) DEFAULT 'pending',
+            attempts INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_outbound_messages_status ON outbound_messages (status, created_at)"
+    ]),
+    (6, 'broadcasts', [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMP",
+        '''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id SERIAL PRIMARY KEY,
+            text TEXT NOT NULL,
+            status VARCHAR(20) DEFAULT 'running',
+            total INT DEFAULT 0,
+            sent INT DEFAULT 0,
+            failed INT DEFAULT 0,
+            blocked INT DEFAULT 0,
+            last_user_id BIGINT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        '''
+    ]),
+    # Keyset pagination for the review queue - only pending rows are indexed
+    (7, 'pending review index', [
+        "CREATE INDEX IF NOT EXISTS idx_submissions_pending_queue ON submissions (submitted_at, id) WHERE status = 'pending'"
+    ]),
+    (8, 'review claims', [
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS claimed_by BIGINT",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS reviewed_by BIGINT",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_reviewed_by ON submissions (reviewed_by, reviewed_at)"
+    ]),
+    # Every moondust change is one ledger row; users.total_moondust is the
+    # running sum. review_round is bumped by /undo so a re-approval gets a new key.
+    (9, 'moondust ledger', [
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS review_round INT NOT NULL DEFAULT 0",
+        '''
+        CREATE TABLE IF NOT EXISTS moondust_ledger (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            submission_id INT,
+            review_round INT NOT NULL DEFAULT 0,
+            action VARCHAR(20) NOT NULL,
+            amount INT NOT NULL,
+            created_by BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (submission_id, review_round, action)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_moondust_ledger_user ON moondust_ledger (user_id)",
+        # Backfill awards for stories approved before the ledger existed
+        '''
+        INSERT INTO moondust_ledger (user_id, submission_id, review_round, action, amount, created_by, created_at)
+        SELECT user_id, id, review_round, 'award', total_moondust, reviewed_by, COALESCE(reviewed_at, submitted_at)
+        FROM submissions
+        WHERE status = 'approved' AND total_moondust <> 0
+        ON CONFLICT (submission_id, review_round, action) DO NOTHING
+        '''
+    ]),
+    # Detected address formats; NULL until /revalidate has seen the row
+    (10, 'address formats', [
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS wallet_chain VARCHAR(20)",
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS contract_chain VARCHAR(20)"
+    ]),
+    # Weeks become (week_year, week_number). Existing rows keep the ISO week
+    # they were filed under. submissions is rebuilt as a table partitioned by
+    # week, so weekly queries touch one partition and old weeks can be detached.
+    # The primary key has to include the partition key, so id is only unique
+    # per partition. It stays unique overall because every id comes from
+    # submissions_id_seq, and rows only ever move between partitions (default
+    # adoption, archive and restore), they are never copied.
+    (11, 'week partitions', [
+        "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS week_year INT",
+        f"UPDATE submissions SET week_number = EXTRACT(WEEK FROM {utc_sql('submitted_at')}) WHERE week_number IS NULL",
+        f"UPDATE submissions SET week_year = {iso_year_sql('submitted_at', 'week_number')} WHERE week_year IS NULL",
+        "ALTER TABLE champions ADD COLUMN IF NOT EXISTS week_year INT",
+        # A champion belongs to its story's week, however late it was announced
+        '''
+        UPDATE champions c SET week_year = s.week_year
+        FROM submissions s
+        WHERE s.id = c.submission_id AND s.week_number = c.week_number AND c.week_year IS NULL
+        ''',
+        f"UPDATE champions SET week_year = {iso_year_sql('announced_at', 'week_number')} WHERE week_year IS NULL",
+        "ALTER TABLE champions DROP CONSTRAINT IF EXISTS champions_week_number_key",
+        "ALTER TABLE champions ADD CONSTRAINT champions_week_key UNIQUE (week_year, week_number)",
+        "ALTER TABLE submissions RENAME TO submissions_unpartitioned",
+        "CREATE TABLE submissions (LIKE submissions_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (week_year, week_number)",
+        "ALTER TABLE submissions ALTER COLUMN week_year SET NOT NULL",
+        "ALTER TABLE submissions ALTER COLUMN week_number SET NOT NULL",
+        "ALTER TABLE submissions ADD CONSTRAINT submissions_week_pkey PRIMARY KEY (id, week_year, week_number)",
+        "ALTER SEQUENCE submissions_id_seq OWNED BY submissions.id",
+        '''
+        DO $$
+        DECLARE w RECORD;
+        BEGIN
+            FOR w IN SELECT DISTINCT week_year, week_number FROM submissions_unpartitioned LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF submissions FOR VALUES FROM (%s, %s) TO (%s, %s)',
+                    'submissions_' || w.week_year || '_w' || lpad(w.week_number::text, 2, '0'),
+                    w.week_year, w.week_number, w.week_year, w.week_number + 1
+                );
+            END LOOP;
+        END $$
+        ''',
+        # Catches rows for a week whose partition wasn't created in time
+        "CREATE TABLE submissions_default PARTITION OF submissions DEFAULT",
+        "INSERT INTO submissions SELECT * FROM submissions_unpartitioned",
+        "DROP TABLE submissions_unpartitioned",
+        # Indexes from migrations 3, 7 and 8, rebuilt on the partitioned table
+        "CREATE INDEX IF NOT EXISTS idx_submissions_user_submitted ON submissions (user_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_wallet_submitted ON submissions (LOWER(wallet_address), submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_week_status_score ON submissions (week_year, week_number, status, total_moondust DESC, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_status_submitted ON submissions (status, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_pending_queue ON submissions (submitted_at, id) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_reviewed_by ON submissions (reviewed_by, reviewed_at)"
+    ]),
+    # Catalog of weeks moved out to archive files, and the per-user counts
+    # those rows took with them
+    (12, 'archive', [
+        '''
+        CREATE TABLE IF NOT EXISTS archived_weeks (
+            week_year INT NOT NULL,
+            week_number INT NOT NULL,
+            path TEXT NOT NULL,
+            row_count INT NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            min_id INT,
+            max_id INT,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (week_year, week_number)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS archived_user_stats (
+            user_id BIGINT PRIMARY KEY,
+            total INT NOT NULL DEFAULT 0,
+            approved INT NOT NULL DEFAULT 0,
+            rejected INT NOT NULL DEFAULT 0
+        )
+        '''
+    ])
+]
+
+# Arbitrary key so two instances booting at once don't race on migrations
+MIGRATION_LOCK_ID = 5150001
+
+# Apply any migrations not yet recorded in schema_migrations
+def run_migrations(conn, migrations=MIGRATIONS):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
     ''')
-    
     conn.commit()
-    conn.close()
+    
+    cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        cursor.execute('SELECT version FROM schema_migrations')
+        applied = {row['version'] for row in cursor.fetchall()}
+        conn.commit()
+        
+        for version, name, statements in migrations:
+            if version in applied:
+                continue
+            try:
+                for stmt in statements:
+                    cursor.execute(stmt)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"Migration {version} ({name}) failed")
+                raise
+            print(f"Applied migration {version}: {name}")
+    finally:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        conn.commit()
 
-# Get current week number
-def get_week_number():
-    now = datetime.utcnow()
-    return now.isocalendar()[1]
+# Initialize database
+def init_db():
+    with db_conn() as conn:
+        run_migrations(conn)
+
+# Competition calendar. A week opens Sunday 00:00 UTC, closes at Saturday
+# 00:00 (Saturday is review day) and is keyed by the ISO (year, week) of its
+# Monday, so the opening Sunday already belongs to it and keys never repeat
+# across years.
+Week = namedtuple('Week', ['iso_year', 'week'])
+CompetitionWeek = namedtuple('CompetitionWeek', ['key', 'opens_at', 'closes_at', 'ends_at'])
+# Weeks of boundaries precomputed around now (one year back, four ahead)
+CALENDAR_WEEKS = 260
+
+class CompetitionCalendar:
+    def __init__(self):
+        self._starts = []
+        self._weeks = []
+
+    # Sunday 00:00 on or before `when`
+    @staticmethod
+    def week_start(when):
+        day = datetime(when.year, when.month, when.day)
+        return day - timedelta(days=(day.weekday() + 1) % 7)
+
+    def _build(self, around):
+        first = self.week_start(around) - timedelta(weeks=52)
+        self._starts = [first + timedelta(weeks=i) for i in range(CALENDAR_WEEKS)]
+        self._weeks = []
+        for opens_at in self._starts:
+            iso = (opens_at + timedelta(days=1)).isocalendar()
+            self._weeks.append(CompetitionWeek(
+                Week(iso[0], iso[1]),
+                opens_at,
+                opens_at + timedelta(days=6),
+                opens_at + timedelta(days=7)
+            ))
+
+    def at(self, when=None):
+        when = when or datetime.utcnow()
+        i = bisect_right(self._starts, when) - 1
+        if i < 0 or when >= self._weeks[i].ends_at:
+            self._build(when)
+            i = bisect_right(self._starts, when) - 1
+        return self._weeks[i]
+
+CALENDAR = CompetitionCalendar()
+
+def current_week():
+    return CALENDAR.at().key
+
+# "42 (2026)" - week numbers alone repeat every year
+def format_week(iso_year, week):
+    return f"{week} ({iso_year})"
 
 # Check if submissions are open (Sunday 00:00 - Friday 23:59 UTC)
 def is_submissions_open():
     now = datetime.utcnow()
-    # Monday = 0, Sunday = 6
-    # Open: Sunday (6) 00:00 to Friday (4) 23:59
-    if now.weekday() == 5:  # Saturday - closed for review
-        return False
-    return True
+    week = CALENDAR.at(now)
+    return week.opens_at <= now < week.closes_at
 
-# Get time until submissions close
+# Get time until submissions close (this week's, or next week's on Saturday)
 def get_time_until_close():
     now = datetime.utcnow()
-    # Find next Friday 23:59
-    days_until_friday = (4 - now.weekday()) % 7
-    if days_until_friday == 0 and now.hour >= 23 and now.minute >= 59:
-        days_until_friday = 7
-    close_time = now.replace(hour=23, minute=59, second=0) + timedelta(days=days_until_friday)
-    diff = close_time - now
+    week = CALENDAR.at(now)
+    if now >= week.closes_at:
+        week = CALENDAR.at(week.ends_at)
+    diff = week.closes_at - now
     return diff.days, diff.seconds // 3600
 
-# Ensure user exists
+# Weeks known to have a committed submissions partition. Callers add to it
+# only after their transaction commits.
+WEEK_PARTITIONS = set()
+
+def week_partition_name(week):
+    return f"submissions_{week.iso_year}_w{week.week:02d}"
+
+# Create the week's partition inside the caller's transaction. True if the
+# week has its own partition afterwards. If rows for the week already sit in
+# submissions_default, Postgres won't carve the range out of it until they
+# are moved. Only the scheduled job does that (adopt=True); inserts leave
+# the partition alone and land in the default partition meanwhile.
+def ensure_week_partition(cursor, week, adopt=False):
+    if week in WEEK_PARTITIONS:
+        return True
+    table = week_partition_name(week)
+    bounds = (week.iso_year, week.week, week.iso_year, week.week + 1)
+    # Serialise concurrent first inserts of a week
+    cursor.execute('SELECT pg_advisory_xact_lock(%s)', (week.iso_year * 100 + week.week,))
+    cursor.execute('SELECT to_regclass(%s) AS rel', (table,))
+    if cursor.fetchone()['rel'] is not None:
+        return True
+    cursor.execute(
+        'SELECT 1 FROM submissions_default WHERE week_year = %s AND week_number = %s LIMIT 1',
+        week
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"CREATE TABLE {table} PARTITION OF submissions FOR VALUES FROM (%s, %s) TO (%s, %s)",
+            bounds
+        )
+        return True
+    if not adopt:
+        return False
+    cursor.execute(f"CREATE TABLE {table} (LIKE submissions INCLUDING DEFAULTS)")
+    cursor.execute(f'''
+        WITH moved AS (
+            DELETE FROM submissions_default WHERE week_year = %s AND week_number = %s
+            RETURNING *
+        )
+        INSERT INTO {table} SELECT * FROM moved
+    ''', week)
+    cursor.execute(
+        f"ALTER TABLE submissions ATTACH PARTITION {table} FOR VALUES FROM (%s, %s) TO (%s, %s)",
+        bounds
+    )
+    return True
+
+# Scheduled: create this week's and next week's partitions ahead of the
+# first insert, and give every week stranded in submissions_default its own
+def ensure_week_partitions():
+    this_week = CALENDAR.at()
+    weeks = [this_week.key, CALENDAR.at(this_week.ends_at).key]
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT week_year, week_number FROM submissions_default')
+        weeks += [Week(row['week_year'], row['week_number']) for row in cursor.fetchall()]
+        for week in weeks:
+            ensure_week_partition(cursor, week, adopt=True)
+        conn.commit()
+    WEEK_PARTITIONS.update(weeks)
+
+WEEK_PARTITION_INTERVAL = int(os.getenv('WEEK_PARTITION_INTERVAL', 3600))
+
+async def maintain_week_partitions():
+    while True:
+        await asyncio.sleep(WEEK_PARTITION_INTERVAL)
+        try:
+            await run_db(ensure_week_partitions)
+        except Exception as e:
+            print(f"Week partition maintenance failed: {e}")
+
+# Ensure user exists. Talking to the bot again means they unblocked it.
 def ensure_user(user_id, username):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO users (telegram_id, username)
-        VALUES (%s, %s)
-        ON CONFLICT (telegram_id) DO UPDATE SET username = %s
-    ''', (user_id, username, username))
-    conn.commit()
-    conn.close()
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO users (telegram_id, username)
+            VALUES (%s, %s)
+            ON CONFLICT (telegram_id) DO UPDATE SET username = %s, blocked_at = NULL
+        ''', (user_id, username, username))
+        conn.commit()
 
 # Check rate limit by Telegram user ID
 def check_user_rate_limit(user_id):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*) as count 
-        FROM submissions 
-        WHERE user_id = %s 
-        AND submitted_at > %s
-    ''', (user_id, datetime.now() - timedelta(days=1)))
-    result = cursor.fetchone()
-    conn.close()
-    return result['count'] > 0
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) as count 
+            FROM submissions 
+            WHERE user_id = %s 
+            AND submitted_at > %s
+        ''', (user_id, datetime.now() - timedelta(days=1)))
+        result = cursor.fetchone()
+        return result['count'] > 0
 
 # Check rate limit by wallet address
 def check_wallet_rate_limit(wallet_address):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*) as count 
-        FROM submissions 
-        WHERE LOWER(wallet_address) = LOWER(%s) 
-        AND submitted_at > %s
-    ''', (wallet_address, datetime.now() - timedelta(days=1)))
-    result = cursor.fetchone()
-    conn.close()
-    return result['count'] > 0
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) as count 
+            FROM submissions 
+            WHERE LOWER(wallet_address) = LOWER(%s) 
+            AND submitted_at > %s
+        ''', (wallet_address, datetime.now() - timedelta(days=1)))
+        result = cursor.fetchone()
+        return result['count'] > 0
 
 # Validate wallet address
 def is_valid_wallet(wallet):
-    if len(wallet) < 26 or len(wallet) > 128:
-        return False
-    return all(c.isalnum() or c in '-_' for c in wallet)
+    return detect_address(wallet) is not None
 
 # Validate contract address
 def is_valid_contract(contract):
-    if len(contract) < 26 or len(contract) > 128:
-        return False
-    return all(c.isalnum() or c in '-_' for c in contract)
+    return detect_address(contract) is not None
 
-# Add moondust to user
-def add_moondust(user_id, amount):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE users SET total_moondust = total_moondust + %s
-        WHERE telegram_id = %s
-    ''', (amount, user_id))
-    conn.commit()
-    conn.close()
+# Save a confirmed submission
+def insert_submission(user_id, username, story_type, wallet, contract, amount, story, week):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        own_partition = ensure_week_partition(cursor, week)
+        cursor.execute('''
+            INSERT INTO submissions
+            (user_id, username, story_type, wallet_address, contract_address, amount, story,
+             week_year, week_number, wallet_chain, contract_chain)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        ''', (user_id, username, story_type, wallet, contract, amount, story,
+              week.iso_year, week.week, detect_address(wallet), detect_address(contract)))
+        submission_id = cursor.fetchone()['id']
+        conn.commit()
+    if own_partition:
+        WEEK_PARTITIONS.add(week)
+    return submission_id
 
-# ==================== USER COMMANDS ====================
+# Get moondust, submission counts and wins for /mystats
+def get_user_stats(user_id):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        execute_prepared(cursor, 'user_stats', (user_id,))
+        stats = cursor.fetchone()
+        return stats['total_moondust'], stats, stats['wins']
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-    context.user_data.clear()
-    
-    ensure_user(user.id, user.username or user.first_name)
-    
-    # Check if submissions are open
-    if not is_submissions_open():
-        await update.message.reply_text(
-            "⏰ Submissions are closed!\n\n"
-            "Saturday is review day. Winners announced at 20:00 UTC.\n\n"
-            "New week starts Sunday 00:00 UTC. Come back then! 🙏"
-        )
-        return ConversationHandler.END
-    
-    # Check rate limit
-    if check_user_rate_limit(user.id):
-        await update.message.reply_text(
-            "⏰ You've already submitted a story today!\n\n"
-            "One submission per account per 24 hours.\n\n"
-            "Come back tomorrow to share another story! 🙏"
+# Get the 10 most recent champions
+def get_champions():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM champions
+            ORDER BY week_year DESC, week_number DESC
+            LIMIT 10
+        ''')
+        champs = cursor.fetchall()
+        return champs
+
+# Count submissions for a week
+def count_week_submissions(week):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE week_year = %s AND week_number = %s', week)
+        count = cursor.fetchone()['count']
+        return count
+
+# Get pending / weekly counts for /status
+def get_admin_status(week):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = %s', ('pending',))
+        pending = cursor.fetchone()['count']
+
+        cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE week_year = %s AND week_number = %s', week)
+        this_week = cursor.fetchone()['count']
+
+        cursor.execute(
+            'SELECT COUNT(*) as count FROM submissions WHERE week_year = %s AND week_number = %s AND status = %s',
+            (week.iso_year, week.week, 'approved')
         )
-        return ConversationHandler.END
-    
-    days, hours = get_time_until_close()
-    
-    welcome_text = f"""🎭 Welcome to Rekterapy Story Submission
+        approved_week = cursor.fetchone()['count']
 
-🏆 WIN 5000 STARS WEEKLY!
+        return pending, this_week, approved_week
 
-Submit your best crypto story - wins or losses!
+# Get global totals for /stats
+def get_full_stats():
+    with db_conn() as conn:
+        cursor = conn.cursor()
 
-⏰ Week closes in: {days} days, {hours} hours
+        cursor.execute('SELECT COUNT(*) as count FROM users')
+        total_users = cursor.fetchone()['count']
 
-✅ What Makes a Winning Story:
-- Authentic & verifiable (we check on-chain!)
-- Emotional impact & lessons learned  
-- Specific details (dates, amounts, tx hash)
-- Helps the community learn
+        cursor.execute('''
+            SELECT (SELECT COUNT(*) FROM submissions)
+                 + (SELECT COALESCE(SUM(row_count), 0) FROM archived_weeks) AS count
+        ''')
+        total_subs = cursor.fetchone()['count']
 
-⚠️ INSTANT BAN for:
-- Fake stories or stolen content
-- Wrong wallet/CA addresses
-- Multiple accounts or spam
-- AI-generated content
+        cursor.execute('SELECT COALESCE(SUM(total_moondust), 0) as total FROM users')
+        total_moondust = cursor.fetchone()['total']
 
-📝 Scoring (Max 5000 Moondust):
-- Authenticity: up to 1000
-- Emotional Impact: up to 1000
-- Lesson Learned: up to 1000
-- Detail Quality: up to 1000
-- Storytelling: up to 1000
+        cursor.execute('SELECT COUNT(*) as count FROM champions')
+        total_champions = cursor.fetchone()['count']
+
+        return total_users, total_subs, total_moondust, total_champions
+
+# Mark a submission rejected, returns the submitter's user_id
+# None if missing or claimed by another reviewer
+def reject_submission(submission_id, reason_text, reviewer_id):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            UPDATE submissions
+            SET status = 'rejected', rejection_reason = %s, reviewed_at = %s,
+                reviewed_by = %s, claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = %s
+              AND status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < CURRENT_TIMESTAMP)
+            RETURNING user_id
+        ''', (reason_text, datetime.now(), reviewer_id, submission_id, reviewer_id))
+
+        result = cursor.fetchone()
+        user_id = result['user_id'] if result else None
+
+        conn.commit()
+        return user_id
+
+# Save scores and credit moondust in one transaction, returns the submitter's
+# user_id. None if missing, already reviewed or claimed by another reviewer -
+# the status guard makes a repeated confirm a no-op.
+def approve_submission(submission_id, scores, reviewer_id):
+    total = sum(scores.values())
+
+    with db_conn() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            UPDATE submissions
+            SET status = 'approved',
+                score_authenticity = %s,
+                score_emotional = %s,
+                score_lesson = %s,
+                score_detail = %s,
+                score_storytelling = %s,
+                total_moondust = %s,
+                reviewed_at = %s,
+                reviewed_by = %s,
+                claimed_by = NULL,
+                claim_expires_at = NULL
+            WHERE id = %s
+              AND status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < CURRENT_TIMESTAMP)
+            RETURNING user_id, review_round
+        ''', (
+            scores.get('authenticity', 0),
+            scores.get('emotional', 0),
+            scores.get('lesson', 0),
+            scores.get('detail', 0),
+            scores.get('storytelling', 0),
+            total,
+            datetime.now(),
+            reviewer_id,
+            submission_id,
+            reviewer_id
+        ))
+
+        result = cursor.fetchone()
+        if result is None:
+            conn.rollback()
+            return None
+        user_id = result['user_id']
+
+        # The ledger key is the second line of defence against double credit
+        cursor.execute('''
+            INSERT INTO moondust_ledger (user_id, submission_id, review_round, action, amount, created_by)
+            VALUES (%s, %s, %s, 'award', %s, %s)
+            ON CONFLICT (submission_id, review_round, action) DO NOTHING
+            RETURNING id
+        ''', (user_id, submission_id, result['review_round'], total, reviewer_id))
+
+        if cursor.fetchone() is None:
+            conn.rollback()
+            return None
+
+        cursor.execute('''
+            UPDATE users SET total_moondust = total_moondust + %s
+            WHERE telegram_id = %s
+        ''', (total, user_id))
+
+        conn.commit()
+        return user_id
+
+# Record this week's top approved submission as champion
+# Returns (winner, existing) - winner is None if nothing was approved,
+# existing is set if the week already had a champion
+def set_week_champion(week):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+
+        # Find highest scoring approved submission this week
+        cursor.execute('''
+            SELECT * FROM submissions
+            WHERE week_year = %s AND week_number = %s AND status = 'approved'
+            ORDER BY total_moondust DESC, submitted_at ASC
+            LIMIT 1
+        ''', week)
+
+        winner = cursor.fetchone()
+
+        if not winner:
+            return None, None
+
+        # Check if champion already set
+        cursor.execute('SELECT * FROM champions WHERE week_year = %s AND week_number = %s', week)
+        existing = cursor.fetchone()
+
+        if existing:
+            return winner, existing
+
+        # Set champion
+        story_preview = winner['story'][:100]
+
+        cursor.execute('''
+            INSERT INTO champions (week_year, week_number, user_id, username, submission_id, story_preview, total_moondust)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ''', (week.iso_year, week.week, winner['user_id'], winner['username'], winner['id'], story_preview, winner['total_moondust']))
+
+        conn.commit()
+        return winner, None
+
+# Reset a submission to pending, removing any moondust it awarded
+# Returns the submission as it was before the reset, or None
+def undo_submission(submission_id, admin_id=None):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+
+        # Lock the row so a concurrent approve or undo waits for us
+        cursor.execute('SELECT * FROM submissions WHERE id = %s FOR UPDATE', (submission_id,))
+        sub = cursor.fetchone()
+
+        if not sub:
+            conn.rollback()
+            return None
+
+        # If was approved, reverse the award recorded in the ledger
+        if sub['status'] == 'approved' and sub['total_moondust'] > 0:
+            cursor.execute('''
+                INSERT INTO moondust_ledger (user_id, submission_id, review_round, action, amount, created_by)
+                VALUES (%s, %s, %s, 'revoke', %s, %s)
+                ON CONFLICT (submission_id, review_round, action) DO NOTHING
+                RETURNING id
+            ''', (sub['user_id'], submission_id, sub['review_round'], -sub['total_moondust'], admin_id))
+            if cursor.fetchone() is not None:
+                cursor.execute('''
+                    UPDATE users SET total_moondust = total_moondust - %s
+                    WHERE telegram_id = %s
+                ''', (sub['total_moondust'], sub['user_id']))
+
+        # Reset to pending
+        cursor.execute('''
+            UPDATE submissions
+            SET status = 'pending',
+                rejection_reason = NULL,
+                score_authenticity = 0,
+                score_emotional = 0,
+                score_lesson = 0,
+                score_detail = 0,
+                score_storytelling = 0,
+                total_moondust = 0,
+                reviewed_at = NULL,
+                reviewed_by = NULL,
+                review_round = review_round + 1
+            WHERE id = %s
+        ''', (submission_id,))
+
+        conn.commit()
+        return sub
+
+# Recompute every balance from the ledger in one transaction
+# Returns the number of users whose stored total was wrong
+def rebuild_balances():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            WITH totals AS (
+                SELECT u.telegram_id, COALESCE(SUM(l.amount), 0) AS total
+                FROM users u
+                LEFT JOIN moondust_ledger l ON l.user_id = u.telegram_id
+                GROUP BY u.telegram_id
+            )
+            UPDATE users u
+            SET total_moondust = t.total
+            FROM totals t
+            WHERE u.telegram_id = t.telegram_id
+              AND u.total_moondust IS DISTINCT FROM t.total
+        ''')
+        fixed = cursor.rowcount
+        conn.commit()
+        return fixed
+
+def get_balances():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT telegram_id, username, total_moondust FROM users')
+        return cursor.fetchall()
+
+# ==================== ADDRESS VALIDATION ====================
+
+# Keccak-256 (the pre-NIST padding Ethereum uses - hashlib's sha3_256
+# differs), only needed for EIP-55 checksums so plain Python is fine
+KECCAK_ROUNDS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008
+)
+# Rotation per lane, indexed x + 5 * y
+KECCAK_ROTATIONS = (
+    0, 1, 62, 28, 27,
+    36, 44, 6, 55, 20,
+    3, 10, 43, 25, 39,
+    41, 45, 15, 21, 8,
+    18, 2, 61, 56, 14
+)
+KECCAK_MASK = (1 << 64) - 1
+KECCAK_RATE = 136
+
+# rho and pi as (source lane, column of the source, destination lane,
+# rotation), and chi's two neighbours per lane, worked out once
+KECCAK_RHO_PI = tuple(
+    (i, i % 5, i // 5 + 5 * ((2 * (i % 5) + 3 * (i // 5)) % 5), KECCAK_ROTATIONS[i]) for i in range(25)
+)
+KECCAK_CHI = tuple((i, i - i % 5 + (i + 1) % 5, i - i % 5 + (i + 2) % 5) for i in range(25))
+
+def _keccak_f(a):
+    mask = KECCAK_MASK
+    b = [0] * 25
+    for rc in KECCAK_ROUNDS:
+        c = [a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20] for x in range(5)]
+        d = [c[x - 1] ^ (((c[x - 4] << 1) | (c[x - 4] >> 63)) & mask) for x in range(5)]
+        for src, x, dst, r in KECCAK_RHO_PI:
+            v = a[src] ^ d[x]
+            b[dst] = ((v << r) | (v >> (64 - r))) & mask
+        a = [b[i] ^ (~b[j] & b[k]) for i, j, k in KECCAK_CHI]
+        a[0] ^= rc
+    return a
+
+def keccak256(data):
+    padded = bytearray(data) + b'\x01'
+    padded += bytes(-len(padded) % KECCAK_RATE)
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for offset in range(0, len(padded), KECCAK_RATE):
+        for i in range(KECCAK_RATE // 8):
+            start = offset + i * 8
+            state[i] ^= int.from_bytes(padded[start:start + 8], 'little')
+        state = _keccak_f(state)
+    return b''.join(lane.to_bytes(8, 'little') for lane in state[:4])
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BASE58_INDEX = {c: i for i, c in enumerate(BASE58_ALPHABET)}
+BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32_INDEX = {c: i for i, c in enumerate(BECH32_CHARSET)}
+BECH32_GENERATORS = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+# Final checksum constants for bech32 (BIP-173) and bech32m (BIP-350)
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+BECH32_CONSTANTS = (BECH32_CONST, BECH32M_CONST)
+# Segwit prefixes, which also get BIP-173/350's length and version rules.
+# Other chains (cosmos1…, addr1… Cardano) only need a valid checksum.
+SEGWIT_HRPS = ('bc', 'tb', 'bcrt')
+
+# Shape checks, compiled once; the decoders below only run on a match
+EVM_RE = re.compile(r'0x[0-9a-fA-F]{40}')
+MOVE_RE = re.compile(r'0x[0-9a-fA-F]{64}')
+BASE58_RE = re.compile(r'[1-9A-HJ-NP-Za-km-z]{25,44}')
+BECH32_RE = re.compile(r'[a-z]{1,16}1[qpzry9x8gf2tvdw0s3jn54khce6mua7l]{6,}|[A-Z]{1,16}1[QPZRY9X8GF2TVDW0S3JN54KHCE6MUA7L]{6,}')
+TON_RE = re.compile(r'[EUk0][Qf][A-Za-z0-9_-]{46}')
+
+def base58_decode(text):
+    n = 0
+    for c in text:
+        n = n * 58 + BASE58_INDEX[c]
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    pad = len(text) - len(text.lstrip('1'))
+    return b'\x00' * pad + body
+
+def eip55_valid(address):
+    digits = address[2:]
+    if digits == digits.lower() or digits == digits.upper():
+        # No checksum encoded
+        return True
+    hashed = keccak256(digits.lower().encode()).hex()
+    for c, h in zip(digits, hashed):
+        if c.isalpha() and c.isupper() != (int(h, 16) >= 8):
+            return False
+    return True
+
+def bech32_valid(address):
+    address = address.lower()
+    hrp, _, data = address.rpartition('1')
+    values = [BECH32_INDEX[c] for c in data]
+    chk = 1
+    for v in [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp] + values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ v
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= BECH32_GENERATORS[i]
+    if hrp not in SEGWIT_HRPS:
+        return chk in BECH32_CONSTANTS
+    
+    # Segwit: witness v0 uses bech32, v1+ bech32m; the program must decode
+    # to 2-40 bytes (20 or 32 for v0) with zero padding
+    if len(address) > 90 or len(values) < 7:
+        return False
+    version, program = values[0], values[1:-6]
+    if version > 16 or chk != (BECH32_CONST if version == 0 else BECH32M_CONST):
+        return False
+    size, pad = divmod(len(program) * 5, 8)
+    if pad > 4 or program[-1] & ((1 << pad) - 1):
+        return False
+    if not 2 <= size <= 40 or (version == 0 and size not in (20, 32)):
+        return False
+    return True
+
+# Address format name, or None if it isn't a supported address. Cached:
+# the same wallets come back again and again.
+@lru_cache(maxsize=65536)
+def detect_address(address):
+    if EVM_RE.fullmatch(address):
+        return 'evm' if eip55_valid(address) else None
+    if MOVE_RE.fullmatch(address):
+        return 'move'
+    if BECH32_RE.fullmatch(address):
+        if bech32_valid(address):
+            return 'bech32:' + address.lower().rpartition('1')[0]
+    if BASE58_RE.fullmatch(address):
+        raw = base58_decode(address)
+        if len(raw) == 32:
+            return 'solana'
+        if len(raw) == 25 and hashlib.sha256(hashlib.sha256(raw[:21]).digest()).digest()[:4] == raw[21:]:
+            return 'tron' if raw[0] == 0x41 else 'bitcoin'
+        return None
+    if TON_RE.fullmatch(address):
+        return 'ton'
+    return None
+
+# Bulk mode: classify many addresses, decoding each distinct one once
+def detect_addresses(addresses):
+    distinct = {a.strip() for a in addresses if a}
+    return {a: detect_address(a) for a in distinct}
+
+ADDRESS_FORMATS_TEXT = "EVM (0x…), Solana, Bitcoin, Tron, bech32 (bc1…, cosmos1…, addr1…), Sui/Aptos or TON"
+
+# Re-check every stored address and tag its format ('invalid' if none).
+# Returns {format: submissions}
+def revalidate_addresses(batch=5000):
+    counts = {}
+    with db_conn() as read_conn, db_conn() as write_conn:
+        cursor = read_conn.cursor(name='address_revalidate')
+        cursor.itersize = batch
+        cursor.execute('SELECT id, wallet_address, contract_address FROM submissions')
+        writer = write_conn.cursor()
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            formats = detect_addresses(
+                [r['wallet_address'] for r in rows] + [r['contract_address'] for r in rows]
+            )
+            updates = []
+            for r in rows:
+                wallet = formats.get((r['wallet_address'] or '').strip()) or 'invalid'
+                contract = formats.get((r['contract_address'] or '').strip()) or 'invalid'
+                counts[wallet] = counts.get(wallet, 0) + 1
+                updates.append((r['id'], wallet, contract))
+            execute_values(writer, '''
+                UPDATE submissions AS s
+                SET wallet_chain = v.wallet_chain, contract_chain = v.contract_chain
+                FROM (VALUES %s) AS v (id, wallet_chain, contract_chain)
+                WHERE s.id = v.id
+            ''', updates)
+            write_conn.commit()
+        cursor.close()
+    return counts
+
+# ==================== LEADERBOARD ====================
+
+# Every criterion score is a multiple of this, so user totals are too
+SCORE_STEP = 200
+
+# In-process ranking over users.total_moondust.
+# A Fenwick tree counts users per score bucket (score // SCORE_STEP), so
+# rank and top-N are O(log n) instead of a COUNT(*) scan of users.
+# Only touched from the event loop thread, after the DB write has committed.
+class Leaderboard:
+    def __init__(self, step=SCORE_STEP, size=1024):
+        self.step = step
+        self._scores = {}   # user_id -> total moondust
+        self._names = {}    # user_id -> username
+        self._buckets = {}  # bucket -> {user_id: None}, insertion ordered
+        self._build([0] * size)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def _bucket(self, score):
+        return max(score, 0) // self.step
+
+    def _build(self, counts):
+        size = len(counts)
+        tree = [0] * (size + 1)
+        for i, count in enumerate(counts, 1):
+            tree[i] += count
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._size = size
+
+    def _grow(self, bucket):
+        size = self._size
+        while size <= bucket:
+            size *= 2
+        counts = [0] * size
+        for b, members in self._buckets.items():
+            counts[b] = len(members)
+        self._build(counts)
+
+    def _update(self, bucket, delta):
+        i = bucket + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    # Number of users in buckets 0..bucket
+    def _prefix(self, bucket):
+        i = min(bucket + 1, self._size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    # Bucket holding the k-th lowest score (k is 1-based)
+    def _find(self, k):
+        pos = 0
+        step = self._size
+        while step:
+            nxt = pos + step
+            if nxt <= self._size and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+    # Rebuild from (telegram_id, username, total_moondust) rows in one pass
+    def load(self, rows):
+        self._scores.clear()
+        self._names.clear()
+        self._buckets.clear()
+        for row in rows:
+            user_id = row['telegram_id']
+            score = row['total_moondust'] or 0
+            self._scores[user_id] = score
+            self._names[user_id] = row['username']
+            self._buckets.setdefault(self._bucket(score), {})[user_id] = None
+        size = 1024
+        while self._buckets and size <= max(self._buckets):
+            size *= 2
+        counts = [0] * size
+        for b, members in self._buckets.items():
+            counts[b] = len(members)
+        self._build(counts)
+
+    def set(self, user_id, score, username=None):
+        old = self._scores.get(user_id)
+        if old is not None:
+            b = self._bucket(old)
+            members = self._buckets[b]
+            del members[user_id]
+            if not members:
+                del self._buckets[b]
+            self._update(b, -1)
+        b = self._bucket(score)
+        if b >= self._size:
+            self._grow(b)
+        self._buckets.setdefault(b, {})[user_id] = None
+        self._update(b, 1)
+        self._scores[user_id] = score
+        if username is not None:
+            self._names[user_id] = username
+
+    def add(self, user_id, delta):
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    # Register a user seen by ensure_user without changing their score.
+    # True if they are new, which moves everyone at zero down a rank.
+    def touch(self, user_id, username):
+        if user_id in self._scores:
+            self._names[user_id] = username
+            return False
+        self.set(user_id, 0, username)
+        return True
+
+    def score(self, user_id):
+        return self._scores.get(user_id, 0)
+
+    def username(self, user_id):
+        return self._names.get(user_id)
+
+    # 1 + number of users with a strictly higher score
+    def rank(self, user_id):
+        return len(self._scores) - self._prefix(self._bucket(self.score(user_id))) + 1
+
+    def top(self, n=10):
+        result = []
+        total = len(self._scores)
+        k = 1
+        while len(result) < n and k <= total:
+            members = self._buckets[self._find(total - k + 1)]
+            for user_id in members:
+                if len(result) == n:
+                    break
+                result.append({
+                    'telegram_id': user_id,
+                    'username': self._names.get(user_id),
+                    'total_moondust': self._scores[user_id]
+                })
+            k += len(members)
+        return result
+
+LEADERBOARD = Leaderboard()
+
+# Fill the leaderboard from users, streaming with a server-side cursor
+def load_leaderboard(board=LEADERBOARD):
+    with db_conn() as conn:
+        cursor = conn.cursor(name='leaderboard_load')
+        cursor.itersize = 10000
+        cursor.execute('SELECT telegram_id, username, total_moondust FROM users')
+        board.load(cursor)
+        cursor.close()
+
+# ==================== RENDER CACHE ====================
+
+# Seconds a rendered reply stays valid even without an invalidating write
+RENDER_CACHE_TTL = float(os.getenv('RENDER_CACHE_TTL', 60))
+
+# Rendered reply text for the read-only commands, keyed by tuples that start
+# with the command name (e.g. ('week', week, ...)). Writes drop entries by
+# key prefix; the TTL bounds anything a write path doesn't know about.
+class RenderCache:
+    def __init__(self, ttl=RENDER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # key -> (expires_at, text)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, text):
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+
+    # Drop every entry whose key starts with prefix
+    def invalidate(self, *prefix):
+        n = len(prefix)
+        stale = [key for key in self._entries if key[:n] == prefix]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
+
+RENDER_CACHE = RenderCache()
+
+# ==================== RATE LIMITS ====================
+
+# One submission per account and per wallet in this window
+RATE_LIMIT_WINDOW = 24 * 3600
+
+# Sliding-window submission counters kept in memory so /start spam never
+# reaches Postgres. Warmed from the last window of submissions at startup;
+# until then (or if warming failed) callers fall back to the DB queries.
+class SlidingWindowLimiter:
+    def __init__(self, window=RATE_LIMIT_WINDOW, limit=1, sweep_every=1000):
+        self.window = window
+        self.limit = limit
+        self.sweep_every = sweep_every
+        self._hits = {}  # key -> deque of submission times, oldest first
+        self._records = 0
+        self.warmed = False
+
+    def _live(self, key, now):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        cutoff = now - self.window
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def count(self, key, now=None):
+        hits = self._live(key, time.time() if now is None else now)
+        return len(hits) if hits else 0
+
+    def is_limited(self, key, now=None):
+        return self.count(key, now) >= self.limit
+
+    def record(self, key, at=None):
+        at = time.time() if at is None else at
+        hits = self._hits.setdefault(key, deque())
+        # Warm-up rows can arrive out of order
+        if hits and hits[-1] > at:
+            hits.append(at)
+            self._hits[key] = deque(sorted(hits))
+        else:
+            hits.append(at)
+        self._records += 1
+        if self._records % self.sweep_every == 0:
+            self.sweep()
+
+    # Drop keys whose whole history has aged out
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        for key in list(self._hits):
+            self._live(key, now)
+
+    def __len__(self):
+        return len(self._hits)
+
+USER_LIMITER = SlidingWindowLimiter()
+WALLET_LIMITER = SlidingWindowLimiter()
+
+# Wallet rate limits are case-insensitive, matching LOWER() in the DB check
+def normalize_wallet(wallet):
+    return wallet.strip().lower()
+
+# Get submissions inside the rate-limit window with their age in seconds,
+# measured by the DB clock so it matches submitted_at's timezone
+def get_recent_submissions(window=RATE_LIMIT_WINDOW):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, wallet_address,
+                   EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - submitted_at)) AS age
+            FROM submissions
+            WHERE submitted_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        ''', (window,))
+        return cursor.fetchall()
+
+# Fill the limiters from the DB; on failure they stay cold and the DB is used
+def warm_rate_limiters():
+    try:
+        rows = get_recent_submissions()
+    except Exception as e:
+        print(f"Rate limiter warm-up failed, using DB checks: {e}")
+        return
+    now = time.time()
+    for row in rows:
+        at = now - float(row['age'])
+        USER_LIMITER.record(row['user_id'], at)
+        WALLET_LIMITER.record(normalize_wallet(row['wallet_address']), at)
+    USER_LIMITER.warmed = True
+    WALLET_LIMITER.warmed = True
+
+async def is_user_rate_limited(user_id):
+    if USER_LIMITER.warmed:
+        return USER_LIMITER.is_limited(user_id)
+    return await run_db(check_user_rate_limit, user_id)
+
+async def is_wallet_rate_limited(wallet):
+    if WALLET_LIMITER.warmed:
+        return WALLET_LIMITER.is_limited(normalize_wallet(wallet))
+    return await run_db(check_wallet_rate_limit, wallet)
+
+# ==================== KNOWN USERS ====================
+
+# Users whose row and username are known to be in the database
+KNOWN_USERS_SIZE = int(os.getenv('KNOWN_USERS_SIZE', 50000))
+# Username changes are written in batches of this size, or this often
+USERNAME_FLUSH_BATCH = int(os.getenv('USERNAME_FLUSH_BATCH', 200))
+USERNAME_FLUSH_INTERVAL = float(os.getenv('USERNAME_FLUSH_INTERVAL', 30))
+
+def save_usernames(changes):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        execute_values(cursor, '''
+            UPDATE users AS u SET username = v.username
+            FROM (VALUES %s) AS v (telegram_id, username)
+            WHERE u.telegram_id = v.telegram_id
+              AND u.username IS DISTINCT FROM v.username
+        ''', changes)
+        conn.commit()
+
+# LRU of telegram_id -> last username written. New users are upserted
+# straight away; renames of known users are batched; everything else is
+# a dict hit and no write at all.
+class KnownUsers:
+    def __init__(self, capacity=KNOWN_USERS_SIZE):
+        self.capacity = capacity
+        self._users = OrderedDict()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self.hits = 0
+        self.inserts = 0
+        self.renames = 0
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def _remember(self, user_id, username):
+        self._users[user_id] = username
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.capacity:
+            self._users.popitem(last=False)
+
+    async def ensure(self, user_id, username):
+        if user_id not in self._users:
+            await run_db(ensure_user, user_id, username)
+            self.inserts += 1
+            self._pending.pop(user_id, None)
+        elif self._users[user_id] != username:
+            self._pending[user_id] = username
+            self.renames += 1
+        else:
+            self.hits += 1
+        self._remember(user_id, username)
+        
+        if self._pending and (
+            len(self._pending) >= USERNAME_FLUSH_BATCH
+            or time.monotonic() - self._last_flush >= USERNAME_FLUSH_INTERVAL
+        ):
+            await self.flush()
+
+    # Send these users' next ensure() to the database, e.g. after a
+    # broadcast marked them blocked, so it can clear blocked_at
+    def forget(self, user_ids):
+        for user_id in user_ids:
+            self._users.pop(user_id, None)
+
+    async def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await run_db(save_usernames, list(pending.items()))
+            self.flushes += 1
+        except Exception as e:
+            print(f"Username flush failed, will retry: {e}")
+            for user_id, username in pending.items():
+                self._pending.setdefault(user_id, username)
+
+    def stats(self):
+        return {
+            'size': len(self._users),
+            'pending': len(self._pending),
+            'hits': self.hits,
+            'inserts': self.inserts,
+            'renames': self.renames,
+            'flushes': self.flushes
+        }
+
+KNOWN_USERS = KnownUsers()
+
+# ==================== OUTBOUND MESSAGES ====================
+
+# Telegram allows ~30 messages/s overall and ~1/s into the same chat.
+# SEND_RATE is the whole bot's budget, split between the outbox and broadcasts.
+SEND_RATE = float(os.getenv('SEND_RATE', 25))
+OUTBOX_CHAT_INTERVAL = float(os.getenv('OUTBOX_CHAT_INTERVAL', 1.0))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv('OUTBOX_MAX_IN_FLIGHT', 8))
+# Seconds between batched writes of the outbox to outbound_messages
+OUTBOX_SPOOL_INTERVAL = float(os.getenv('OUTBOX_SPOOL_INTERVAL', 1.0))
+
+# Global send pacing shared by everything that sends in bulk. A RetryAfter
+# seen by any sender pauses all of them. Only used from the event loop.
+class SendBudget:
+    def __init__(self, rate=SEND_RATE):
+        self.interval = 1 / rate
+        self.paused_until = 0.0
+        self._next = 0.0
+
+    # Seconds until the next send may go out
+    def ready_in(self):
+        return max(self._next, self.paused_until) - time.monotonic()
+
+    # Claim the next slot; call once ready_in() <= 0
+    def take(self):
+        self._next = max(self._next, time.monotonic()) + self.interval
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+SEND_BUDGET = SendBudget()
+
+# Get messages that were queued but never delivered
+def get_undelivered_messages():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, chat_id, text, reply_markup, attempts
+            FROM outbound_messages
+            WHERE status = 'pending'
+            ORDER BY created_at
+        ''')
+        return cursor.fetchall()
+
+# Write one batch of outbox changes
+# upserts: [(id, chat_id, text, reply_markup, status, attempts)], deletes: [id]
+def save_outbound(upserts, deletes):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        if upserts:
+            execute_values(cursor, '''
+                INSERT INTO outbound_messages (id, chat_id, text, reply_markup, status, attempts)
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE
+                SET status = EXCLUDED.status, attempts = EXCLUDED.attempts
+            ''', upserts)
+        if deletes:
+            cursor.execute('DELETE FROM outbound_messages WHERE id = ANY(%s)', (deletes,))
+        conn.commit()
+
+# Handlers call OUTBOX.send() and return straight away; a background worker
+# paces delivery under the global and per-chat limits, waits out RetryAfter,
+# and retries network errors with exponential backoff. Messages are spooled
+# to outbound_messages so a restart resumes anything still undelivered.
+class OutboundQueue:
+    def __init__(self, budget=SEND_BUDGET, chat_interval=OUTBOX_CHAT_INTERVAL,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, max_in_flight=OUTBOX_MAX_IN_FLIGHT):
+        self.budget = budget
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.max_in_flight = max_in_flight
+        self._heap = []  # (ready_at, seq, message)
+        self._seq = itertools.count()
+        self._chat_ready = {}  # chat_id -> when the chat may receive again
+        self._in_flight = set()
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._spooler = None
+        # Spool state - new/changed messages and delivered ids not yet written
+        self._dirty = {}
+        self._delivered_ids = []
+        # Metrics
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.latency_seconds = 0.0
+        self.latency_max = 0.0
+
+    def _push(self, message, ready_at):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), message))
+        self._wakeup.set()
+
+    def send(self, chat_id, text, reply_markup=None):
+        message = {
+            'id': uuid.uuid4().hex,
+            'chat_id': chat_id,
+            'text': text,
+            'reply_markup': reply_markup,
+            'attempts': 0,
+            'status': 'pending',
+            'enqueued_at': time.monotonic()
+        }
+        self._dirty[message['id']] = message
+        self._push(message, 0.0)
+
+    def depth(self):
+        return len(self._heap) + len(self._in_flight)
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'in_flight': len(self._in_flight),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'retries': self.retries,
+            'latency_avg_ms': (self.latency_seconds / self.delivered * 1000) if self.delivered else 0.0,
+            'latency_max_ms': self.latency_max * 1000
+        }
+
+    async def start(self, bot):
+        rows = await run_db(get_undelivered_messages)
+        for row in rows:
+            markup = json.loads(row['reply_markup']) if row['reply_markup'] else None
+            message = {
+                'id': row['id'],
+                'chat_id': row['chat_id'],
+                'text': row['text'],
+                'reply_markup': InlineKeyboardMarkup.de_json(markup, bot) if markup else None,
+                'attempts': row['attempts'],
+                'status': 'pending',
+                'enqueued_at': time.monotonic()
+            }
+            self._push(message, 0.0)
+        if rows:
+            print(f"Outbox resumed {len(rows)} undelivered messages")
+        self._worker = asyncio.create_task(self._run(bot))
+        self._spooler = asyncio.create_task(self._spool_forever())
+
+    async def stop(self):
+        for task in (self._worker, self._spooler):
+            if task is not None:
+                task.cancel()
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=5)
+        await self._spool()
+
+    async def _run(self, bot):
+        while True:
+            if not self._heap or len(self._in_flight) >= self.max_in_flight:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            ready_at = self._heap[0][0]
+            now = time.monotonic()
+            wait = max(ready_at - now, self.budget.ready_in())
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            _, _, message = heapq.heappop(self._heap)
+            chat_id = message['chat_id']
+            chat_ready = self._chat_ready.get(chat_id, 0.0)
+            if chat_ready > now:
+                self._push(message, chat_ready)
+                continue
+            
+            self.budget.take()
+            self._chat_ready[chat_id] = now + self.chat_interval
+            if len(self._chat_ready) > 10000:
+                self._chat_ready = {c: t for c, t in self._chat_ready.items() if t > now}
+            
+            task = asyncio.create_task(self._deliver(bot, message))
+            self._in_flight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._in_flight.discard(task)
+        self._wakeup.set()
+
+    async def _deliver(self, bot, message):
+        message['attempts'] += 1
+        try:
+            await bot.send_message(
+                chat_id=message['chat_id'],
+                text=message['text'],
+                reply_markup=message['reply_markup']
+            )
+        except RetryAfter as e:
+            # Flood control applies to the whole bot, so everything waits
+            retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            self.budget.pause(retry_after)
+            message['attempts'] -= 1
+            self.retries += 1
+            self._push(message, self.budget.paused_until)
+            return
+        except (Forbidden, BadRequest) as e:
+            self._give_up(message, e)
+            return
+        except Exception as e:
+            if message['attempts'] >= self.max_attempts:
+                self._give_up(message, e)
+                return
+            self.retries += 1
+            self._dirty[message['id']] = message
+            self._push(message, time.monotonic() + min(2 ** message['attempts'], 300))
+            return
+        
+        latency = time.monotonic() - message['enqueued_at']
+        self.delivered += 1
+        self.latency_seconds += latency
+        self.latency_max = max(self.latency_max, latency)
+        message['status'] = 'delivered'
+        # Still unwritten means it never reached the table
+        if self._dirty.pop(message['id'], None) is None:
+            self._delivered_ids.append(message['id'])
+
+    def _give_up(self, message, error):
+        print(f"Dropping message to {message['chat_id']} after {message['attempts']} attempts: {error}")
+        self.failed += 1
+        message['status'] = 'failed'
+        self._dirty[message['id']] = message
+
+    async def _spool_forever(self):
+        while True:
+            await asyncio.sleep(OUTBOX_SPOOL_INTERVAL)
+            await self._spool()
+
+    async def _spool(self):
+        dirty, self._dirty = self._dirty, {}
+        delivered, self._delivered_ids = self._delivered_ids, []
+        if not dirty and not delivered:
+            return
+        upserts = [
+            (
+                m['id'],
+                m['chat_id'],
+                m['text'],
+                json.dumps(m['reply_markup'].to_dict()) if m['reply_markup'] else None,
+                m['status'],
+                m['attempts']
+            )
+            for m in dirty.values()
+        ]
+        try:
+            await run_db(save_outbound, upserts, delivered)
+        except Exception as e:
+            for key, message in dirty.items():
+                if message['status'] != 'delivered':
+                    self._dirty.setdefault(key, message)
+            self._delivered_ids.extend(delivered)
+            print(f"Outbox spool failed, will retry: {e}")
+
+OUTBOX = OutboundQueue()
+
+# ==================== ARCHIVE ====================
+
+# Closed weeks are streamed out of their partition with COPY into one file
+# per week, verified, and the partition dropped. The file is a run of
+# zlib-compressed blocks of COPY text rows (id first, ordered by id) and a
+# JSON footer with the block index, so a reader can mmap it and decompress
+# only the block holding an id.
+# The files are the only copy once the rows are dropped, so this must be
+# persistent storage (a mounted volume, not the container's own disk).
+# Archiving is refused while it is unset.
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR')
+# Weeks newer than this stay in the database
+ARCHIVE_AFTER_WEEKS = int(os.getenv('ARCHIVE_AFTER_WEEKS', 8))
+ARCHIVE_BLOCK_ROWS = 256
+ARCHIVE_LEVEL = 6
+ARCHIVE_MAGIC = b'RKARC1\n'
+ARCHIVE_SEARCH_LIMIT = 10
+ARCHIVE_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+PARTITION_NAME_RE = re.compile(r'submissions_(\d{4})_w(\d{2})')
+
+# One field of COPY text output
+def _copy_value(field):
+    if field == '\\N':
+        return None
+    if '\\' not in field:
+        return field
+    return re.sub(r'\\(.)', lambda m: ARCHIVE_ESCAPES.get(m.group(1), m.group(1)), field)
+
+# File-like sink for cursor.copy_expert(... TO STDOUT)
+class ArchiveWriter:
+    def __init__(self, fileobj, columns, week):
+        self.file = fileobj
+        self.columns = columns
+        self.week = week
+        self.blocks = []  # [first_id, last_id, offset, length, rows]
+        self.rows = 0
+        self.id_sum = 0
+        self.digest = hashlib.sha256()
+        self._partial = b''
+        self._lines = []
+        self.file.write(ARCHIVE_MAGIC)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.digest.update(data)
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        self._lines.extend(lines)
+        while len(self._lines) >= ARCHIVE_BLOCK_ROWS:
+            self._flush(self._lines[:ARCHIVE_BLOCK_ROWS])
+            del self._lines[:ARCHIVE_BLOCK_ROWS]
+
+    def _flush(self, lines):
+        ids = [int(line[:line.index(b'\t')]) for line in lines]
+        data = zlib.compress(b'\n'.join(lines) + b'\n', ARCHIVE_LEVEL)
+        self.blocks.append([ids[0], ids[-1], self.file.tell(), len(data), len(lines)])
+        self.file.write(data)
+        self.rows += len(lines)
+        self.id_sum += sum(ids)
+
+    def close(self):
+        if self._partial:
+            raise ValueError("COPY output ended mid-row")
+        if self._lines:
+            self._flush(self._lines)
+            self._lines = []
+        footer = json.dumps({
+            'week': list(self.week),
+            'columns': self.columns,
+            'rows': self.rows,
+            'id_sum': self.id_sum,
+            'sha256': self.digest.hexdigest(),
+            'blocks': self.blocks
+        }).encode()
+        self.file.write(footer + struct.pack('>Q', len(footer)) + ARCHIVE_MAGIC)
+
+# Read side of one archived week, over a read-only mmap. Safe to share
+# between threads; blocks are decompressed per call and never cached.
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        magic = len(ARCHIVE_MAGIC)
+        if len(mm) < 2 * magic + 8 or mm[:magic] != ARCHIVE_MAGIC or mm[-magic:] != ARCHIVE_MAGIC:
+            raise ValueError(f"{path} is not an archive")
+        (length,) = struct.unpack('>Q', mm[-magic - 8:-magic])
+        self.meta = json.loads(mm[-magic - 8 - length:-magic - 8])
+        self.week = Week(*self.meta['week'])
+        self.columns = self.meta['columns']
+        self.blocks = self.meta['blocks']
+        self.rows = self.meta['rows']
+        self._firsts = [b[0] for b in self.blocks]
+
+    @property
+    def min_id(self):
+        return self.blocks[0][0] if self.blocks else None
+
+    @property
+    def max_id(self):
+        return self.blocks[-1][1] if self.blocks else None
+
+    def block(self, i):
+        _, _, offset, length, _ = self.blocks[i]
+        return zlib.decompress(self._mm[offset:offset + length])
+
+    def decode(self, line):
+        values = [_copy_value(f) for f in line.decode().split('\t')]
+        row = dict(zip(self.columns, values))
+        row['id'] = int(row['id'])
+        return row
+
+    def get(self, submission_id):
+        i = bisect_right(self._firsts, submission_id) - 1
+        if i < 0 or submission_id > self.blocks[i][1]:
+            return None
+        prefix = b'%d\t' % submission_id
+        for line in self.block(i).split(b'\n'):
+            if line.startswith(prefix):
+                return self.decode(line)
+        return None
+
+    # Rows whose text contains `text` (case-insensitive), oldest first
+    def search(self, text, limit=ARCHIVE_SEARCH_LIMIT):
+        text = text.lower()
+        # Matched against the COPY text, so escaped the way COPY escapes it
+        needle = text.replace('\\', '\\\\')
+        for char, escape in ARCHIVE_ESCAPES.items():
+            needle = needle.replace(escape, '\\' + char)
+        needle = needle.encode()
+        found = []
+        for i in range(len(self.blocks)):
+            data = self.block(i)
+            # Most blocks miss; skip them without splitting rows
+            if needle not in data.lower():
+                continue
+            for line in data.split(b'\n'):
+                if needle not in line.lower():
+                    continue
+                # Lower-cased, a NULL (\N) reads as an escaped newline
+                row = self.decode(line)
+                if any(isinstance(v, str) and text in v.lower() for v in row.values()):
+                    found.append(row)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def iter_rows(self):
+        for i in range(len(self.blocks)):
+            for line in self.block(i).split(b'\n')[:-1]:
+                yield self.decode(line)
+
+    # Re-read every block against the footer and the COPY checksum
+    def verify(self):
+        digest = hashlib.sha256()
+        rows = id_sum = 0
+        for i, (first, last, _, _, count) in enumerate(self.blocks):
+            try:
+                data = self.block(i)
+            except zlib.error:
+                return False
+            lines = data.split(b'\n')[:-1]
+            ids = [int(line[:line.index(b'\t')]) for line in lines]
+            if len(lines) != count or ids[0] != first or ids[-1] != last:
+                return False
+            digest.update(data)
+            rows += count
+            id_sum += sum(ids)
+        return (
+            rows == self.rows
+            and id_sum == self.meta['id_sum']
+            and digest.hexdigest() == self.meta['sha256']
+        )
+
+    # File-like source for cursor.copy_expert(... FROM STDIN)
+    def stream(self):
+        return ArchiveStream(self)
+
+class ArchiveStream:
+    def __init__(self, reader):
+        self._blocks = (reader.block(i) for i in range(len(reader.blocks)))
+        self._buf = memoryview(b'')
+
+    def read(self, size=-1):
+        while not self._buf:
+            data = next(self._blocks, None)
+            if data is None:
+                return b''
+            self._buf = memoryview(data)
+        if size < 0:
+            size = len(self._buf)
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return bytes(data)
+
+# Open readers for every archived week
+class ArchiveStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._readers = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._readers)
+
+    # Named by content, so a new file never overwrites the one the catalog
+    # still points at
+    def path(self, week, sha256):
+        return os.path.abspath(os.path.join(self.directory, f"{week_partition_name(week)}-{sha256[:16]}.arc"))
+
+    def add(self, reader):
+        with self._lock:
+            self._readers[reader.week] = reader
+
+    def remove(self, week):
+        with self._lock:
+            return self._readers.pop(week, None)
+
+    def reader(self, week):
+        return self._readers.get(week)
+
+    # Newest week first
+    def readers(self):
+        with self._lock:
+            return [self._readers[w] for w in sorted(self._readers, reverse=True)]
+
+    def get(self, submission_id):
+        for reader in self.readers():
+            if reader.blocks and reader.min_id <= submission_id <= reader.max_id:
+                row = reader.get(submission_id)
+                if row is not None:
+                    return row
+        return None
+
+    def search(self, text, limit=ARCHIVE_SEARCH_LIMIT):
+        found = []
+        for reader in self.readers():
+            found.extend(reader.search(text, limit - len(found)))
+            if len(found) >= limit:
+                break
+        return found
+
+    # Every archived row, oldest week first
+    def iter_rows(self):
+        for reader in reversed(self.readers()):
+            yield from reader.iter_rows()
+
+ARCHIVE = ArchiveStore(ARCHIVE_DIR)
+
+def load_archive(store=ARCHIVE):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT path, sha256 FROM archived_weeks ORDER BY week_year, week_number')
+        rows = cursor.fetchall()
+    for row in rows:
+        try:
+            reader = ArchiveReader(row['path'])
+        except (OSError, ValueError) as e:
+            print(f"Archive unavailable: {e}")
+            continue
+        if reader.meta['sha256'] != row['sha256']:
+            print(f"Archive {row['path']} does not match its catalog entry, skipped")
+            continue
+        store.add(reader)
+
+# Archived weeks whose file no longer matches its footer
+def verify_archive():
+    return [reader.week for reader in ARCHIVE.readers() if not reader.verify()]
+
+# Week partitions closed long enough to archive, oldest first. Rows
+# stranded in submissions_default get their week's partition first, so
+# they are archived with it.
+def archivable_weeks(cutoff):
+    ensure_week_partitions()
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.relname AS name FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'submissions'::regclass
+        ''')
+        weeks = []
+        for row in cursor.fetchall():
+            match = PARTITION_NAME_RE.fullmatch(row['name'])
+            if match:
+                week = Week(int(match[1]), int(match[2]))
+                if week < cutoff:
+                    weeks.append(week)
+        return sorted(weeks)
+
+# Copy one week out, verify the file, then drop the partition, all in one
+# transaction. The file is published under a new name before the commit and
+# only becomes the week's archive when the catalog row commits with the
+# drop and the per-user counts, so a failed or repeated run counts nothing
+# twice. A week archived before (rows adopted from submissions_default
+# since) gets one file holding both. Returns the number of rows archived,
+# 0 if the week has no partition, or None if it still has pending stories.
+def archive_week(week):
+    if not ARCHIVE_DIR:
+        raise RuntimeError("ARCHIVE_DIR is not set")
+    table = week_partition_name(week)
+    tmp = os.path.join(os.path.abspath(ARCHIVE.directory), table + '.tmp')
+    path = previous = None
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT to_regclass(%s) AS rel', (table,))
+        if cursor.fetchone()['rel'] is None:
+            conn.rollback()
+            return 0
+        # Reads carry on; approvals and undos wait until the rows are gone
+        cursor.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        cursor.execute(f'''
+            SELECT COUNT(*) AS rows, COALESCE(SUM(id), 0) AS id_sum,
+                   COUNT(*) FILTER (WHERE status = 'pending') AS pending
+            FROM {table}
+        ''')
+        counts = cursor.fetchone()
+        if counts['pending']:
+            conn.rollback()
+            return None
+
+        cursor.execute('''
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'submissions'
+            ORDER BY ordinal_position
+        ''')
+        columns = [r['column_name'] for r in cursor.fetchall()]
+        columns.remove('id')
+        columns.insert(0, 'id')
+        select = f"SELECT {', '.join(columns)} FROM {table}"
+        expected = (counts['rows'], counts['id_sum'])
+
+        try:
+            cursor.execute(
+                'SELECT path FROM archived_weeks WHERE week_year = %s AND week_number = %s FOR UPDATE',
+                week
+            )
+            archived = cursor.fetchone()
+            if archived:
+                previous = ARCHIVE.reader(week)
+                if previous is None or previous.path != archived['path']:
+                    raise RuntimeError(f"archive file {archived['path']} is not loaded")
+                cursor.execute('CREATE TEMP TABLE archived_rows (LIKE submissions INCLUDING DEFAULTS) ON COMMIT DROP')
+                cursor.copy_expert(f"COPY archived_rows ({', '.join(previous.columns)}) FROM STDIN", previous.stream())
+                select = f"SELECT {', '.join(columns)} FROM archived_rows UNION ALL " + select
+                expected = (expected[0] + previous.rows, expected[1] + previous.meta['id_sum'])
+
+            os.makedirs(os.path.dirname(tmp), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                writer = ArchiveWriter(f, columns, week)
+                cursor.copy_expert(f"COPY ({select} ORDER BY id) TO STDOUT", writer)
+                writer.close()
+                f.flush()
+                os.fsync(f.fileno())
+            reader = ArchiveReader(tmp)
+            if (reader.rows, reader.meta['id_sum']) != expected or not reader.verify():
+                raise ValueError(f"archive of {table} failed verification")
+            path = ARCHIVE.path(week, reader.meta['sha256'])
+            os.replace(tmp, path)
+            reader.path = path
+
+            # Keep /mystats and /stats totals whole once the rows are gone
+            cursor.execute(f'''
+                INSERT INTO archived_user_stats (user_id, total, approved, rejected)
+                SELECT user_id, COUNT(*),
+                       COUNT(*) FILTER (WHERE status = 'approved'),
+                       COUNT(*) FILTER (WHERE status = 'rejected')
+                FROM {table} GROUP BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total = archived_user_stats.total + EXCLUDED.total,
+                    approved = archived_user_stats.approved + EXCLUDED.approved,
+                    rejected = archived_user_stats.rejected + EXCLUDED.rejected
+            ''')
+            cursor.execute('''
+                INSERT INTO archived_weeks (week_year, week_number, path, row_count, sha256, min_id, max_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (week_year, week_number) DO UPDATE SET
+                    path = EXCLUDED.path, row_count = EXCLUDED.row_count, sha256 = EXCLUDED.sha256,
+                    min_id = EXCLUDED.min_id, max_id = EXCLUDED.max_id, archived_at = CURRENT_TIMESTAMP
+            ''', (week.iso_year, week.week, path, reader.rows, reader.meta['sha256'], reader.min_id, reader.max_id))
+            cursor.execute(f"DROP TABLE {table}")
+        except Exception:
+            conn.rollback()
+            # Nothing points at the new file yet
+            for leftover in (tmp, path):
+                if leftover and os.path.exists(leftover) and (previous is None or leftover != previous.path):
+                    os.remove(leftover)
+            raise
+        # Left outside the cleanup: if the commit fails without saying
+        # whether it went through, the file may be the week's archive
+        conn.commit()
+
+    WEEK_PARTITIONS.discard(week)
+    ARCHIVE.add(reader)
+    if previous is not None and previous.path != path:
+        os.remove(previous.path)
+    return counts['rows']
+
+# Load an archived week back into its partition and drop the file.
+# Returns the number of rows restored, or None if the week isn't archived.
+def restore_week(week):
+    reader = ARCHIVE.reader(week)
+    if reader is None:
+        return None
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        own_partition = ensure_week_partition(cursor, week)
+        # Staged first: the week may already hold rows that were never
+        # counted as archived. Inserted through the parent, so with rows
+        # still in submissions_default they join them there.
+        cursor.execute('CREATE TEMP TABLE restored (LIKE submissions INCLUDING DEFAULTS) ON COMMIT DROP')
+        cursor.copy_expert(f"COPY restored ({', '.join(reader.columns)}) FROM STDIN", reader.stream())
+        cursor.execute("INSERT INTO submissions SELECT * FROM restored")
+        cursor.execute('''
+            UPDATE archived_user_stats a SET
+                total = a.total - s.total,
+                approved = a.approved - s.approved,
+                rejected = a.rejected - s.rejected
+            FROM (
+                SELECT user_id, COUNT(*) AS total,
+                       COUNT(*) FILTER (WHERE status = 'approved') AS approved,
+                       COUNT(*) FILTER (WHERE status = 'rejected') AS rejected
+                FROM restored GROUP BY user_id
+            ) s
+            WHERE a.user_id = s.user_id
+        ''')
+        cursor.execute('DELETE FROM archived_weeks WHERE week_year = %s AND week_number = %s', week)
+        conn.commit()
+
+    if own_partition:
+        WEEK_PARTITIONS.add(week)
+    ARCHIVE.remove(week)
+    os.remove(reader.path)
+    return reader.rows
+
+# ==================== STORY SIMILARITY ====================
+
+# One-permutation MinHash over word 3-shingles: each shingle is hashed once
+# into one of 128 bins, so a signature costs O(words) rather than O(words x
+# permutations). LSH with 64 bands of 2 rows: a pair at 50% Jaccard shares
+# a band with probability 1 - (1 - 0.5^2)^64 > 99.99%, at 30% about 99.8%.
+# What still slips through is estimate noise: 128 bins give a standard
+# error of ~0.045 around the threshold.
+SHINGLE_WORDS = 3
+MINHASH_BINS = 128
+LSH_BANDS = 64
+LSH_ROWS = MINHASH_BINS // LSH_BANDS
+MINHASH_EMPTY = 0xFFFFFFFF
+SIMILAR_THRESHOLD = float(os.getenv('SIMILAR_THRESHOLD', 0.5))
+SIMILAR_MAX_SHOWN = 3
+# Processes used by the bulk rebuild once the table outgrows one chunk
+STORY_INDEX_WORKERS = int(os.getenv('STORY_INDEX_WORKERS', os.cpu_count() or 1))
+STORY_INDEX_CHUNK = 5000
+WORD_RE = re.compile(r'\w+')
+
+# Module level so the rebuild's worker processes can pickle it
+def story_signature(story):
+    words = WORD_RE.findall((story or '').lower())
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    
+    bins = [MINHASH_EMPTY] * MINHASH_BINS
+    for shingle in shingles:
+        h = zlib.crc32(shingle.encode())
+        b = h % MINHASH_BINS
+        v = h // MINHASH_BINS
+        if v < bins[b]:
+            bins[b] = v
+    
+    # Short stories leave bins empty; each borrows the next filled bin
+    # (offset by distance) so empty bins never match by accident
+    if MINHASH_EMPTY in bins:
+        filled = bins[:]
+        for i in range(MINHASH_BINS):
+            if bins[i] != MINHASH_EMPTY:
+                continue
+            for d in range(1, MINHASH_BINS):
+                v = bins[(i + d) % MINHASH_BINS]
+                if v != MINHASH_EMPTY:
+                    filled[i] = (v + d * 0x9E3779B1) & 0xFFFFFFFF
+                    break
+        bins = filled
+    return array('I', bins)
+
+# In-memory LSH index of every stored story, keyed by submission id.
+# Only used from the event loop; rebuilds happen on a separate instance.
+#
+# Everything lives in flat arrays, as a million stories would need tens of
+# gigabytes as dicts and lists of Python ints. A story's slot is its position
+# in _ids, and its signature is _sigs[slot * MINHASH_BINS:][:MINHASH_BINS].
+# The LSH buckets are a chained hash table: entry slot * LSH_BANDS + band
+# holds that band's 32-bit key, _heads[key & mask] is the newest entry
+# hashed there and _next[entry] the one before it. About 20 bytes per band,
+# so ~1.3 KB a story with the signature.
+class StoryIndex:
+    def __init__(self, stories=0):
+        self._ids = array('I')
+        self._owners = array('q')
+        self._sigs = array('I')
+        self._keys = array('I')
+        self._next = array('i')
+        self._heads = array('i')
+        self.reserve(stories)
+        self.last_id = 0
+        # Set while a rebuild runs, so stories added meanwhile can be replayed
+        self.journal = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    # Size the bucket table for this many stories, so a bulk load doesn't
+    # keep re-chaining it
+    def reserve(self, stories):
+        size = 1024
+        while size * 2 < stories * LSH_BANDS:
+            size *= 2
+        if size > len(self._heads):
+            self._rehash(size)
+
+    def _rehash(self, size):
+        heads = array('i', [-1]) * size
+        nxt, keys, mask = self._next, self._keys, size - 1
+        for entry in range(len(keys)):
+            head = keys[entry] & mask
+            nxt[entry] = heads[head]
+            heads[head] = entry
+        self._heads = heads
+        self._mask = mask
+
+    @staticmethod
+    def _band_keys(sig):
+        return [
+            hash((band, *sig[band * LSH_ROWS:(band + 1) * LSH_ROWS])) & 0xFFFFFFFF
+            for band in range(LSH_BANDS)
+        ]
+
+    def _slot(self, submission_id):
+        ids = self._ids
+        i = bisect_left(ids, submission_id)
+        if i < len(ids) and ids[i] == submission_id:
+            return i
+        # Ids arrive almost in order; one that didn't is found the slow way
+        try:
+            return ids.index(submission_id)
+        except ValueError:
+            return None
+
+    def add_signature(self, submission_id, user_id, sig):
+        if submission_id <= self.last_id and self._slot(submission_id) is not None:
+            return
+        # Chains average four entries before the table doubles
+        if len(self._keys) + LSH_BANDS > 4 * len(self._heads):
+            self._rehash(len(self._heads) * 2)
+        heads, mask = self._heads, self._mask
+        entry = len(self._keys)
+        for key in self._band_keys(sig):
+            self._keys.append(key)
+            self._next.append(heads[key & mask])
+            heads[key & mask] = entry
+            entry += 1
+        self._ids.append(submission_id)
+        self._owners.append(user_id)
+        self._sigs.extend(sig)
+        self.last_id = max(self.last_id, submission_id)
+        if self.journal is not None:
+            self.journal.append((submission_id, user_id, sig))
+
+    # [(submission_id, similarity, user_id)] for stories stored before `before`
+    def similar(self, sig, before, limit=SIMILAR_MAX_SHOWN):
+        keys, nxt, heads, mask = self._keys, self._next, self._heads, self._mask
+        sigs, ids = self._sigs, self._ids
+        seen = set()
+        matches = []
+        for key in self._band_keys(sig):
+            entry = heads[key & mask]
+            while entry >= 0:
+                if keys[entry] == key:
+                    slot = entry // LSH_BANDS
+                    if slot not in seen:
+                        seen.add(slot)
+                        other = ids[slot]
+                        if other < before:
+                            offset = slot * MINHASH_BINS
+                            same = sum(map(int.__eq__, sig, sigs[offset:offset + MINHASH_BINS]))
+                            score = same / MINHASH_BINS
+                            if score >= SIMILAR_THRESHOLD:
+                                matches.append((score, other, slot))
+                entry = nxt[entry]
+        matches.sort(key=lambda m: (-m[0], m[1]))
+        return [(other, score, self._owners[slot]) for score, other, slot in matches[:limit]]
+
+    # Index a new story and return its closest earlier matches
+    def add(self, submission_id, user_id, story):
+        sig = story_signature(story)
+        matches = self.similar(sig, submission_id)
+        self.add_signature(submission_id, user_id, sig)
+        return matches
+
+    def similar_to(self, submission_id):
+        slot = self._slot(submission_id)
+        if slot is None:
+            return []
+        offset = slot * MINHASH_BINS
+        return self.similar(self._sigs[offset:offset + MINHASH_BINS], submission_id)
+
+    def owner(self, submission_id):
+        slot = self._slot(submission_id)
+        return None if slot is None else self._owners[slot]
+
+    # Bytes held by the arrays, for /cache and the benchmark
+    def memory(self):
+        return sum(a.buffer_info()[1] * a.itemsize for a in (
+            self._ids, self._owners, self._sigs, self._keys, self._next, self._heads
+        ))
+
+    # Take over a freshly built index, replaying anything added during the build
+    def replace(self, other):
+        for submission_id, user_id, sig in self.journal or ():
+            other.add_signature(submission_id, user_id, sig)
+        self._ids, self._owners, self._sigs = other._ids, other._owners, other._sigs
+        self._keys, self._next, self._heads, self._mask = other._keys, other._next, other._heads, other._mask
+        self.last_id = other.last_id
+        self.journal = None
+
+STORY_INDEX = StoryIndex()
+# Rebuilds run here rather than on DB_EXECUTOR, so a long one never holds
+# a database worker while it hashes
+STORY_INDEX_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='story-index')
+
+def count_stories():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) AS count FROM submissions')
+        return cursor.fetchone()['count']
+
+# Next page of stories after after_id; the connection goes back to the pool
+# before the page is hashed
+def get_story_page(after_id, limit):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, user_id, story FROM submissions WHERE id > %s ORDER BY id LIMIT %s',
+            (after_id, limit)
+        )
+        return cursor.fetchall()
+
+# Read every story a page at a time and index it, hashing in worker
+# processes once the table is bigger than one chunk. Runs off the event loop.
+def build_story_index():
+    archived = ARCHIVE.readers()
+    index = StoryIndex(sum(reader.rows for reader in archived) + count_stories())
+    pool = None
+
+    def add_chunk(rows):
+        nonlocal pool
+        stories = [row['story'] for row in rows]
+        if pool is None and len(rows) == STORY_INDEX_CHUNK and STORY_INDEX_WORKERS > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=STORY_INDEX_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        if pool is not None:
+            sigs = pool.map(story_signature, stories, chunksize=250)
+        else:
+            sigs = map(story_signature, stories)
+        for row, sig in zip(rows, sigs):
+            index.add_signature(row['id'], int(row['user_id']), sig)
+
+    try:
+        # Archived weeks first so ids arrive in order
+        rows = ARCHIVE.iter_rows()
+        while True:
+            chunk = list(itertools.islice(rows, STORY_INDEX_CHUNK))
+            if not chunk:
+                break
+            add_chunk(chunk)
+        after_id = 0
+        while True:
+            chunk = get_story_page(after_id, STORY_INDEX_CHUNK)
+            if not chunk:
+                break
+            add_chunk(chunk)
+            after_id = chunk[-1]['id']
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return index
+
+def format_similar(matches, user_id):
+    if not matches:
+        return ''
+    parts = []
+    for other, score, owner in matches:
+        note = ', same user' if owner == user_id else ''
+        parts.append(f"#{other} ({score:.0%}{note})")
+    return "\n\n⚠️ Similar to: " + ', '.join(parts)
+
+# ==================== IDENTITY GRAPH ====================
+
+# Link token contracts too. Off by default: popular tokens are shared by
+# unrelated users and a union can't be undone.
+IDENTITY_LINK_CONTRACTS = os.getenv('IDENTITY_LINK_CONTRACTS', '0') == '1'
+IDENTITY_MAX_SHOWN = 5
+
+# Union-find over accounts and the wallets (optionally contracts) they
+# submitted with. Nodes are ('user', id) / ('wallet', addr) / ('contract',
+# addr) mapped to ints; path halving plus union by size keeps find() near
+# O(1). Each root keeps its user ids, merged small-into-large.
+class IdentityGraph:
+    def __init__(self):
+        self._ids = {}
+        self._parent = []
+        self._size = []
+        self._users = {}  # root -> user ids in the cluster
+
+    def __len__(self):
+        return len(self._parent)
+
+    def _node(self, key):
+        node = self._ids.get(key)
+        if node is None:
+            node = self._ids[key] = len(self._parent)
+            self._parent.append(node)
+            self._size.append(1)
+            if key[0] == 'user':
+                self._users[node] = [key[1]]
+        return node
+
+    def _find(self, node):
+        parent = self._parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
+        moved = self._users.pop(b, None)
+        if moved:
+            users = self._users.get(a)
+            if users is None:
+                self._users[a] = moved
+            elif len(users) < len(moved):
+                moved.extend(users)
+                self._users[a] = moved
+            else:
+                users.extend(moved)
+
+    def link(self, user_id, wallet, contract=None):
+        user = self._node(('user', user_id))
+        if wallet:
+            self._union(user, self._node(('wallet', normalize_wallet(wallet))))
+        if contract and IDENTITY_LINK_CONTRACTS:
+            self._union(user, self._node(('contract', normalize_wallet(contract))))
+
+    # (accounts in the cluster, other user ids up to limit)
+    def cluster(self, user_id, limit=IDENTITY_MAX_SHOWN):
+        node = self._ids.get(('user', user_id))
+        if node is None:
+            return 1, []
+        users = self._users.get(self._find(node), ())
+        others = []
+        for other in users:
+            if other != user_id:
+                others.append(other)
+                if len(others) >= limit:
+                    break
+        return max(len(users), 1), others
+
+IDENTITY_GRAPH = IdentityGraph()
+
+# Cold start: stream every submission's identifiers into the graph
+def load_identity_graph(graph=IDENTITY_GRAPH):
+    with db_conn() as conn:
+        cursor = conn.cursor(name='identity_graph_load')
+        cursor.itersize = 10000
+        cursor.execute('SELECT user_id, wallet_address, contract_address FROM submissions')
+        for row in cursor:
+            graph.link(row['user_id'], row['wallet_address'], row['contract_address'])
+        cursor.close()
+    for row in ARCHIVE.iter_rows():
+        graph.link(int(row['user_id']), row['wallet_address'], row['contract_address'])
+
+def format_cluster(user_id):
+    size, others = IDENTITY_GRAPH.cluster(user_id)
+    if size <= 1:
+        return ''
+    names = []
+    for other in others:
+        username = LEADERBOARD.username(other)
+        names.append(f"@{username} ({other})" if username else str(other))
+    more = f" +{size - 1 - len(others)} more" if size - 1 > len(others) else ''
+    return f"\n👥 Linked accounts: {size} — " + ', '.join(names) + more
+
+# ==================== REVIEW QUEUE ====================
+
+REVIEW_PAGE_SIZE = int(os.getenv('REVIEW_PAGE_SIZE', 25))
+# Start loading the next page when this few cards are left in the buffer
+REVIEW_PREFETCH_AT = int(os.getenv('REVIEW_PREFETCH_AT', 5))
+REVIEW_PREVIEW_CHARS = 200
+
+# Next page of pending submissions after the (submitted_at, id) cursor.
+# Only the columns a review card shows are fetched, not the whole story.
+def get_pending_page(after_submitted_at, after_id, limit, skipped_ids, reviewer_id):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, user_id, username, story_type, wallet_address, amount,
+                   LEFT(story, %s) AS story_preview,
+                   LENGTH(story) AS story_length,
+                   submitted_at
+            FROM submissions
+            WHERE status = 'pending'
+              AND (submitted_at, id) > (%s, %s)
+              AND id <> ALL(%s::int[])
+              AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < CURRENT_TIMESTAMP)
+            ORDER BY submitted_at, id
+            LIMIT %s
+        ''', (REVIEW_PREVIEW_CHARS, after_submitted_at, after_id, skipped_ids, reviewer_id, limit))
+        return cursor.fetchall()
+
+# Atomically take (or renew) a pending submission for one reviewer. Fails if
+# another reviewer holds an unexpired lease; SKIP LOCKED means a concurrent
+# claim on the same row fails fast instead of queueing behind it.
+def claim_submission(submission_id, reviewer_id, lease=REVIEW_LEASE_SECONDS):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE submissions
+            SET claimed_by = %s,
+                claim_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = (
+                SELECT id FROM submissions
+                WHERE id = %s
+                  AND status = 'pending'
+                  AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < CURRENT_TIMESTAMP)
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        ''', (reviewer_id, lease, submission_id, reviewer_id))
+        claimed = cursor.fetchone() is not None
+        conn.commit()
+        return claimed
+
+# Where a submission stands, to tell a reviewer why their action didn't apply
+def get_review_status(submission_id):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT status, reviewed_by, claimed_by, claim_expires_at > CURRENT_TIMESTAMP AS claim_live
+            FROM submissions WHERE id = %s
+        ''', (submission_id,))
+        return cursor.fetchone()
+
+def review_conflict_text(row):
+    if row is None:
+        return "🔒 Story no longer exists"
+    if row['status'] == 'approved':
+        return f"✅ Already approved by {row['reviewed_by']}"
+    if row['status'] == 'rejected':
+        return f"❌ Already rejected by {row['reviewed_by']}"
+    if row['claimed_by'] is not None and row['claim_live']:
+        return f"🔒 Claimed by reviewer {row['claimed_by']}"
+    return "🔒 Claimed by another reviewer"
+
+def release_claim(submission_id, reviewer_id):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE submissions SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = %s AND claimed_by = %s
+        ''', (submission_id, reviewer_id))
+        conn.commit()
+
+# Reviews per reviewer over the last 7 days
+def get_reviewer_stats():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT reviewed_by,
+                   COUNT(*) AS week,
+                   COUNT(*) FILTER (WHERE reviewed_at > CURRENT_TIMESTAMP - INTERVAL '1 day') AS day,
+                   COUNT(*) FILTER (WHERE reviewed_at > CURRENT_TIMESTAMP - INTERVAL '1 hour') AS hour,
+                   COUNT(*) FILTER (WHERE status = 'approved') AS approved,
+                   COUNT(*) FILTER (WHERE status = 'rejected') AS rejected
+            FROM submissions
+            WHERE reviewed_by IS NOT NULL
+              AND reviewed_at > CURRENT_TIMESTAMP - INTERVAL '7 days'
+            GROUP BY reviewed_by
+            ORDER BY week DESC
+        ''')
+        return cursor.fetchall()
+
+def count_pending_submissions():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) as count FROM submissions WHERE status = 'pending'")
+        return cursor.fetchone()['count']
+
+# One reviewer's walk through the pending backlog, oldest first. Pages are
+# keyset-paginated on (submitted_at, id) and the next page is fetched in the
+# background while the current one is reviewed. Skipped ids are left out of
+# every later page until the reviewer resets them. Each card is claimed
+# before it is shown, so reviewers sharing the backlog never get the same one.
+# Cards another reviewer held when the cursor passed them are behind it, so
+# a pass that claimed anything is followed by another from the start, to
+# pick up whatever they have let go of since.
+class ReviewQueue:
+    def __init__(self, reviewer_id, skipped=()):
+        self.reviewer_id = reviewer_id
+        self.skipped = set(skipped)
+        self.restart()
+
+    def restart(self):
+        self._cursor = (datetime.min, 0)
+        self._buffer = deque()
+        self._prefetch = None
+        self._exhausted = False
+        self._claimed = False
+
+    async def _fetch(self):
+        rows = await run_db(
+            get_pending_page, self._cursor[0], self._cursor[1],
+            REVIEW_PAGE_SIZE, list(self.skipped), self.reviewer_id
+        )
+        if rows:
+            self._cursor = (rows[-1]['submitted_at'], rows[-1]['id'])
+        if len(rows) < REVIEW_PAGE_SIZE:
+            self._exhausted = True
+        return rows
+
+    def prefetch(self):
+        if self._prefetch is None and not self._exhausted:
+            self._prefetch = asyncio.create_task(self._fetch())
+
+    async def next(self):
+        while True:
+            if not self._buffer:
+                self.prefetch()
+                if self._prefetch is None:
+                    if not self._claimed:
+                        return None
+                    self.restart()
+                    continue
+                task, self._prefetch = self._prefetch, None
+                self._buffer.extend(await task)
+                continue
+            sub = self._buffer.popleft()
+            if sub['id'] in self.skipped:
+                continue
+            if len(self._buffer) <= REVIEW_PREFETCH_AT:
+                self.prefetch()
+            if not await run_db(claim_submission, sub['id'], self.reviewer_id):
+                # Taken by another reviewer since the page was loaded
+                continue
+            self._claimed = True
+            return sub
+
+    def skip(self, submission_id):
+        self.skipped.add(submission_id)
+
+def is_reviewer(user_id):
+    return user_id in REVIEWER_IDS
+
+# Active review queues by reviewer id
+REVIEW_QUEUES = {}
+
+def render_review_card(sub):
+    emoji = "📉" if sub['story_type'] == 'rekt' else "🚀"
+    more = '...' if sub['story_length'] > REVIEW_PREVIEW_CHARS else ''
+    return f"""{emoji} #{sub['id']} | @{sub['username']}{format_cluster(sub['user_id'])}
+💳 {sub['wallet_address'][:20]}...
+💰 {sub['amount']}
+
+📖 {sub['story_preview']}{more}""" + format_similar(
+        STORY_INDEX.similar_to(sub['id']), STORY_INDEX.owner(sub['id'])
+    )
+
+# Send the reviewer's next card, if they are working through /pending
+async def send_next_review(context, reviewer_id):
+    queue = REVIEW_QUEUES.get(reviewer_id)
+    if queue is None:
+        return
+    
+    sub = await queue.next()
+    
+    if sub is None:
+        del REVIEW_QUEUES[reviewer_id]
+        text = "✅ Review queue done!"
+        if queue.skipped:
+            text += f"\n\n⏭️ {len(queue.skipped)} skipped. /pending reset to go through them again."
+        await context.bot.send_message(chat_id=reviewer_id, text=text)
+        return
+    
+    await context.bot.send_message(
+        chat_id=reviewer_id,
+        text=render_review_card(sub),
+        reply_markup=review_keyboard(sub['id'])
+    )
 
-💡 Commands: /cancel to exit, /back to go back
+# ==================== USER COMMANDS ====================
 
-Choose your story type:"""
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    context.user_data.clear()
     
-    keyboard = [
-        [
-            InlineKeyboardButton("📉 REKT Story", callback_data="type_rekt"),
-            InlineKeyboardButton("🚀 MOON Story", callback_data="type_moon")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await KNOWN_USERS.ensure(user.id, user.username or user.first_name)
+    if LEADERBOARD.touch(user.id, user.username or user.first_name):
+        RENDER_CACHE.invalidate('leaderboard')
     
-    await update.message.reply_text(welcome_text, reply_markup=reply_markup)
+    # Check if submissions are open
+    if not is_submissions_open():
+        await update.message.reply_text(SUBMISSIONS_CLOSED_TEXT)
+        return ConversationHandler.END
+    
+    # Check rate limit
+    if await is_user_rate_limited(user.id):
+        await update.message.reply_text(ALREADY_SUBMITTED_TEXT)
+        return ConversationHandler.END
+    
+    days, hours = get_time_until_close()
+    welcome_text = WELCOME_HEAD + f"{days} days, {hours} hours" + WELCOME_TAIL
+    
+    await update.message.reply_text(welcome_text, reply_markup=STORY_TYPE_KEYBOARD)
     return STORY_TYPE
 
 async def story_type_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    story_type = query.data.replace('type_', '')
+    _, story_type = decode_callback(query.data)
     context.user_data['story_type'] = story_type
     
-    if story_type == 'rekt':
-        prompt = "📉 REKT STORY SUBMISSION\n\nLet's document your loss for the community.\n\nFirst, what's your wallet address?\n\n(/cancel to exit | /back to go back)"
-    else:
-        prompt = "🚀 MOON STORY SUBMISSION\n\nLet's celebrate your win!\n\nFirst, what's your wallet address?\n\n(/cancel to exit | /back to go back)"
-    
-    await query.edit_message_text(prompt)
+    await query.edit_message_text(REKT_PROMPT if story_type == 'rekt' else MOON_PROMPT)
     return WALLET
 
 async def back_to_story_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [
-            InlineKeyboardButton("📉 REKT Story", callback_data="type_rekt"),
-            InlineKeyboardButton("🚀 MOON Story", callback_data="type_moon")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text("⬅️ Choose your story type:", reply_markup=reply_markup)
+    await update.message.reply_text("⬅️ Choose your story type:", reply_markup=STORY_TYPE_KEYBOARD)
     return STORY_TYPE
 
 async def back_to_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -339,11 +3259,12 @@ async def collect_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_valid_wallet(wallet):
         await update.message.reply_text(
             "⚠️ Invalid wallet address!\n\n"
-            "Must be 26-128 characters. Try again:"
+            f"Supported: {ADDRESS_FORMATS_TEXT}.\n"
+            "Check for typos or a wrong checksum and try again:"
         )
         return WALLET
     
-    if check_wallet_rate_limit(wallet):
+    if await is_wallet_rate_limited(wallet):
         await update.message.reply_text(
             "⚠️ This wallet already submitted today!\n\n"
             "One submission per wallet per 24 hours. 🙏"
@@ -360,7 +3281,8 @@ async def collect_contract(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_valid_contract(contract):
         await update.message.reply_text(
             "⚠️ Invalid contract address!\n\n"
-            "Must be 26-128 characters. Try again:"
+            f"Supported: {ADDRESS_FORMATS_TEXT}.\n"
+            "Check for typos or a wrong checksum and try again:"
         )
         return CONTRACT
     
@@ -425,46 +3347,31 @@ async def collect_story(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 Is everything correct?"""
     
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Submit", callback_data="confirm_yes"),
-            InlineKeyboardButton("❌ Cancel", callback_data="confirm_no")
-        ],
-        [InlineKeyboardButton("⬅️ Edit Story", callback_data="confirm_back")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(confirm_text, reply_markup=reply_markup)
+    await update.message.reply_text(confirm_text, reply_markup=CONFIRM_KEYBOARD)
     return CONFIRM
 
 async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    action = query.data
+    _, action = decode_callback(query.data)
     
-    if action == "confirm_no":
+    if action == "no":
         context.user_data.clear()
         await query.edit_message_text("❌ Cancelled. Send /start to try again.")
         return ConversationHandler.END
     
-    elif action == "confirm_back":
+    elif action == "back":
         await query.edit_message_text("⬅️ Tell us your story (20-750 chars):")
         return STORY
     
-    elif action == "confirm_yes":
+    elif action == "yes":
         user = query.from_user
         story_type = context.user_data['story_type']
-        week_num = get_week_number()
+        week = current_week()
         
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO submissions 
-            (user_id, username, story_type, wallet_address, contract_address, amount, story, week_number)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (
+        submission_id = await run_db(
+            insert_submission,
             user.id,
             user.username or user.first_name,
             story_type,
@@ -472,11 +3379,13 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             context.user_data['contract'],
             context.user_data['amount'],
             context.user_data['story'],
-            week_num
-        ))
-        submission_id = cursor.fetchone()['id']
-        conn.commit()
-        conn.close()
+            week
+        )
+        RENDER_CACHE.invalidate('week', week)
+        similar = STORY_INDEX.add(submission_id, user.id, context.user_data['story'])
+        IDENTITY_GRAPH.link(user.id, context.user_data['wallet'], context.user_data['contract'])
+        USER_LIMITER.record(user.id)
+        WALLET_LIMITER.record(normalize_wallet(context.user_data['wallet']))
         
         # Notify admin
         emoji = "📉" if story_type == 'rekt' else "🚀"
@@ -484,24 +3393,15 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         admin_text = f"""{emoji} NEW {type_text} STORY #{submission_id}
 
-👤 @{user.username or 'No username'} ({user.id})
-💳 {context.user_data['wallet']}
-📜 {context.user_data['contract']}
+👤 @{user.username or 'No username'} ({user.id}){format_cluster(user.id)}
+💳 {context.user_data['wallet']} ({detect_address(context.user_data['wallet'])})
+📜 {context.user_data['contract']} ({detect_address(context.user_data['contract'])})
 💰 {context.user_data['amount']}
 
 📖 Story:
-{context.user_data['story']}"""
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Approve", callback_data=f"review_approve_{submission_id}"),
-                InlineKeyboardButton("❌ Reject", callback_data=f"review_reject_{submission_id}")
-            ],
-            [InlineKeyboardButton("⏭️ Skip", callback_data=f"review_skip_{submission_id}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+{context.user_data['story']}""" + format_similar(similar, user.id)
         
-        await context.bot.send_message(chat_id=ADMIN_ID, text=admin_text, reply_markup=reply_markup)
+        OUTBOX.send(ADMIN_ID, admin_text, review_keyboard(submission_id))
         
         # Confirm to user
         await query.edit_message_text(
@@ -510,6 +3410,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             "Good luck! 🍀"
         )
         
+        CONVERSATIONS.complete('submission', user.id)
         context.user_data.clear()
         return ConversationHandler.END
 
@@ -522,40 +3423,12 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def mystats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    ensure_user(user.id, user.username)
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get user moondust
-    cursor.execute('SELECT total_moondust FROM users WHERE telegram_id = %s', (user.id,))
-    user_data = cursor.fetchone()
-    total_moondust = user_data['total_moondust'] if user_data else 0
-    
-    # Get submission stats
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total,
-            COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved,
-            COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected,
-            COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending
-        FROM submissions WHERE user_id = %s
-    ''', (user.id,))
-    stats = cursor.fetchone()
-    
-    # Get rank
-    cursor.execute('''
-        SELECT COUNT(*) + 1 as rank FROM users 
-        WHERE total_moondust > (SELECT total_moondust FROM users WHERE telegram_id = %s)
-    ''', (user.id,))
-    rank_data = cursor.fetchone()
-    rank = rank_data['rank'] if rank_data else 0
-    
-    # Check if user is a champion
-    cursor.execute('SELECT COUNT(*) as wins FROM champions WHERE user_id = %s', (user.id,))
-    wins = cursor.fetchone()['wins']
+    await KNOWN_USERS.ensure(user.id, user.username)
+    if LEADERBOARD.touch(user.id, user.username):
+        RENDER_CACHE.invalidate('leaderboard')
     
-    conn.close()
+    total_moondust, stats, wins = await run_db(get_user_stats, user.id)
+    rank = LEADERBOARD.rank(user.id)
     
     trophy = "🏆 " if wins > 0 else ""
     
@@ -578,90 +3451,74 @@ async def mystats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT telegram_id, username, total_moondust 
-        FROM users 
-        ORDER BY total_moondust DESC 
-        LIMIT 10
-    ''')
-    top_users = cursor.fetchall()
-    
-    # Get user rank
-    cursor.execute('''
-        SELECT COUNT(*) + 1 as rank FROM users 
-        WHERE total_moondust > (SELECT COALESCE(total_moondust, 0) FROM users WHERE telegram_id = %s)
-    ''', (user.id,))
-    rank_data = cursor.fetchone()
-    user_rank = rank_data['rank'] if rank_data else 0
-    
-    cursor.execute('SELECT total_moondust FROM users WHERE telegram_id = %s', (user.id,))
-    user_moondust = cursor.fetchone()
-    user_moondust = user_moondust['total_moondust'] if user_moondust else 0
-    
-    conn.close()
+    user_rank = LEADERBOARD.rank(user.id)
+    user_moondust = LEADERBOARD.score(user.id)
     
-    medals = ['🥇', '🥈', '🥉']
-    
-    text = "🏆 MOONDUST LEADERBOARD\n\n"
-    
-    for i, u in enumerate(top_users):
-        medal = medals[i] if i < 3 else f"{i+1}."
-        name = u['username'] or 'Anonymous'
-        text += f"{medal} @{name} — {u['total_moondust']:,} Moondust\n"
+    # The top 10 is the same for everyone; only the rank line is per user
+    text = RENDER_CACHE.get(('leaderboard',))
+    if text is None:
+        top_users = LEADERBOARD.top(10)
+        
+        medals = ['🥇', '🥈', '🥉']
+        
+        text = "🏆 MOONDUST LEADERBOARD\n\n"
+        
+        for i, u in enumerate(top_users):
+            medal = medals[i] if i < 3 else f"{i+1}."
+            name = u['username'] or 'Anonymous'
+            text += f"{medal} @{name} — {u['total_moondust']:,} Moondust\n"
+        
+        text += f"\n━━━━━━━━━━━━━━━\n"
+        RENDER_CACHE.set(('leaderboard',), text)
     
-    text += f"\n━━━━━━━━━━━━━━━\n"
     text += f"Your rank: #{user_rank} ({user_moondust:,} Moondust)"
     
     await update.message.reply_text(text)
 
 async def champions(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM champions 
-        ORDER BY week_number DESC 
-        LIMIT 10
-    ''')
-    champs = cursor.fetchall()
-    conn.close()
-    
-    if not champs:
-        await update.message.reply_text("🏆 HALL OF CHAMPIONS\n\nNo champions yet! Be the first!")
+    text = RENDER_CACHE.get(('champions',))
+    if text is not None:
+        await update.message.reply_text(text)
         return
     
-    text = "⭐ HALL OF CHAMPIONS\n\n"
+    champs = await run_db(get_champions)
     
-    for c in champs:
-        preview = c['story_preview'][:50] + "..." if len(c['story_preview'] or '') > 50 else c['story_preview']
-        text += f"""🏆 Week {c['week_number']} | @{c['username']}
+    if not champs:
+        text = "🏆 HALL OF CHAMPIONS\n\nNo champions yet! Be the first!"
+    else:
+        text = "⭐ HALL OF CHAMPIONS\n\n"
+        
+        for c in champs:
+            preview = c['story_preview'][:50] + "..." if len(c['story_preview'] or '') > 50 else c['story_preview']
+            text += f"""🏆 Week {format_week(c['week_year'], c['week_number'])} | @{c['username']}
    "{preview}"
    Score: {c['total_moondust']:,} | Prize: 5000⭐
 
 """
     
+    RENDER_CACHE.set(('champions',), text)
     await update.message.reply_text(text)
 
 async def week_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    week_num = get_week_number()
+    week = current_week()
     is_open = is_submissions_open()
     
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE week_number = %s', (week_num,))
-    submissions = cursor.fetchone()['count']
-    conn.close()
-    
     if is_open:
         days, hours = get_time_until_close()
         status = f"🟢 OPEN\n\n⏰ Closes in: {days} days, {hours} hours"
     else:
         status = "🔴 CLOSED\n\n📊 Review in progress. Results at 20:00 UTC!"
     
-    text = f"""📅 WEEK {week_num} STATUS
+    # The countdown is part of the key, so a new hour renders fresh
+    key = ('week', week, status)
+    text = RENDER_CACHE.get(key)
+    if text is not None:
+        await update.message.reply_text(text)
+        return
+    
+    submissions = await run_db(count_week_submissions, week)
+    
+    text = f"""📅 WEEK {format_week(*week)} STATUS
 
 {status}
 
@@ -669,74 +3526,48 @@ async def week_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 💡 Submit your story with /start"""
     
+    RENDER_CACHE.set(key, text)
     await update.message.reply_text(text)
 
 # ==================== ADMIN COMMANDS ====================
 
 async def admin_pending(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != ADMIN_ID:
+    reviewer_id = update.effective_user.id
+    if not is_reviewer(reviewer_id):
         return
     
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM submissions 
-        WHERE status = 'pending'
-        ORDER BY submitted_at ASC 
-        LIMIT 10
-    ''')
-    submissions = cursor.fetchall()
-    conn.close()
+    skipped = context.user_data.get('review_skipped', [])
+    if context.args and context.args[0] == 'reset':
+        skipped = []
+        context.user_data.pop('review_skipped', None)
     
-    if not submissions:
+    queue = ReviewQueue(reviewer_id, skipped)
+    REVIEW_QUEUES[reviewer_id] = queue
+    queue.prefetch()
+    
+    pending = await run_db(count_pending_submissions)
+    
+    if not pending:
+        del REVIEW_QUEUES[reviewer_id]
         await update.message.reply_text("✅ No pending submissions!")
         return
     
-    await update.message.reply_text(f"📋 {len(submissions)} pending submissions:\n")
+    skipped_note = f" ({len(queue.skipped)} skipped)" if queue.skipped else ""
+    await update.message.reply_text(f"📋 {pending} pending submissions{skipped_note}\n")
     
-    for sub in submissions:
-        emoji = "📉" if sub['story_type'] == 'rekt' else "🚀"
-        
-        text = f"""{emoji} #{sub['id']} | @{sub['username']}
-💳 {sub['wallet_address'][:20]}...
-💰 {sub['amount']}
-
-📖 {sub['story'][:200]}{'...' if len(sub['story']) > 200 else ''}"""
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Approve", callback_data=f"review_approve_{sub['id']}"),
-                InlineKeyboardButton("❌ Reject", callback_data=f"review_reject_{sub['id']}")
-            ],
-            [InlineKeyboardButton("⏭️ Skip", callback_data=f"review_skip_{sub['id']}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(text, reply_markup=reply_markup)
+    await send_next_review(context, reviewer_id)
 
 async def admin_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    week_num = get_week_number()
+    week = current_week()
     
-    cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = %s', ('pending',))
-    pending = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE week_number = %s', (week_num,))
-    this_week = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE week_number = %s AND status = %s', (week_num, 'approved'))
-    approved_week = cursor.fetchone()['count']
-    
-    conn.close()
+    pending, this_week, approved_week = await run_db(get_admin_status, week)
     
     text = f"""📊 ADMIN STATUS
 
-📅 Week: {week_num}
+📅 Week: {format_week(*week)}
 ⏰ Submissions: {'OPEN' if is_submissions_open() else 'CLOSED'}
 
 📋 Pending: {pending}
@@ -744,9 +3575,17 @@ async def admin_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ✅ Approved this week: {approved_week}
 
 Commands:
-/pending - Review submissions
+/pending - Review submissions (/pending reset to revisit skipped)
 /stats - Full statistics
-/champion - Set weekly winner"""
+/champion - Set weekly winner
+/broadcast - Message all users
+/reviewers - Reviewer throughput
+/rebuild - Recompute balances from ledger
+/reindex - Rebuild story similarity index
+/revalidate - Re-check and tag stored addresses
+/archive - Archive old weeks (list, search, show, verify, restore)
+/pool - DB pool metrics (full set on /metrics)
+/cache - Render cache metrics"""
     
     await update.message.reply_text(text)
 
@@ -754,22 +3593,7 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) as count FROM users')
-    total_users = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM submissions')
-    total_subs = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COALESCE(SUM(total_moondust), 0) as total FROM users')
-    total_moondust = cursor.fetchone()['total']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM champions')
-    total_champions = cursor.fetchone()['count']
-    
-    conn.close()
+    total_users, total_subs, total_moondust, total_champions = await run_db(get_full_stats)
     
     text = f"""📈 FULL STATISTICS
 
@@ -780,137 +3604,218 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(text)
 
+async def admin_pool(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+    
+    stats = DB_POOL.stats()
+    
+    text = f"""🗄️ DB POOL
+
+🔌 Connections: {stats['size']}/{stats['max']} ({stats['in_use']} in use, {stats['idle']} idle)
+⏳ Waiting: {stats['waiting']}
+📥 Checkouts: {stats['checkouts']:,}
+⏱️ Checkout latency: avg {stats['checkout_avg_ms']:.2f}ms, max {stats['checkout_max_ms']:.2f}ms
+🗑️ Discarded: {stats['discarded']} | Timeouts: {stats['timeouts']}"""
+    
+    await update.message.reply_text(text)
+
+async def admin_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+    
+    stats = RENDER_CACHE.stats()
+    users = KNOWN_USERS.stats()
+    
+    text = f"""🧊 RENDER CACHE
+
+📦 Entries: {stats['entries']}
+✅ Hits: {stats['hits']:,}
+❌ Misses: {stats['misses']:,}
+🎯 Hit rate: {stats['hit_rate']:.1%}
+🧹 Invalidated: {stats['invalidations']:,}
+
+👤 KNOWN USERS
+
+📦 Cached: {users['size']:,}
+✅ Skipped writes: {users['hits']:,}
+🆕 Inserts: {users['inserts']:,}
+✏️ Renames queued: {users['renames']:,} ({users['pending']} pending)
+
+🔍 STORY INDEX
+
+📦 Stories: {len(STORY_INDEX):,}
+💾 Memory: {STORY_INDEX.memory() / 2**20:,.1f} MB"""
+    
+    await update.message.reply_text(text)
+
+async def reviewer_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_reviewer(update.effective_user.id):
+        return
+    
+    rows = await run_db(get_reviewer_stats)
+    
+    if not rows:
+        await update.message.reply_text("👀 No reviews in the last 7 days.")
+        return
+    
+    text = "👀 REVIEWERS (last 7 days)\n\n"
+    for r in rows:
+        text += (
+            f"{r['reviewed_by']}: {r['week']} reviewed "
+            f"({r['approved']}✅ {r['rejected']}❌)\n"
+            f"   today {r['day']} | last hour {r['hour']}\n"
+        )
+    
+    await update.message.reply_text(text)
+
 async def admin_review_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    if query.from_user.id != ADMIN_ID:
+    if not is_reviewer(query.from_user.id):
         await query.answer("Not authorized!", show_alert=True)
         return
     
     await query.answer()
     
-    parts = query.data.split('_')
-    action = parts[1]
-    submission_id = int(parts[2])
+    _, action, submission_id = decode_callback(query.data)
     
     if action == "skip":
+        skipped = set(context.user_data.get('review_skipped', []))
+        skipped.add(submission_id)
+        context.user_data['review_skipped'] = sorted(skipped)
+        queue = REVIEW_QUEUES.get(query.from_user.id)
+        if queue is not None:
+            queue.skip(submission_id)
+        await run_db(release_claim, submission_id, query.from_user.id)
         await query.edit_message_text(query.message.text + "\n\n⏭️ Skipped for later")
+        await send_next_review(context, query.from_user.id)
         return
     
-    elif action == "reject":
+    # Approving or rejecting needs this reviewer to hold the claim
+    if action in ("approve", "reject"):
+        if not await run_db(claim_submission, submission_id, query.from_user.id):
+            row = await run_db(get_review_status, submission_id)
+            await query.edit_message_text(query.message.text + "\n\n" + review_conflict_text(row))
+            await send_next_review(context, query.from_user.id)
+            return
+    
+    if action == "reject":
         # Show rejection reasons
-        keyboard = []
-        for key, reason in REJECTION_REASONS.items():
-            keyboard.append([InlineKeyboardButton(reason, callback_data=f"reject_{key}_{submission_id}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data=f"review_back_{submission_id}")])
-        
         await query.edit_message_text(
             query.message.text + "\n\n❌ Select rejection reason:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=rejection_keyboard(submission_id)
         )
         return
     
     elif action == "approve":
         # Start scoring
         context.user_data['scoring_submission'] = submission_id
+        context.user_data['claimed_at'] = time.time()
         context.user_data['scores'] = {}
         context.user_data['current_criteria'] = 0
         context.user_data['original_message'] = query.message.text
         
         criteria = CRITERIA[0]
-        name = CRITERIA_NAMES[criteria]
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("200", callback_data=f"score_{criteria}_200"),
-                InlineKeyboardButton("400", callback_data=f"score_{criteria}_400"),
-                InlineKeyboardButton("600", callback_data=f"score_{criteria}_600"),
-                InlineKeyboardButton("800", callback_data=f"score_{criteria}_800"),
-                InlineKeyboardButton("1000", callback_data=f"score_{criteria}_1000")
-            ],
-            [InlineKeyboardButton("❌ Cancel Scoring", callback_data="score_cancel")]
-        ]
-        
         await query.edit_message_text(
-            f"📊 SCORING #{submission_id}\n\n{name}:\n\nSelect score (200-1000):",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            score_prompt(submission_id, criteria),
+            reply_markup=SCORE_KEYBOARDS[criteria]
         )
         return
     
     elif action == "back":
-        # Go back to approve/reject
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Approve", callback_data=f"review_approve_{submission_id}"),
-                InlineKeyboardButton("❌ Reject", callback_data=f"review_reject_{submission_id}")
-            ],
-            [InlineKeyboardButton("⏭️ Skip", callback_data=f"review_skip_{submission_id}")]
-        ]
-        
-        # Remove the rejection prompt
+        # Go back to approve/reject, removing the rejection prompt
         original = query.message.text.split("\n\n❌")[0]
-        await query.edit_message_text(original, reply_markup=InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text(original, reply_markup=review_keyboard(submission_id))
         return
 
 async def handle_rejection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    if query.from_user.id != ADMIN_ID:
+    if not is_reviewer(query.from_user.id):
         await query.answer("Not authorized!", show_alert=True)
         return
     
     await query.answer()
     
-    parts = query.data.split('_')
-    reason_key = parts[1]
-    submission_id = int(parts[2])
-    reason_text = REJECTION_REASONS.get(reason_key, 'Unknown')
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE submissions 
-        SET status = 'rejected', rejection_reason = %s, reviewed_at = %s
-        WHERE id = %s
-        RETURNING user_id
-    ''', (reason_text, datetime.now(), submission_id))
+    _, reason_key, submission_id = decode_callback(query.data)
+    reason_text = REJECTION_REASONS[reason_key]
     
-    result = cursor.fetchone()
-    user_id = result['user_id'] if result else None
+    user_id = await run_db(reject_submission, submission_id, reason_text, query.from_user.id)
     
-    conn.commit()
-    conn.close()
+    if user_id is None:
+        row = await run_db(get_review_status, submission_id)
+        await query.edit_message_text(query.message.text.split("\n\n❌")[0] + "\n\n" + review_conflict_text(row))
+        await send_next_review(context, query.from_user.id)
+        return
     
     # Notify user
     if user_id:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"❌ Your story #{submission_id} was rejected.\n\nReason: {reason_text}\n\nYou can submit a new story tomorrow."
-            )
-        except:
-            pass
+        OUTBOX.send(
+            user_id,
+            f"❌ Your story #{submission_id} was rejected.\n\nReason: {reason_text}\n\nYou can submit a new story tomorrow."
+        )
     
     await query.edit_message_text(
         query.message.text.split("\n\n❌")[0] + f"\n\n❌ REJECTED: {reason_text}"
     )
+    await send_next_review(context, query.from_user.id)
+
+# Drop scoring progress but keep the reviewer's other state (skipped ids)
+def clear_scoring(context):
+    for key in ('scoring_submission', 'claimed_at', 'scores', 'current_criteria', 'original_message'):
+        context.user_data.pop(key, None)
+
+# Keep the claim alive while the reviewer is still scoring. It is renewed
+# once half the lease has gone, so most taps cost no query. False (and
+# scoring dropped) if the lease lapsed and someone else took the story.
+async def renew_scoring_claim(query, context):
+    if time.time() - context.user_data.get('claimed_at', 0) < REVIEW_LEASE_SECONDS / 2:
+        return True
+    submission_id = context.user_data['scoring_submission']
+    if await run_db(claim_submission, submission_id, query.from_user.id):
+        context.user_data['claimed_at'] = time.time()
+        return True
+    row = await run_db(get_review_status, submission_id)
+    if row and row['status'] == 'pending' and (
+        row['claimed_by'] in (None, query.from_user.id) or not row['claim_live']
+    ):
+        # Nobody else holds it: the claim skipped a row this reviewer's own
+        # double tap has locked. approve_submission checks the claim again.
+        return True
+    clear_scoring(context)
+    await query.edit_message_text(f"Story #{submission_id}: {review_conflict_text(row)}. Score not saved.")
+    await send_next_review(context, query.from_user.id)
+    return False
 
 async def handle_scoring(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
-    if query.from_user.id != ADMIN_ID:
+    if not is_reviewer(query.from_user.id):
         await query.answer("Not authorized!", show_alert=True)
         return
     
     await query.answer()
     
-    if query.data == "score_cancel":
-        context.user_data.clear()
+    callback = decode_callback(query.data)
+    op = callback[1] if callback[0] == 'scoring' else None
+    
+    if op == "cancel":
+        submission_id = context.user_data.get('scoring_submission')
+        if submission_id is not None:
+            await run_db(release_claim, submission_id, query.from_user.id)
+        clear_scoring(context)
         await query.edit_message_text(query.message.text + "\n\n❌ Scoring cancelled. Story still pending.")
         return
     
-    if query.data == "score_back":
+    if context.user_data.get('scoring_submission') is None:
+        # Second tap on a confirm that already went through, or a score tap
+        # after scoring was cancelled
+        return
+    if not await renew_scoring_claim(query, context):
+        return
+    
+    if op == "back":
         current = context.user_data.get('current_criteria', 0)
         if current > 0:
             context.user_data['current_criteria'] = current - 1
@@ -920,126 +3825,70 @@ async def handle_scoring(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 del context.user_data['scores'][criteria]
         
         criteria = CRITERIA[context.user_data['current_criteria']]
-        name = CRITERIA_NAMES[criteria]
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("200", callback_data=f"score_{criteria}_200"),
-                InlineKeyboardButton("400", callback_data=f"score_{criteria}_400"),
-                InlineKeyboardButton("600", callback_data=f"score_{criteria}_600"),
-                InlineKeyboardButton("800", callback_data=f"score_{criteria}_800"),
-                InlineKeyboardButton("1000", callback_data=f"score_{criteria}_1000")
-            ],
-            [
-                InlineKeyboardButton("⬅️ Back", callback_data="score_back"),
-                InlineKeyboardButton("❌ Cancel", callback_data="score_cancel")
-            ]
-        ]
-        
         submission_id = context.user_data['scoring_submission']
         await query.edit_message_text(
-            f"📊 SCORING #{submission_id}\n\n{name}:\n\nSelect score (200-1000):",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            score_prompt(submission_id, criteria),
+            reply_markup=SCORE_KEYBOARDS[criteria]
         )
         return
     
-    if query.data.startswith("score_confirm"):
+    if op == "confirm":
         # Final save
-        submission_id = context.user_data['scoring_submission']
+        submission_id = context.user_data.get('scoring_submission')
+        if submission_id is None:
+            # A double tap whose twin saved while this one renewed the claim
+            return
         scores = context.user_data['scores']
         total = sum(scores.values())
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE submissions 
-            SET status = 'approved',
-                score_authenticity = %s,
-                score_emotional = %s,
-                score_lesson = %s,
-                score_detail = %s,
-                score_storytelling = %s,
-                total_moondust = %s,
-                reviewed_at = %s
-            WHERE id = %s
-            RETURNING user_id, username, story
-        ''', (
-            scores.get('authenticity', 0),
-            scores.get('emotional', 0),
-            scores.get('lesson', 0),
-            scores.get('detail', 0),
-            scores.get('storytelling', 0),
-            total,
-            datetime.now(),
-            submission_id
-        ))
-        
-        result = cursor.fetchone()
-        user_id = result['user_id']
+        user_id = await run_db(approve_submission, submission_id, scores, query.from_user.id)
         
-        # Add moondust to user
-        cursor.execute('''
-            UPDATE users SET total_moondust = total_moondust + %s
-            WHERE telegram_id = %s
-        ''', (total, user_id))
+        if user_id is None:
+            clear_scoring(context)
+            row = await run_db(get_review_status, submission_id)
+            await query.edit_message_text(f"Story #{submission_id}: {review_conflict_text(row)}. Score not saved.")
+            await send_next_review(context, query.from_user.id)
+            return
         
-        conn.commit()
-        conn.close()
+        LEADERBOARD.add(user_id, total)
+        RENDER_CACHE.invalidate('leaderboard')
         
         # Notify user
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"✅ Your story #{submission_id} was approved!\n\n"
-                     f"✨ You earned {total:,} Moondust!\n\n"
-                     f"Breakdown:\n"
-                     f"🔍 Authenticity: {scores.get('authenticity', 0)}\n"
-                     f"💔 Emotional: {scores.get('emotional', 0)}\n"
-                     f"📚 Lesson: {scores.get('lesson', 0)}\n"
-                     f"📋 Detail: {scores.get('detail', 0)}\n"
-                     f"✍️ Storytelling: {scores.get('storytelling', 0)}\n\n"
-                     f"Check /leaderboard to see your rank!"
-            )
-        except:
-            pass
+        OUTBOX.send(
+            user_id,
+            f"✅ Your story #{submission_id} was approved!\n\n"
+            f"✨ You earned {total:,} Moondust!\n\n"
+            f"Breakdown:\n"
+            f"🔍 Authenticity: {scores.get('authenticity', 0)}\n"
+            f"💔 Emotional: {scores.get('emotional', 0)}\n"
+            f"📚 Lesson: {scores.get('lesson', 0)}\n"
+            f"📋 Detail: {scores.get('detail', 0)}\n"
+            f"✍️ Storytelling: {scores.get('storytelling', 0)}\n\n"
+            f"Check /leaderboard to see your rank!"
+        )
         
-        context.user_data.clear()
+        clear_scoring(context)
         
         await query.edit_message_text(
             query.message.text + f"\n\n✅ APPROVED: {total:,} Moondust"
         )
+        await send_next_review(context, query.from_user.id)
         return
     
-    if query.data == "score_redo":
+    if op == "redo":
         context.user_data['scores'] = {}
         context.user_data['current_criteria'] = 0
         
         criteria = CRITERIA[0]
-        name = CRITERIA_NAMES[criteria]
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("200", callback_data=f"score_{criteria}_200"),
-                InlineKeyboardButton("400", callback_data=f"score_{criteria}_400"),
-                InlineKeyboardButton("600", callback_data=f"score_{criteria}_600"),
-                InlineKeyboardButton("800", callback_data=f"score_{criteria}_800"),
-                InlineKeyboardButton("1000", callback_data=f"score_{criteria}_1000")
-            ],
-            [InlineKeyboardButton("❌ Cancel", callback_data="score_cancel")]
-        ]
-        
         submission_id = context.user_data['scoring_submission']
         await query.edit_message_text(
-            f"📊 SCORING #{submission_id}\n\n{name}:\n\nSelect score (200-1000):",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            score_prompt(submission_id, criteria),
+            reply_markup=SCORE_KEYBOARDS[criteria]
         )
         return
     
     # Regular score selection
-    parts = query.data.split('_')
-    criteria = parts[1]
-    score = int(parts[2])
+    _, criteria, score = callback
     
     context.user_data['scores'][criteria] = score
     current = context.user_data['current_criteria']
@@ -1048,28 +3897,10 @@ async def handle_scoring(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Next criteria
         context.user_data['current_criteria'] = current + 1
         next_criteria = CRITERIA[current + 1]
-        name = CRITERIA_NAMES[next_criteria]
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("200", callback_data=f"score_{next_criteria}_200"),
-                InlineKeyboardButton("400", callback_data=f"score_{next_criteria}_400"),
-                InlineKeyboardButton("600", callback_data=f"score_{next_criteria}_600"),
-                InlineKeyboardButton("800", callback_data=f"score_{next_criteria}_800"),
-                InlineKeyboardButton("1000", callback_data=f"score_{next_criteria}_1000")
-            ],
-            [
-                InlineKeyboardButton("⬅️ Back", callback_data="score_back"),
-                InlineKeyboardButton("❌ Cancel", callback_data="score_cancel")
-            ]
-        ]
-        
         submission_id = context.user_data['scoring_submission']
-        progress = f"({current + 2}/{len(CRITERIA)})"
-        
         await query.edit_message_text(
-            f"📊 SCORING #{submission_id} {progress}\n\n{name}:\n\nSelect score (200-1000):",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            score_prompt(submission_id, next_criteria),
+            reply_markup=SCORE_KEYBOARDS[next_criteria]
         )
     else:
         # Show confirmation
@@ -1089,83 +3920,104 @@ async def handle_scoring(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 Confirm?"""
         
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Confirm", callback_data="score_confirm"),
-                InlineKeyboardButton("🔄 Redo", callback_data="score_redo")
-            ],
-            [InlineKeyboardButton("❌ Cancel", callback_data="score_cancel")]
-        ]
-        
-        await query.edit_message_text(summary, reply_markup=InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text(summary, reply_markup=SCORE_SUMMARY_KEYBOARD)
 
 async def admin_set_champion(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
     
-    week_num = get_week_number()
+    week = current_week()
+    week_label = format_week(*week)
     
-    conn = get_db()
-    cursor = conn.cursor()
+    winner, existing = await run_db(set_week_champion, week)
+    
+    if not winner:
+        await update.message.reply_text("❌ No approved submissions this week!")
+        return
+    
+    if existing:
+        await update.message.reply_text(
+            f"⚠️ Week {week_label} champion already set!\n\n"
+            f"🏆 @{existing['username']} — {existing['total_moondust']:,} Moondust"
+        )
+        return
+    
+    RENDER_CACHE.invalidate('champions')
+    
+    # Notify winner
+    OUTBOX.send(
+        winner['user_id'],
+        f"🏆🎉 CONGRATULATIONS! 🎉🏆\n\n"
+        f"You are the Week {week_label} CHAMPION!\n\n"
+        f"Your story scored {winner['total_moondust']:,} Moondust!\n\n"
+        f"⭐ 5000 Telegram Stars coming your way!\n\n"
+        f"Thank you for sharing your story! 🙏"
+    )
+    
+    await update.message.reply_text(
+        f"🏆 WEEK {week_label} CHAMPION SET!\n\n"
+        f"Winner: @{winner['username']}\n"
+        f"Score: {winner['total_moondust']:,} Moondust\n"
+        f"Story #{winner['id']}\n\n"
+        f"User has been notified. Send them 5000⭐!"
+    )
+
+async def admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return ConversationHandler.END
+    
+    await update.message.reply_text("📣 Send the message to broadcast to all users:\n\n(/cancel to exit)")
+    return ADMIN_BROADCAST
+
+async def broadcast_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text
+    context.user_data['broadcast_text'] = text
+    
+    recipients = await run_db(count_broadcast_recipients)
+    
+    await update.message.reply_text(
+        f"📣 BROADCAST PREVIEW\n\n{text}\n\n━━━━━━━━━━━━━━━\n👥 Recipients: {recipients:,}",
+        reply_markup=BROADCAST_CONFIRM_KEYBOARD
+    )
+    return ADMIN_BROADCAST
+
+async def broadcast_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    
+    if query.from_user.id != ADMIN_ID:
+        await query.answer("Not authorized!", show_alert=True)
+        return ConversationHandler.END
     
-    # Find highest scoring approved submission this week
-    cursor.execute('''
-        SELECT * FROM submissions 
-        WHERE week_number = %s AND status = 'approved'
-        ORDER BY total_moondust DESC, submitted_at ASC
-        LIMIT 1
-    ''', (week_num,))
+    await query.answer()
     
-    winner = cursor.fetchone()
+    text = context.user_data.pop('broadcast_text', None)
     
-    if not winner:
-        await update.message.reply_text("❌ No approved submissions this week!")
-        conn.close()
-        return
+    if decode_callback(query.data)[1] == "cancel" or text is None:
+        await query.edit_message_text("❌ Broadcast cancelled.")
+        return ConversationHandler.END
     
-    # Check if champion already set
-    cursor.execute('SELECT * FROM champions WHERE week_number = %s', (week_num,))
-    existing = cursor.fetchone()
+    row = await run_db(create_broadcast, text)
+    start_broadcast(row, context.bot)
+    CONVERSATIONS.complete('broadcast', query.from_user.id)
     
-    if existing:
-        await update.message.reply_text(
-            f"⚠️ Week {week_num} champion already set!\n\n"
-            f"🏆 @{existing['username']} — {existing['total_moondust']:,} Moondust"
-        )
-        conn.close()
+    await query.edit_message_text(
+        f"📣 Broadcast #{row['id']} started to {row['total']:,} users.\n\n"
+        f"Progress updates will follow. /stopbroadcast to cancel."
+    )
+    return ConversationHandler.END
+
+async def admin_stop_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
         return
     
-    # Set champion
-    story_preview = winner['story'][:100]
-    
-    cursor.execute('''
-        INSERT INTO champions (week_number, user_id, username, submission_id, story_preview, total_moondust)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    ''', (week_num, winner['user_id'], winner['username'], winner['id'], story_preview, winner['total_moondust']))
-    
-    conn.commit()
-    conn.close()
+    if not BROADCASTS:
+        await update.message.reply_text("No broadcast running.")
+        return
     
-    # Notify winner
-    try:
-        await context.bot.send_message(
-            chat_id=winner['user_id'],
-            text=f"🏆🎉 CONGRATULATIONS! 🎉🏆\n\n"
-                 f"You are the Week {week_num} CHAMPION!\n\n"
-                 f"Your story scored {winner['total_moondust']:,} Moondust!\n\n"
-                 f"⭐ 5000 Telegram Stars coming your way!\n\n"
-                 f"Thank you for sharing your story! 🙏"
-        )
-    except:
-        pass
+    for broadcast in BROADCASTS.values():
+        broadcast.cancelled = True
     
-    await update.message.reply_text(
-        f"🏆 WEEK {week_num} CHAMPION SET!\n\n"
-        f"Winner: @{winner['username']}\n"
-        f"Score: {winner['total_moondust']:,} Moondust\n"
-        f"Story #{winner['id']}\n\n"
-        f"User has been notified. Send them 5000⭐!"
-    )
+    await update.message.reply_text(f"⏹️ Stopping {len(BROADCASTS)} broadcast(s)...")
 
 async def admin_undo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
@@ -1182,42 +4034,15 @@ async def admin_undo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Invalid ID. Usage: /undo <submission_id>")
         return
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get current submission
-    cursor.execute('SELECT * FROM submissions WHERE id = %s', (submission_id,))
-    sub = cursor.fetchone()
+    sub = await run_db(undo_submission, submission_id, update.effective_user.id)
     
     if not sub:
         await update.message.reply_text(f"❌ Submission #{submission_id} not found!")
-        conn.close()
         return
     
-    # If was approved, remove moondust from user
     if sub['status'] == 'approved' and sub['total_moondust'] > 0:
-        cursor.execute('''
-            UPDATE users SET total_moondust = total_moondust - %s
-            WHERE telegram_id = %s
-        ''', (sub['total_moondust'], sub['user_id']))
-    
-    # Reset to pending
-    cursor.execute('''
-        UPDATE submissions 
-        SET status = 'pending', 
-            rejection_reason = NULL,
-            score_authenticity = 0,
-            score_emotional = 0,
-            score_lesson = 0,
-            score_detail = 0,
-            score_storytelling = 0,
-            total_moondust = 0,
-            reviewed_at = NULL
-        WHERE id = %s
-    ''', (submission_id,))
-    
-    conn.commit()
-    conn.close()
+        LEADERBOARD.add(sub['user_id'], -sub['total_moondust'])
+        RENDER_CACHE.invalidate('leaderboard')
     
     await update.message.reply_text(
         f"✅ Submission #{submission_id} reset to pending.\n\n"
@@ -1225,39 +4050,1063 @@ async def admin_undo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Moondust removed: {sub['total_moondust']}"
     )
 
-# ==================== HEALTH CHECK ====================
+async def admin_rebuild(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+    
+    fixed = await run_db(rebuild_balances)
+    # Load on the event loop so readers never see a half-built board
+    LEADERBOARD.load(await run_db(get_balances))
+    RENDER_CACHE.invalidate('leaderboard')
+    
+    await update.message.reply_text(
+        f"✅ Balances rebuilt from the moondust ledger.\n\n"
+        f"Users corrected: {fixed}"
+    )
 
-class HealthHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b'Bot is running!')
+async def admin_reindex(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+    
+    if STORY_INDEX.journal is not None:
+        await update.message.reply_text("⏳ Reindex already running.")
+        return
+    
+    await update.message.reply_text("⏳ Rebuilding story similarity index...")
+    started = time.monotonic()
+    STORY_INDEX.journal = []
+    try:
+        index = await asyncio.get_running_loop().run_in_executor(STORY_INDEX_EXECUTOR, build_story_index)
+    except Exception:
+        STORY_INDEX.journal = None
+        raise
+    STORY_INDEX.replace(index)
     
-    def log_message(self, format, *args):
+    await update.message.reply_text(
+        f"✅ Story index rebuilt: {len(STORY_INDEX):,} stories in {time.monotonic() - started:.1f}s"
+    )
+
+async def admin_revalidate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
         return
+    
+    await update.message.reply_text("⏳ Re-validating stored addresses...")
+    started = time.monotonic()
+    counts = await run_db(revalidate_addresses)
+    
+    text = f"✅ Addresses re-validated in {time.monotonic() - started:.1f}s\n\n💳 Wallets by format:\n"
+    for chain, n in sorted(counts.items(), key=lambda c: -c[1]):
+        text += f"- {chain}: {n:,}\n"
+    
+    await update.message.reply_text(text)
 
-def run_health_server():
-    port = int(os.getenv('PORT', 10000))
-    server = HTTPServer(('0.0.0.0', port), HealthHandler)
-    print(f"Health check server running on port {port}")
-    server.serve_forever()
+ARCHIVE_USAGE = (
+    "🗄️ /archive - archive weeks older than the last {weeks}\n"
+    "/archive list - archived weeks\n"
+    "/archive search <text> - search archived stories\n"
+    "/archive show <id> - one archived submission\n"
+    "/archive verify - re-check every archive file\n"
+    "/archive restore <year> <week> - load a week back into the database"
+)
 
-# ==================== MAIN ====================
+def format_archived(row):
+    week = format_week(row['week_year'], row['week_number'])
+    story = row['story'] or ''
+    more = '...' if len(story) > REVIEW_PREVIEW_CHARS else ''
+    return f"#{row['id']} | @{row['username']} | Week {week} | {row['status']}\n📖 {story[:REVIEW_PREVIEW_CHARS]}{more}"
 
-def main():
-    init_db()
+async def admin_archive(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+    
+    args = context.args or []
+    action = args[0] if args else 'run'
+    
+    if action == 'run':
+        if not ARCHIVE_DIR:
+            await update.message.reply_text(
+                "❌ ARCHIVE_DIR is not set. Point it at persistent storage first: "
+                "archived rows are deleted from the database and the files are the only copy."
+            )
+            return
+        cutoff = CALENDAR.at(datetime.utcnow() - timedelta(weeks=ARCHIVE_AFTER_WEEKS)).key
+        weeks = await run_db(archivable_weeks, cutoff)
+        if not weeks:
+            await update.message.reply_text(f"✅ Nothing to archive (keeping the last {ARCHIVE_AFTER_WEEKS} weeks).")
+            return
+        
+        await update.message.reply_text(f"⏳ Archiving {len(weeks)} weeks...")
+        started = time.monotonic()
+        archived = 0
+        lines = []
+        for week in weeks:
+            label = format_week(*week)
+            try:
+                rows = await run_db(archive_week, week)
+            except Exception as e:
+                lines.append(f"❌ Week {label}: {e}")
+                continue
+            if rows is None:
+                lines.append(f"⏭️ Week {label}: stories still pending")
+            else:
+                archived += rows
+                lines.append(f"✅ Week {label}: {rows:,} stories")
+        
+        await update.message.reply_text(
+            f"🗄️ Archived {archived:,} stories in {time.monotonic() - started:.1f}s\n\n" + '\n'.join(lines)
+        )
+    
+    elif action == 'list':
+        readers = ARCHIVE.readers()
+        if not readers:
+            await update.message.reply_text("🗄️ No archived weeks.")
+            return
+        text = "🗄️ ARCHIVED WEEKS\n\n"
+        for reader in readers[:30]:
+            size = os.path.getsize(reader.path) / 1024
+            text += f"Week {format_week(*reader.week)}: {reader.rows:,} stories, {size:,.0f} KB\n"
+        if len(readers) > 30:
+            text += f"... +{len(readers) - 30} older"
+        await update.message.reply_text(text)
+    
+    elif action == 'search' and len(args) > 1:
+        query = ' '.join(args[1:])
+        rows = await run_db(ARCHIVE.search, query)
+        if not rows:
+            await update.message.reply_text(f"🔍 No archived stories match \"{query}\".")
+            return
+        await update.message.reply_text(
+            f"🔍 {len(rows)} archived matches for \"{query}\":\n\n" + '\n\n'.join(format_archived(r) for r in rows)
+        )
+    
+    elif action == 'show' and len(args) == 2 and args[1].isdigit():
+        row = await run_db(ARCHIVE.get, int(args[1]))
+        if row is None:
+            await update.message.reply_text(f"❌ #{args[1]} is not in the archive.")
+            return
+        emoji = "📉" if row['story_type'] == 'rekt' else "🚀"
+        await update.message.reply_text(
+            f"{emoji} #{row['id']} | @{row['username']} ({row['user_id']})\n"
+            f"📅 Week {format_week(row['week_year'], row['week_number'])} | {row['status']} | {row['total_moondust']} Moondust\n"
+            f"💳 {row['wallet_address']}\n"
+            f"📄 {row['contract_address']}\n"
+            f"💰 {row['amount']}\n\n"
+            f"📖 {row['story']}"
+        )
+    
+    elif action == 'verify':
+        await update.message.reply_text(f"⏳ Verifying {len(ARCHIVE)} archived weeks...")
+        bad = await run_db(verify_archive)
+        if bad:
+            await update.message.reply_text(
+                "❌ Failed verification: " + ', '.join(f"Week {format_week(*w)}" for w in bad)
+            )
+        else:
+            await update.message.reply_text("✅ All archive files verified.")
+    
+    elif action == 'restore' and len(args) == 3 and args[1].isdigit() and args[2].isdigit():
+        week = Week(int(args[1]), int(args[2]))
+        rows = await run_db(restore_week, week)
+        if rows is None:
+            await update.message.reply_text(f"❌ Week {format_week(*week)} is not archived.")
+            return
+        RENDER_CACHE.invalidate('week', week)
+        await update.message.reply_text(f"✅ Week {format_week(*week)} restored: {rows:,} stories")
     
-    health_thread = Thread(target=run_health_server, daemon=True)
-    health_thread.start()
+    else:
+        await update.message.reply_text(ARCHIVE_USAGE.format(weeks=ARCHIVE_AFTER_WEEKS))
+
+# Callback routes outside of conversations, by callback name
+CALLBACK_ROUTES = {
+    'review': admin_review_action,
+    'reject': handle_rejection,
+    'score': handle_scoring,
+    'scoring': handle_scoring,
+}
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    callback = decode_callback(query.data)
+    handler = CALLBACK_ROUTES.get(callback[0]) if callback else None
+    
+    if handler is None:
+        # Stale, forged, or a conversation button pressed out of its state
+        await query.answer("This button has expired.")
+        return
+    
+    await handler(update, context)
+
+# ==================== BROADCAST ====================
+
+# Paced by SEND_BUDGET, shared with the outbox
+BROADCAST_PAGE = int(os.getenv('BROADCAST_PAGE', 1000))
+BROADCAST_MAX_IN_FLIGHT = int(os.getenv('BROADCAST_MAX_IN_FLIGHT', 16))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 15))
+
+# Running broadcasts by id
+BROADCASTS = {}
+
+# Count users a broadcast would reach
+def count_broadcast_recipients():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) as count FROM users WHERE blocked_at IS NULL')
+        return cursor.fetchone()['count']
+
+def create_broadcast(text):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO broadcasts (text, total)
+            VALUES (%s, (SELECT COUNT(*) FROM users WHERE blocked_at IS NULL))
+            RETURNING *
+        ''', (text,))
+        row = cursor.fetchone()
+        conn.commit()
+        return row
+
+# Broadcasts interrupted by a restart
+def get_running_broadcasts():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id")
+        return cursor.fetchall()
+
+# Next page of recipients after the checkpoint, in primary key order
+def get_broadcast_recipients(after_user_id, limit):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT telegram_id FROM users
+            WHERE telegram_id > %s AND blocked_at IS NULL
+            ORDER BY telegram_id
+            LIMIT %s
+        ''', (after_user_id, limit))
+        return [row['telegram_id'] for row in cursor.fetchall()]
+
+# Save progress and newly blocked users in one transaction
+def save_broadcast_checkpoint(broadcast_id, last_user_id, sent, failed, blocked, blocked_ids, status):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        if blocked_ids:
+            cursor.execute(
+                'UPDATE users SET blocked_at = CURRENT_TIMESTAMP WHERE telegram_id = ANY(%s)',
+                (blocked_ids,)
+            )
+        cursor.execute('''
+            UPDATE broadcasts
+            SET last_user_id = %s, sent = %s, failed = %s, blocked = %s, status = %s,
+                finished_at = CASE WHEN %s = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END
+            WHERE id = %s
+        ''', (last_user_id, sent, failed, blocked, status, status, broadcast_id))
+        conn.commit()
+
+# Sends one message to every unblocked user, a page at a time. Progress is
+# checkpointed after each page (last telegram_id reached plus counters), so
+# a restart resumes where it stopped. Users who blocked the bot are marked
+# and skipped by later broadcasts.
+class Broadcast:
+    def __init__(self, row):
+        self.id = row['id']
+        self.text = row['text']
+        self.total = row['total']
+        self.last_user_id = row['last_user_id']
+        self.sent = row['sent']
+        self.failed = row['failed']
+        self.blocked = row['blocked']
+        self.cancelled = False
+        self.stopping = False
+        self.task = None
+        self._started = time.monotonic()
+        self._started_done = self.done()
+
+    def done(self):
+        return self.sent + self.failed + self.blocked
+
+    def rate(self):
+        elapsed = time.monotonic() - self._started
+        return (self.done() - self._started_done) / elapsed if elapsed > 0 else 0.0
+
+    def progress_text(self, status='running'):
+        done = self.done()
+        pct = done / self.total if self.total else 1.0
+        rate = self.rate()
+        if status != 'running':
+            eta = status.upper()
+        elif rate > 0:
+            eta = str(timedelta(seconds=int(max(self.total - done, 0) / rate)))
+        else:
+            eta = '…'
+        return (
+            f"📣 BROADCAST #{self.id}\n\n"
+            f"📊 Progress: {done:,}/{self.total:,} ({pct:.1%})\n"
+            f"✅ Sent: {self.sent:,}\n"
+            f"🚫 Blocked: {self.blocked:,}\n"
+            f"⚠️ Failed: {self.failed:,}\n"
+            f"⚡ Rate: {rate:.1f}/s\n"
+            f"⏳ ETA: {eta}"
+        )
+
+    async def _send(self, bot, user_id, blocked_ids):
+        for attempt in range(3):
+            try:
+                await bot.send_message(chat_id=user_id, text=self.text)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                SEND_BUDGET.pause(retry_after)
+                await asyncio.sleep(retry_after)
+            except (Forbidden, BadRequest):
+                # Blocked the bot, deactivated, or never started it
+                blocked_ids.append(user_id)
+                self.blocked += 1
+                return
+            except Exception:
+                await asyncio.sleep(2 ** attempt)
+        self.failed += 1
+
+    async def _report(self, bot, status_message, status='running'):
+        if status_message is None:
+            return
+        try:
+            await status_message.edit_text(self.progress_text(status))
+        except Exception:
+            pass
+
+    async def run(self, bot):
+        try:
+            status_message = await bot.send_message(chat_id=ADMIN_ID, text=self.progress_text())
+        except Exception:
+            status_message = None
+        last_report = time.monotonic()
+        
+        while not (self.cancelled or self.stopping):
+            page = await run_db(get_broadcast_recipients, self.last_user_id, BROADCAST_PAGE)
+            if not page:
+                break
+            
+            blocked_ids = []
+            in_flight = set()
+            last_dispatched = self.last_user_id
+            for user_id in page:
+                if self.cancelled or self.stopping:
+                    break
+                wait = SEND_BUDGET.ready_in()
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = SEND_BUDGET.ready_in()
+                SEND_BUDGET.take()
+                
+                if len(in_flight) >= BROADCAST_MAX_IN_FLIGHT:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                task = asyncio.create_task(self._send(bot, user_id, blocked_ids))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                last_dispatched = user_id
+                
+                if time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await self._report(bot, status_message)
+            
+            if in_flight:
+                await asyncio.wait(in_flight)
+            self.last_user_id = last_dispatched
+            await run_db(
+                save_broadcast_checkpoint, self.id, self.last_user_id,
+                self.sent, self.failed, self.blocked, blocked_ids, 'running'
+            )
+            KNOWN_USERS.forget(blocked_ids)
+        
+        if self.stopping:
+            # Left as 'running' so the next start resumes from the checkpoint
+            return
+        status = 'cancelled' if self.cancelled else 'done'
+        await run_db(
+            save_broadcast_checkpoint, self.id, self.last_user_id,
+            self.sent, self.failed, self.blocked, [], status
+        )
+        await self._report(bot, status_message, status)
+
+def start_broadcast(row, bot):
+    broadcast = Broadcast(row)
+    BROADCASTS[broadcast.id] = broadcast
+    broadcast.task = asyncio.create_task(broadcast.run(bot))
+    broadcast.task.add_done_callback(lambda _: BROADCASTS.pop(broadcast.id, None))
+    return broadcast
+
+async def resume_broadcasts(bot):
+    for row in await run_db(get_running_broadcasts):
+        print(f"Resuming broadcast #{row['id']} after user {row['last_user_id']}")
+        start_broadcast(row, bot)
+
+# Finish the current page and checkpoint, without marking broadcasts done
+async def stop_broadcasts():
+    tasks = []
+    for broadcast in list(BROADCASTS.values()):
+        broadcast.stopping = True
+        tasks.append(broadcast.task)
+    if tasks:
+        await asyncio.wait(tasks, timeout=30)
+
+# ==================== PERSISTENCE ====================
+
+# 'postgres', 'file' or 'none'
+PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 'postgres')
+PERSISTENCE_FILE = os.getenv('PERSISTENCE_FILE', 'bot_state.pickle')
+# Seconds between persistence batches - changes in between are coalesced
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', 5))
+
+# Load persisted rows of one kind as {key: decoded json}
+def get_persisted(kind, name=''):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT key, data FROM bot_persistence WHERE kind = %s AND name = %s',
+            (kind, name)
+        )
+        return {row['key']: json.loads(row['data']) for row in cursor.fetchall()}
+
+# Write one batch of persistence changes in a single transaction
+# upserts: [(kind, name, key, data)], deletes: [(kind, name, key)]
+def save_persisted(upserts, deletes):
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        if upserts:
+            execute_values(cursor, '''
+                INSERT INTO bot_persistence (kind, name, key, data)
+                VALUES %s
+                ON CONFLICT (kind, name, key) DO UPDATE
+                SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP
+            ''', upserts)
+        if deletes:
+            cursor.executemany(
+                'DELETE FROM bot_persistence WHERE kind = %s AND name = %s AND key = %s',
+                deletes
+            )
+        conn.commit()
+
+# Stores user_data (submission drafts, admin scoring progress) and
+# ConversationHandler states in bot_persistence. PTB already calls the
+# update_* methods once per update_interval; those calls only buffer, and a
+# single task writes the whole batch in one transaction.
+class PostgresPersistence(BasePersistence):
+    def __init__(self, update_interval=PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._pending = {}  # (kind, name, key) -> json text, None to delete
+        self._writer = None
+
+    def _buffer(self, kind, name, key, data):
+        self._pending[(kind, name, key)] = None if data is None else json.dumps(data)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        # Let the rest of this update_persistence() round buffer first
+        await asyncio.sleep(0)
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        upserts = [k + (data,) for k, data in batch.items() if data is not None]
+        deletes = [k for k, data in batch.items() if data is None]
+        try:
+            await run_db(save_persisted, upserts, deletes)
+        except Exception as e:
+            # Put the batch back unless something newer replaced it
+            for k, data in batch.items():
+                self._pending.setdefault(k, data)
+            print(f"Persistence write failed, will retry: {e}")
+
+    async def get_user_data(self):
+        rows = await run_db(get_persisted, 'user_data')
+        return {int(key): data for key, data in rows.items()}
+
+    async def get_conversations(self, name):
+        rows = await run_db(get_persisted, 'conversation', name)
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def update_user_data(self, user_id, data):
+        self._buffer('user_data', '', str(user_id), data or None)
+
+    async def update_conversation(self, name, key, new_state):
+        self._buffer('conversation', name, json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id):
+        self._buffer('user_data', '', str(user_id), None)
+
+    async def flush(self):
+        if self._writer is not None:
+            await self._writer
+        await self._write()
+
+    # chat_data, bot_data and callback_data are not stored
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+def build_persistence():
+    if PERSISTENCE_BACKEND == 'postgres':
+        return PostgresPersistence()
+    if PERSISTENCE_BACKEND == 'file':
+        return PicklePersistence(
+            filepath=PERSISTENCE_FILE,
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=PERSISTENCE_INTERVAL
+        )
+    return None
+
+# ==================== UPDATE PROCESSING ====================
+
+# Updates handled at the same time across all users
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 32))
+# Updates allowed in flight (running or waiting for their user's turn)
+UPDATE_BACKLOG = int(os.getenv('UPDATE_BACKLOG', 1024))
+
+# Runs updates concurrently but strictly in arrival order per user, so the
+# ConversationHandler steps and the admin scoring flow never race.
+# The base class semaphore only bounds the backlog; the worker semaphore is
+# taken after the user's lock so one user's queue can't hold every slot.
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=CONCURRENT_UPDATES, backlog=UPDATE_BACKLOG):
+        super().__init__(max(backlog, max_concurrent_updates))
+        self.concurrency = max_concurrent_updates
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}  # key -> [lock, tasks holding or waiting]
+        self.active = 0
+        self.db_calls = 0
+
+    @staticmethod
+    def update_key(update):
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return ('user', update.effective_user.id)
+            if update.effective_chat is not None:
+                return ('chat', update.effective_chat.id)
+        return None
+
+    @staticmethod
+    def update_kind(update):
+        if isinstance(update, Update):
+            if update.callback_query is not None:
+                return 'callback_query'
+            if update.message is not None:
+                return 'command' if (update.message.text or '').startswith('/') else 'message'
+        return 'other'
+
+    async def do_process_update(self, update, coroutine):
+        metrics = UPDATE_METRICS.get(self.update_kind(update))
+        # Each update runs in its own task, so this is private to it
+        calls = [0]
+        token = UPDATE_DB_CALLS.set(calls)
+        start = time.perf_counter()
+        try:
+            await self._process_in_order(update, coroutine)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.observe(time.perf_counter() - start)
+            UPDATE_DB_CALLS.reset(token)
+            self.db_calls += calls[0]
+
+    async def _process_in_order(self, update, coroutine):
+        key = self.update_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+        
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    self.active += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.active -= 1
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    # Users with updates running or queued
+    def queued_users(self):
+        return len(self._locks)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+UPDATE_PROCESSOR = PerUserUpdateProcessor()
+
+# ==================== METRICS ====================
+# Histogram bucket upper bounds in seconds, shared by every latency metric
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# /ready asks Telegram directly if nothing has come back from the API for this long
+READY_TELEGRAM_MAX_AGE = float(os.getenv('READY_TELEGRAM_MAX_AGE', 60))
+
+# Only touched from the event loop, so no locking - an observation is a
+# bisect and three increments
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count', 'errors')
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(METRIC_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+# One histogram per label value, created on first use
+class HistogramFamily:
+    def __init__(self, name, label, help_text):
+        self.name = name
+        self.label = label
+        self.help_text = help_text
+        self.in_flight = 0
+        self._children = {}
+
+    def get(self, value):
+        child = self._children.get(value)
+        if child is None:
+            child = self._children[value] = Histogram()
+        return child
+
+    # Observations across all label values
+    def total(self):
+        return sum(h.count for h in self._children.values())
+
+    def render(self, lines):
+        metric = f"rekterapy_{self.name}_seconds"
+        lines.append(f"# HELP {metric} {self.help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for value, h in sorted(self._children.items()):
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, n in zip(METRIC_BUCKETS, h.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum{{{label}}} {h.sum:.6f}')
+            lines.append(f'{metric}_count{{{label}}} {h.count}')
+        lines.append(f"# TYPE rekterapy_{self.name}_errors_total counter")
+        for value, h in sorted(self._children.items()):
+            lines.append(f'rekterapy_{self.name}_errors_total{{{self.label}="{value}"}} {h.errors}')
+
+HANDLER_METRICS = HistogramFamily('handler', 'handler', 'Time spent in each update handler')
+DB_METRICS = HistogramFamily('db_call', 'helper', 'Time from run_db() call to result, including executor wait')
+API_METRICS = HistogramFamily('telegram_api', 'method', 'Bot API request latency')
+UPDATE_METRICS = HistogramFamily('update', 'kind', 'Time from an update arriving to its handlers finishing, including per-user wait')
+
+STATE_NAMES = {
+    STORY_TYPE: 'story_type',
+    WALLET: 'wallet',
+    CONTRACT: 'contract',
+    AMOUNT: 'amount',
+    STORY: 'story',
+    CONFIRM: 'confirm',
+    ADMIN_SCORING: 'admin_scoring',
+    ADMIN_BROADCAST: 'admin_broadcast'
+}
+
+# Where users are in each conversation, and where they leave. Any END that
+# isn't preceded by complete() counts as a drop-off in the state it left.
+# In memory only, so it starts empty after a restart.
+class ConversationTracker:
+    def __init__(self):
+        self._current = {}
+        self.dropoffs = {}
+        self.completed = {}
+
+    def transition(self, conversation, user_id, state):
+        key = (conversation, user_id)
+        if state == ConversationHandler.END:
+            left = self._current.pop(key, None)
+            if left is not None:
+                drop = (conversation, STATE_NAMES.get(left, left))
+                self.dropoffs[drop] = self.dropoffs.get(drop, 0) + 1
+        else:
+            self._current[key] = state
+
+    def complete(self, conversation, user_id):
+        self._current.pop((conversation, user_id), None)
+        self.completed[conversation] = self.completed.get(conversation, 0) + 1
+
+    def active(self):
+        counts = {}
+        for (conversation, _), state in self._current.items():
+            key = (conversation, STATE_NAMES.get(state, state))
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+CONVERSATIONS = ConversationTracker()
+
+# Wrap a handler callback with timing, and state tracking inside conversations
+def instrument(callback, conversation=None):
+    metrics = HANDLER_METRICS.get(callback.__name__)
+
+    @wraps(callback)
+    async def timed(update, context):
+        start = time.perf_counter()
+        try:
+            result = await callback(update, context)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.observe(time.perf_counter() - start)
+        if conversation is not None and result is not None and update.effective_user:
+            CONVERSATIONS.transition(conversation, update.effective_user.id, result)
+        return result
+    return timed
+
+def instrument_handlers(app):
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                inner = list(handler.entry_points) + list(handler.fallbacks)
+                for state_handlers in handler.states.values():
+                    inner.extend(state_handlers)
+                for h in inner:
+                    h.callback = instrument(h.callback, handler.name)
+            else:
+                handler.callback = instrument(handler.callback)
+    # Routes are module level, so only wrap them the first time
+    for name, callback in CALLBACK_ROUTES.items():
+        if not hasattr(callback, '__wrapped__'):
+            CALLBACK_ROUTES[name] = instrument(callback)
+
+# Times every Bot API call, whichever code path made it
+class TimedRequest(HTTPXRequest):
+    # time.monotonic() of the last HTTP response of any status
+    last_response = 0.0
+
+    async def do_request(self, url, method, *args, **kwargs):
+        metrics = API_METRICS.get(url.rsplit('/', 1)[-1])
+        start = time.perf_counter()
+        try:
+            result = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.observe(time.perf_counter() - start)
+        TimedRequest.last_response = time.monotonic()
+        return result
+
+# ==================== HTTP SERVER ====================
+
+PORT = int(os.getenv('PORT', 10000))
+# Public base URL of this service; setting it switches from polling to webhook mode
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token on every webhook call
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+HTTP_MAX_BODY = 1024 * 1024
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    503: 'Service Unavailable'
+}
+
+HTTP_SERVER = None
+# Set once shutdown starts. Webhook calls then get a 503, which Telegram retries
+HTTP_STOPPING = False
+# Keep-alive connections waiting for their next request
+HTTP_IDLE = set()
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+# Parse one request off a keep-alive connection, returns None at EOF
+async def read_http_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(400)
+    
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
     
-    app = Application.builder().token(BOT_TOKEN).build()
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400)
+    if length > HTTP_MAX_BODY:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], headers, body
+
+async def write_http_response(writer, status, body=b'', content_type='text/plain; charset=utf-8', keep_alive=True):
+    if isinstance(body, str):
+        body = body.encode()
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+def ping_db():
+    with db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+
+# Returns (ready, reason)
+async def check_ready(app):
+    if not app.running:
+        return False, 'application not running'
+    try:
+        await run_db(ping_db)
+    except Exception as e:
+        return False, f'database unreachable: {e}'
+    # Any recent API response proves Telegram is reachable; otherwise ask
+    if time.monotonic() - TimedRequest.last_response > READY_TELEGRAM_MAX_AGE:
+        try:
+            await app.bot.get_me()
+        except Exception as e:
+            return False, f'telegram unreachable: {e}'
+    return True, 'ready'
+
+def render_metrics():
+    lines = []
+    for name, value in DB_POOL.stats().items():
+        lines.append(f"rekterapy_db_pool_{name} {value}")
+    for name, value in RENDER_CACHE.stats().items():
+        lines.append(f"rekterapy_render_cache_{name} {value}")
+    for name, value in OUTBOX.stats().items():
+        lines.append(f"rekterapy_outbox_{name} {value}")
+    for name, value in KNOWN_USERS.stats().items():
+        lines.append(f"rekterapy_known_users_{name} {value}")
+    lines.append(f"rekterapy_leaderboard_users {len(LEADERBOARD)}")
+    lines.append(f"rekterapy_story_index_stories {len(STORY_INDEX)}")
+    lines.append(f"rekterapy_identity_graph_nodes {len(IDENTITY_GRAPH)}")
+    lines.append(f"rekterapy_updates_active {UPDATE_PROCESSOR.active}")
+    lines.append(f"rekterapy_updates_queued_users {UPDATE_PROCESSOR.queued_users()}")
+    lines.append(f"rekterapy_rate_limit_keys{{limiter=\"user\"}} {len(USER_LIMITER)}")
+    lines.append(f"rekterapy_rate_limit_keys{{limiter=\"wallet\"}} {len(WALLET_LIMITER)}")
+    lines.append(f"rekterapy_db_calls_in_flight {DB_METRICS.in_flight}")
+    lines.append(f"rekterapy_review_queues {len(REVIEW_QUEUES)}")
+    lines.append(f"rekterapy_broadcasts_running {len(BROADCASTS)}")
+    for (conversation, state), n in sorted(CONVERSATIONS.active().items()):
+        lines.append(f'rekterapy_conversation_active{{conversation="{conversation}",state="{state}"}} {n}')
+    for (conversation, state), n in sorted(CONVERSATIONS.dropoffs.items()):
+        lines.append(f'rekterapy_conversation_dropoffs_total{{conversation="{conversation}",state="{state}"}} {n}')
+    for conversation, n in sorted(CONVERSATIONS.completed.items()):
+        lines.append(f'rekterapy_conversation_completed_total{{conversation="{conversation}"}} {n}')
+    # Only run_db() calls made while handling an update; the outbox,
+    # broadcasts and startup loads aren't counted against updates
+    updates = UPDATE_METRICS.total()
+    lines.append(f"rekterapy_update_db_calls_total {UPDATE_PROCESSOR.db_calls}")
+    lines.append(f"rekterapy_db_calls_per_update {UPDATE_PROCESSOR.db_calls / updates if updates else 0.0:.3f}")
+    UPDATE_METRICS.render(lines)
+    HANDLER_METRICS.render(lines)
+    DB_METRICS.render(lines)
+    API_METRICS.render(lines)
+    return '\n'.join(lines) + '\n'
+
+# Queue a Telegram webhook update; the reply doesn't wait for handlers
+async def handle_webhook(app, headers, body):
+    token = headers.get('x-telegram-bot-api-secret-token', '')
+    if not hmac.compare_digest(token, WEBHOOK_SECRET):
+        return 403, 'forbidden'
+    # Past this point app.stop() may no longer read the queue
+    if HTTP_STOPPING:
+        return 503, 'stopping'
+    try:
+        update = Update.de_json(json.loads(body), app.bot)
+    except Exception:
+        return 400, 'bad update'
+    await app.update_queue.put(update)
+    return 200, 'ok'
+
+async def route_http(app, method, path, headers, body):
+    if path in ('/', '/health'):
+        return 200, 'Bot is running!', 'text/plain; charset=utf-8'
+    if path == '/ready':
+        ready, reason = await check_ready(app)
+        return (200 if ready else 503), reason, 'text/plain; charset=utf-8'
+    if path == '/metrics':
+        return 200, render_metrics(), 'text/plain; version=0.0.4'
+    if path == WEBHOOK_PATH and WEBHOOK_URL:
+        if method != 'POST':
+            return 405, 'method not allowed', 'text/plain; charset=utf-8'
+        status, text = await handle_webhook(app, headers, body)
+        return status, text, 'text/plain; charset=utf-8'
+    return 404, 'not found', 'text/plain; charset=utf-8'
+
+# One task per connection, so slow clients never block each other
+async def handle_http_connection(app, reader, writer):
+    try:
+        while True:
+            HTTP_IDLE.add(writer)
+            try:
+                request = await read_http_request(reader)
+            except HTTPError as e:
+                await write_http_response(writer, e.status, HTTP_REASONS[e.status], keep_alive=False)
+                break
+            finally:
+                HTTP_IDLE.discard(writer)
+            if request is None:
+                break
+            method, path, headers, body = request
+            status, text, content_type = await route_http(app, method, path, headers, body)
+            keep_alive = headers.get('connection', '').lower() != 'close' and not HTTP_STOPPING
+            await write_http_response(writer, status, text, content_type, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        HTTP_IDLE.discard(writer)
+        writer.close()
+
+async def start_http_server(app):
+    global HTTP_SERVER, HTTP_STOPPING
+    HTTP_STOPPING = False
+    HTTP_SERVER = await asyncio.start_server(
+        lambda reader, writer: handle_http_connection(app, reader, writer),
+        '0.0.0.0', PORT
+    )
+    print(f"HTTP server running on port {PORT}")
+
+# Stop listening, drop idle keep-alive connections and let busy ones finish
+# their current request
+async def stop_http_server(app):
+    global HTTP_STOPPING
+    HTTP_STOPPING = True
+    if HTTP_SERVER is not None:
+        HTTP_SERVER.close()
+        for writer in list(HTTP_IDLE):
+            writer.close()
+        await HTTP_SERVER.wait_closed()
+
+WEEK_PARTITION_TASK = None
+
+async def on_startup(app):
+    global WEEK_PARTITION_TASK
+    await start_http_server(app)
+    await OUTBOX.start(app.bot)
+    await resume_broadcasts(app.bot)
+    WEEK_PARTITION_TASK = asyncio.create_task(maintain_week_partitions())
+
+async def on_stop(app):
+    if WEEK_PARTITION_TASK is not None:
+        WEEK_PARTITION_TASK.cancel()
+    await stop_broadcasts()
+    await OUTBOX.stop()
+    await KNOWN_USERS.flush()
+
+# Webhook mode - same HTTP server, Telegram pushes updates to WEBHOOK_PATH
+async def serve_webhook(app):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    await app.initialize()
+    await on_startup(app)
+    await app.bot.set_webhook(
+        url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES
+    )
+    await app.start()
+    print("Webhook set, waiting for updates")
+    try:
+        await stop.wait()
+    finally:
+        # Close the listener before PTB stops reading update_queue, so any
+        # update Telegram sends from here on is refused and redelivered
+        await stop_http_server(app)
+        await app.stop()
+        # After app.stop(), like post_stop in polling mode: handlers it
+        # finished may still have queued outbox messages
+        await on_stop(app)
+        await app.shutdown()
+
+# ==================== MAIN ====================
+
+def build_application():
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(UPDATE_PROCESSOR)
+        .request(TimedRequest(connection_pool_size=256))
+        .get_updates_request(TimedRequest())
+    )
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    persistence = build_persistence()
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    # Polling mode runs the HTTP server and outbox from PTB's hooks (webhook
+    # mode calls the same functions itself in serve_webhook)
+    if not WEBHOOK_URL:
+        builder = builder.post_init(on_startup).post_stop(on_stop).post_shutdown(stop_http_server)
+    app = builder.build()
     
     # User conversation handler
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
         states={
-            STORY_TYPE: [CallbackQueryHandler(story_type_selected, pattern="^type_")],
+            STORY_TYPE: [CallbackQueryHandler(story_type_selected, pattern=callback_pattern('type'))],
             WALLET: [
                 CommandHandler('back', back_to_story_type),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, collect_wallet)
@@ -1276,14 +5125,32 @@ def main():
             ],
             CONFIRM: [
                 CommandHandler('back', back_to_story),
-                CallbackQueryHandler(handle_confirmation, pattern="^confirm_")
+                CallbackQueryHandler(handle_confirmation, pattern=callback_pattern('confirm'))
             ]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='submission',
+        persistent=persistence is not None
     )
     
     app.add_handler(conv_handler)
     
+    # Admin broadcast conversation
+    broadcast_handler = ConversationHandler(
+        entry_points=[CommandHandler('broadcast', admin_broadcast)],
+        states={
+            ADMIN_BROADCAST: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_text),
+                CallbackQueryHandler(broadcast_confirm, pattern=callback_pattern('broadcast'))
+            ]
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='broadcast',
+        persistent=persistence is not None
+    )
+    
+    app.add_handler(broadcast_handler)
+    
     # User commands
     app.add_handler(CommandHandler('mystats', mystats))
     app.add_handler(CommandHandler('leaderboard', leaderboard))
@@ -1298,14 +5165,50 @@ def main():
     app.add_handler(CommandHandler('stats', admin_stats))
     app.add_handler(CommandHandler('champion', admin_set_champion))
     app.add_handler(CommandHandler('undo', admin_undo))
+    app.add_handler(CommandHandler('pool', admin_pool))
+    app.add_handler(CommandHandler('cache', admin_cache))
+    app.add_handler(CommandHandler('stopbroadcast', admin_stop_broadcast))
+    app.add_handler(CommandHandler('reviewers', reviewer_stats))
+    app.add_handler(CommandHandler('rebuild', admin_rebuild))
+    app.add_handler(CommandHandler('reindex', admin_reindex))
+    app.add_handler(CommandHandler('revalidate', admin_revalidate))
+    app.add_handler(CommandHandler('archive', admin_archive))
     
-    # Admin callback handlers
-    app.add_handler(CallbackQueryHandler(admin_review_action, pattern="^review_"))
-    app.add_handler(CallbackQueryHandler(handle_rejection, pattern="^reject_"))
-    app.add_handler(CallbackQueryHandler(handle_scoring, pattern="^score_"))
+    # Every other button goes through one tag lookup
+    app.add_handler(CallbackQueryHandler(dispatch_callback))
+    
+    instrument_handlers(app)
+    
+    return app
+
+# Migrate, then build the in-memory state handlers read instead of the database
+def load_state():
+    init_db()
+    ensure_week_partitions()
+    load_leaderboard()
+    print(f"Leaderboard loaded: {len(LEADERBOARD)} users")
+    warm_rate_limiters()
+    load_archive()
+    print(f"Archive loaded: {len(ARCHIVE)} weeks")
+    STORY_INDEX.replace(build_story_index())
+    print(f"Story index loaded: {len(STORY_INDEX)} stories")
+    load_identity_graph()
+    print(f"Identity graph loaded: {len(IDENTITY_GRAPH)} nodes")
+
+def main():
+    DB_POOL.fill()
+    load_state()
+    
+    app = build_application()
     
     print("Bot started successfully!")
-    app.run_polling()
+    try:
+        if WEBHOOK_URL:
+            asyncio.run(serve_webhook(app))
+        else:
+            app.run_polling()
+    finally:
+        DB_POOL.closeall()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
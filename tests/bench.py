@@ -0,0 +1,697 @@
+# Microbenchmarks for the in-memory structures the handlers lean on:
+#
+#   python tests/bench.py                   # every benchmark, full size
+#   python tests/bench.py leaderboard       # just the named ones
+#   python tests/bench.py --dsn postgresql://postgres@127.0.0.1/rekterapy_bench
+#
+# Benchmarks marked db=True need --dsn, a scratch database they migrate and
+# fill. tests/test_bench.py runs each one at its smoke size so they keep
+# working; the numbers only mean something at full size.
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST-TOKEN')
+os.environ.setdefault('DATABASE_URL', 'postgresql:///unused')
+
+import bot
+from replay import CountingPool, StatementCounter
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Update, User
+from telegram.ext import CallbackQueryHandler
+from telegram.error import Forbidden
+
+# name -> (function, full size, smoke size, needs a database)
+BENCHMARKS = {}
+
+
+def benchmark(size, smoke, db=False):
+    def register(fn):
+        BENCHMARKS[fn.__name__] = (fn, size, smoke, db)
+        return fn
+    return register
+
+
+# Mean seconds per call of fn over args, one call per item
+def per_call(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / len(args)
+
+
+# Point the bot's pool at dsn for the duration, counting statements if
+# given a StatementCounter
+@contextmanager
+def scratch_pool(dsn, counter=None):
+    saved = bot.DB_POOL
+    if counter is None:
+        bot.DB_POOL = bot.DBPool(dsn, 1, bot.DB_POOL_MAX, timeout=10, check_idle=30)
+    else:
+        bot.DB_POOL = CountingPool(counter, dsn, 1, bot.DB_POOL_MAX, timeout=10, check_idle=30)
+    try:
+        yield bot.DB_POOL
+    finally:
+        bot.DB_POOL.closeall()
+        bot.DB_POOL = saved
+
+
+# Stands in for the Bot API: every send succeeds instantly, except to users
+# in blocked, who get the Forbidden Telegram sends once the bot is blocked
+class SinkBot:
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.sent = []  # chat ids, in send order, the admin's status message aside
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id in self.blocked:
+            raise Forbidden('Forbidden: bot was blocked by the user')
+        if chat_id != bot.ADMIN_ID:
+            self.sent.append(chat_id)
+        return SimpleNamespace(edit_text=self.edit_text)
+
+    async def edit_text(self, text):
+        pass
+
+
+# Swap the shared send budget for one at rate, for the duration
+@contextmanager
+def send_budget(rate):
+    saved = bot.SEND_BUDGET
+    bot.SEND_BUDGET = bot.SendBudget(rate)
+    try:
+        yield bot.SEND_BUDGET
+    finally:
+        bot.SEND_BUDGET = saved
+
+
+def add_users(first, count):
+    with bot.db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO users (telegram_id, username)
+            SELECT i, 'user' || i FROM generate_series(%s::bigint, %s::bigint) AS i
+            ON CONFLICT (telegram_id) DO UPDATE SET blocked_at = NULL
+        ''', (first, first + count - 1))
+        conn.commit()
+
+
+def us(seconds):
+    return f'{seconds * 1e6:.2f} µs'
+
+
+@benchmark(size=1_000_000, smoke=2_000)
+def leaderboard(users):
+    rng = random.Random(4)
+    rows = [
+        {'telegram_id': i, 'username': f'user{i}', 'total_moondust': rng.randrange(0, 200) * bot.SCORE_STEP}
+        for i in range(users)
+    ]
+    board = bot.Leaderboard()
+    start = time.perf_counter()
+    board.load(rows)
+    load = time.perf_counter() - start
+
+    probes = [rng.randrange(users) for _ in range(10_000)]
+    return [
+        ('users', f'{users:,}'),
+        ('load', f'{load:.2f} s'),
+        ('rank', us(per_call(board.rank, probes))),
+        ('top(10)', us(per_call(lambda _: board.top(10), probes[:1000]))),
+        ('add', us(per_call(lambda user_id: board.add(user_id, bot.SCORE_STEP), probes))),
+    ]
+
+
+@benchmark(size=100_000, smoke=1_000)
+def rate_limiter(keys):
+    rng = random.Random(6)
+    limiter = bot.SlidingWindowLimiter()
+    now = time.time()
+    for key in range(keys):
+        limiter.record(key, now - rng.uniform(0, limiter.window))
+    probes = [rng.randrange(keys * 2) for _ in range(100_000)]
+    return [
+        ('keys', f'{keys:,}'),
+        ('is_limited', us(per_call(limiter.is_limited, probes))),
+        ('record', us(per_call(limiter.record, probes[:10_000]))),
+    ]
+
+
+# The COUNT queries the limiter replaces, for comparison
+@benchmark(size=10_000, smoke=50, db=True)
+def rate_limiter_db(submissions, dsn):
+    with scratch_pool(dsn):
+        bot.init_db()
+        week = bot.current_week()
+        for i in range(submissions):
+            bot.insert_submission(i, f'user{i}', 'rekt', f'0x{i:040x}', '0x' + 'ab' * 20, '1 ETH', 'A story.' * 5, week)
+        probes = list(range(0, submissions, max(1, submissions // 500)))
+        return [
+            ('submissions', f'{submissions:,}'),
+            ('check_user_rate_limit', us(per_call(bot.check_user_rate_limit, probes))),
+            ('check_wallet_rate_limit', us(per_call(lambda i: bot.check_wallet_rate_limit(f'0x{i:040x}'), probes))),
+        ]
+
+
+# Everything a broadcast costs besides the pacing itself: paging recipients,
+# dispatching sends and checkpointing, with the budget opened right up
+@benchmark(size=500_000, smoke=2_000, db=True)
+def broadcast(recipients, dsn):
+    with scratch_pool(dsn), send_budget(1e9):
+        bot.init_db()
+        add_users(10_000_000, recipients)
+        sink = SinkBot(blocked=range(10_000_000, 10_000_000 + recipients, 100))
+        row = bot.create_broadcast('Week 10 winners are in!')
+        start = time.perf_counter()
+        asyncio.run(bot.Broadcast(row).run(sink))
+        elapsed = time.perf_counter() - start
+        # A resume starts with one page fetch from the checkpoint
+        rng = random.Random(11)
+        offsets = [10_000_000 + rng.randrange(recipients) for _ in range(200)]
+        resume = per_call(lambda after: bot.get_broadcast_recipients(after, bot.BROADCAST_PAGE), offsets)
+        pages = -(-recipients // bot.BROADCAST_PAGE)
+        return [
+            ('recipients', f'{recipients:,}'),
+            ('sent', f'{len(sink.sent):,}'),
+            ('unpaced run', f'{elapsed:.2f} s'),
+            ('unpaced rate', f'{len(sink.sent) / elapsed:,.0f} /s'),
+            ('per page (fetch+checkpoint)', f'{elapsed / pages * 1000:.2f} ms'),
+            ('resume page fetch', f'{resume * 1000:.2f} ms'),
+            (f'at SEND_RATE={bot.SEND_RATE:g}', str(timedelta(seconds=int(recipients / bot.SEND_RATE)))),
+        ]
+
+
+# The outbox scheduler's own ceiling, and how closely a shared budget holds
+# the outbox plus a broadcast to their combined rate
+@benchmark(size=100_000, smoke=1_000)
+def outbox(messages):
+    async def drain(queue, sink, count):
+        worker = asyncio.create_task(queue._run(sink))
+        for i in range(count):
+            queue.send(20_000_000 + i, 'Your story was approved!')
+        start = time.perf_counter()
+        while queue.delivered < count:
+            await asyncio.sleep(0.001)
+        worker.cancel()
+        return time.perf_counter() - start
+
+    unpaced = asyncio.run(drain(bot.OutboundQueue(bot.SendBudget(1e9), chat_interval=0), SinkBot(), messages))
+    rate = 200
+    paced_count = min(messages, rate)
+    paced = asyncio.run(drain(bot.OutboundQueue(bot.SendBudget(rate), chat_interval=0), SinkBot(), paced_count))
+    return [
+        ('messages', f'{messages:,}'),
+        ('unpaced rate', f'{messages / unpaced:,.0f} /s'),
+        (f'paced at {rate}/s', f'{paced_count / paced:.1f} /s'),
+    ]
+
+
+# A score keyboard built the way handlers did before SCORE_KEYBOARDS, on
+# every callback
+def build_score_keyboard(i, criteria):
+    controls = [InlineKeyboardButton("❌ Cancel", callback_data=bot.encode_callback('scoring', 'cancel'))]
+    if i > 0:
+        controls.insert(0, InlineKeyboardButton("⬅️ Back", callback_data=bot.encode_callback('scoring', 'back')))
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(str(v), callback_data=bot.encode_callback('score', criteria, v)) for v in bot.SCORE_VALUES],
+        controls
+    ])
+
+
+class BuiltKeyboards(dict):
+    def __getitem__(self, criteria):
+        return build_score_keyboard(bot.CRITERIA.index(criteria), criteria)
+
+
+class ScoreTap:
+    def __init__(self):
+        self.from_user = SimpleNamespace(id=bot.ADMIN_ID)
+        self.message = SimpleNamespace(text='Story #1')
+        self.data = None
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None):
+        pass
+
+
+# Prebuilt keyboards against building them per callback, and whole scoring
+# taps through handle_scoring (the claim is fresh, so no query is made)
+@benchmark(size=100_000, smoke=500)
+def keyboards(calls):
+    steps = list(enumerate(bot.CRITERIA)) * (calls // len(bot.CRITERIA))
+    built = per_call(lambda step: build_score_keyboard(*step), steps)
+    cached = per_call(lambda step: bot.SCORE_KEYBOARDS[step[1]], steps)
+    serialize = per_call(lambda step: bot.SCORE_KEYBOARDS[step[1]].to_json(), steps)
+    review_built = per_call(lambda i: InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("✅ Approve", callback_data=bot.encode_callback('review', 'approve', i)),
+            InlineKeyboardButton("❌ Reject", callback_data=bot.encode_callback('review', 'reject', i))
+        ],
+        [InlineKeyboardButton("⏭️ Skip", callback_data=bot.encode_callback('review', 'skip', i))]
+    ]), range(calls))
+    review_cached = per_call(bot.review_keyboard, [i % 100 for i in range(calls)])
+
+    async def taps():
+        query = ScoreTap()
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(user_data={})
+        data = [bot.encode_callback('score', criteria, 600) for criteria in bot.CRITERIA]
+        start = time.perf_counter()
+        for i in range(calls):
+            step = i % len(bot.CRITERIA)
+            if step == 0:
+                context.user_data.update(
+                    scoring_submission=1, claimed_at=time.time(), scores={}, current_criteria=0
+                )
+            query.data = data[step]
+            await bot.handle_scoring(update, context)
+        return time.perf_counter() - start
+
+    tapped = asyncio.run(taps())
+    saved = bot.SCORE_KEYBOARDS
+    bot.SCORE_KEYBOARDS = BuiltKeyboards()
+    try:
+        tapped_built = asyncio.run(taps())
+    finally:
+        bot.SCORE_KEYBOARDS = saved
+    return [
+        ('score keyboard, built', us(built)),
+        ('score keyboard, prebuilt', us(cached)),
+        ('score keyboard to_json', us(serialize)),
+        ('review keyboard, built', us(review_built)),
+        ('review keyboard, lru_cache', us(review_cached)),
+        ('handle_scoring taps', f'{calls / tapped:,.0f} /s'),
+        ('  building keyboards per tap', f'{calls / tapped_built:,.0f} /s'),
+    ]
+
+
+# Routing a callback to its handler: the regex CallbackQueryHandlers and
+# split('_') parsing from before the codec, against the callback_pattern()
+# conversation handlers plus dispatch_callback's decode and dict lookup.
+# Routing starts from an empty decode cache (score buttons repeat, so many
+# presses still hit it) and is then repeated warm; the codec alone is timed
+# without the cache.
+@benchmark(size=100_000, smoke=1_000)
+def callback_dispatch(presses):
+    rng = random.Random(16)
+    clicks = []
+    for i in range(presses):
+        submission_id = rng.randrange(1, 10_000_000)
+        kind = rng.random()
+        if kind < 0.6:
+            clicks.append(('score', rng.choice(bot.CRITERIA), rng.choice(bot.SCORE_VALUES)))
+        elif kind < 0.85:
+            clicks.append(('review', rng.choice(['approve', 'reject', 'skip']), submission_id))
+        elif kind < 0.95:
+            clicks.append(('scoring', 'confirm'))
+        else:
+            clicks.append(('reject', rng.choice(list(bot.REJECTION_REASONS)), submission_id))
+
+    def updates(datas):
+        user = User(bot.ADMIN_ID, 'admin', False)
+        return [Update(i, callback_query=CallbackQuery(str(i), user, 'chat', data=d)) for i, d in enumerate(datas)]
+
+    legacy = updates(['_'.join(str(v) for v in c) if c[0] != 'scoring' else f'score_{c[1]}' for c in clicks])
+    compact = updates([bot.encode_callback(*c) for c in clicks])
+
+    def noop(update, context):
+        pass
+
+    regex_handlers = [
+        CallbackQueryHandler(noop, pattern=p)
+        for p in ('^type_', '^confirm_', '^broadcast_', '^review_', '^reject_', '^score_')
+    ]
+    codec_handlers = [
+        CallbackQueryHandler(noop, pattern=bot.callback_pattern(name)) for name in ('type', 'confirm', 'broadcast')
+    ] + [CallbackQueryHandler(noop)]
+
+    def route_regex(update):
+        for handler in regex_handlers:
+            if handler.check_update(update):
+                return update.callback_query.data.split('_')
+
+    def route_codec(update):
+        for handler in codec_handlers:
+            if handler.check_update(update):
+                callback = bot.decode_callback(update.callback_query.data)
+                return bot.CALLBACK_ROUTES.get(callback[0]) if callback else None
+
+    regex = per_call(route_regex, legacy)
+    bot._decode_cached.cache_clear()
+    cold = per_call(route_codec, compact)
+    warm = per_call(route_codec, compact[-1000:])
+    uncached = per_call(bot._decode_compact, [u.callback_query.data for u in compact])
+    return [
+        ('presses', f'{presses:,}'),
+        ('regex + split', f'{us(regex)} ({1 / regex:,.0f} /s)'),
+        ('codec, empty cache', f'{us(cold)} ({1 / cold:,.0f} /s)'),
+        ('codec, warm', f'{us(warm)} ({1 / warm:,.0f} /s)'),
+        ('decode alone, uncached', us(uncached)),
+    ]
+
+
+# /start and /mystats traffic through KnownUsers: a tenth as many users as
+# commands, 1% of commands from a user who changed their username. A
+# capacity of 0 remembers nobody, which is the upsert-per-command it replaced.
+def known_users_commands(commands, seed=19):
+    rng = random.Random(seed)
+    users = max(1, commands // 10)
+    names = {user_id: f'user{user_id}' for user_id in range(30_000_000, 30_000_000 + users)}
+    traffic = []
+    for _ in range(commands):
+        user_id = rng.randrange(30_000_000, 30_000_000 + users)
+        if rng.random() < 0.01:
+            names[user_id] = f'user{user_id}_{rng.randrange(1000)}'
+        traffic.append((user_id, names[user_id]))
+    return traffic, names
+
+
+async def replay_known_users(known, traffic):
+    start = time.perf_counter()
+    for user_id, username in traffic:
+        await known.ensure(user_id, username)
+    await known.flush()
+    return time.perf_counter() - start
+
+
+@benchmark(size=10_000, smoke=1_000, db=True)
+def known_users(commands, dsn):
+    counter = StatementCounter()
+    traffic, _ = known_users_commands(commands)
+    rows = [('commands', f'{commands:,}'), ('users', f'{len({u for u, _ in traffic}):,}')]
+    with scratch_pool(dsn, counter):
+        bot.init_db()
+        for label, capacity in (('no cache', 0), ('KnownUsers', bot.KNOWN_USERS_SIZE)):
+            known = bot.KnownUsers(capacity)
+            counter.count = 0
+            elapsed = asyncio.run(replay_known_users(known, traffic))
+            rows.append((f'statements, {label}', f'{counter.count:,}'))
+            rows.append((f'per command, {label}', us(elapsed / commands)))
+    return rows
+
+
+# get_user_stats as it was before the prepared statement, for comparison
+def get_user_stats_three_queries(user_id):
+    with bot.db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT total_moondust FROM users WHERE telegram_id = %s', (user_id,))
+        user_data = cursor.fetchone()
+        total_moondust = user_data['total_moondust'] if user_data else 0
+        cursor.execute('''
+            SELECT
+                COUNT(*) as total,
+                COUNT(CASE WHEN status = 'approved' THEN 1 END) as approved,
+                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as rejected,
+                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending
+            FROM submissions WHERE user_id = %s
+        ''', (user_id,))
+        stats = cursor.fetchone()
+        cursor.execute('SELECT COUNT(*) as wins FROM champions WHERE user_id = %s', (user_id,))
+        return total_moondust, stats, cursor.fetchone()['wins']
+
+
+# /mystats' query, one prepared statement against the three it replaced.
+# Local round trips are cheap; on a remote database each statement costs
+# the network round trip on top, which is what the statement count shows.
+@benchmark(size=20_000, smoke=200, db=True)
+def user_stats(submissions, dsn):
+    counter = StatementCounter()
+    with scratch_pool(dsn, counter):
+        bot.init_db()
+        week = bot.current_week()
+        users = max(1, submissions // 4)
+        add_users(40_000_000, users)
+        for i in range(submissions):
+            user_id = 40_000_000 + i % users
+            bot.insert_submission(user_id, f'user{user_id}', 'rekt', f'0x{i:040x}', '0x' + 'ab' * 20, '1 ETH', 'A story.' * 5, week)
+        rng = random.Random(20)
+        probes = [40_000_000 + rng.randrange(users) for _ in range(2_000)]
+        rows = [('submissions', f'{submissions:,}')]
+        for label, fn in (('three queries', get_user_stats_three_queries), ('prepared', bot.get_user_stats)):
+            fn(probes[0])
+            counter.count = 0
+            rows.append((f'{label}', us(per_call(fn, probes))))
+            rows.append((f'{label}, statements', f'{counter.count / len(probes):.0f}'))
+    return rows
+
+
+# The dict-of-lists layout StoryIndex used before its flat arrays, enough of
+# it to compare memory
+class DictStoryIndex:
+    def __init__(self):
+        self.signatures, self.owners, self.buckets = {}, {}, {}
+
+    def add_signature(self, submission_id, user_id, sig):
+        self.signatures[submission_id] = sig
+        self.owners[submission_id] = user_id
+        for band in range(bot.LSH_BANDS):
+            start = band * bot.LSH_ROWS
+            self.buckets.setdefault(hash((band, *sig[start:start + bot.LSH_ROWS])), []).append(submission_id)
+
+
+def traced_bytes(build):
+    tracemalloc.start()
+    try:
+        kept = build()
+        return tracemalloc.get_traced_memory()[0], kept
+    finally:
+        tracemalloc.stop()
+
+
+def story_words(rng, vocabulary):
+    return ' '.join(rng.choice(vocabulary) for _ in range(rng.randrange(20, 120)))
+
+
+# Memory of the index at full size, and the per-story cost of flagging a
+# new submission against it. The old layout is measured at up to 100k
+# stories; past that it doesn't fit in a small server's memory.
+@benchmark(size=1_000_000, smoke=2_000)
+def story_index(stories):
+    # Story i is generated from seed i, so a later one can copy it
+    vocabulary = [f'w{i}' for i in range(5_000)]
+    start = time.perf_counter()
+    sigs = [bot.story_signature(story_words(random.Random(i), vocabulary)) for i in range(stories)]
+    hashing = time.perf_counter() - start
+
+    compare = min(stories, 100_000)
+
+    def build_dict():
+        index = DictStoryIndex()
+        for i in range(compare):
+            index.add_signature(i + 1, 1000 + i, sigs[i])
+        return index
+
+    def build_arrays():
+        index = bot.StoryIndex(compare)
+        for i in range(compare):
+            index.add_signature(i + 1, 1000 + i, sigs[i])
+        return index
+
+    # The signatures are already allocated, so only the index is counted
+    dict_bytes, _ = traced_bytes(build_dict)
+    array_bytes, _ = traced_bytes(build_arrays)
+
+    index = bot.StoryIndex(stories)
+    start = time.perf_counter()
+    for i, sig in enumerate(sigs):
+        index.add_signature(i + 1, 1000 + i, sig)
+    load = time.perf_counter() - start
+    del sigs
+
+    # New submissions: half fresh, half lightly edited copies of old ones
+    rng = random.Random(21)
+    probes = []
+    for i in range(1000):
+        words = story_words(random.Random(rng.randrange(stories) if i % 2 else stories + i), vocabulary).split()
+        if i % 2:
+            words[rng.randrange(len(words))] = 'edited'
+        probes.append(' '.join(words))
+    latencies = []
+    flagged = [0, 0]
+    for i, story in enumerate(probes):
+        start = time.perf_counter()
+        flagged[i % 2] += bool(index.add(stories + 1 + i, 1, story))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return [
+        ('stories', f'{stories:,}'),
+        ('signatures', f'{hashing:.1f} s ({us(hashing / stories)} each)'),
+        ('load', f'{load:.1f} s'),
+        ('index memory', f'{index.memory() / 2**20:,.0f} MB ({index.memory() / stories:,.0f} B/story)'),
+        (f'dicts at {compare:,}', f'{dict_bytes / 2**20:,.0f} MB ({dict_bytes / compare:,.0f} B/story)'),
+        (f'arrays at {compare:,}', f'{array_bytes / 2**20:,.0f} MB ({array_bytes / compare:,.0f} B/story)'),
+        ('flagged', f'{flagged[1]} of 500 copies, {flagged[0]} of 500 fresh'),
+        ('add() p50', us(latencies[len(latencies) // 2])),
+        ('add() p99', us(latencies[int(len(latencies) * 0.99)])),
+    ]
+
+
+# Wallets as a busy season sees them: most accounts submit with their own
+# wallet or two, some farms share a handful between tens of accounts, and
+# one big farm rotates a pool of wallets across thousands
+def identity_links(links, seed=22):
+    rng = random.Random(seed)
+    users = links * 3 // 4
+    farm = min(10_000, users // 10)
+    out = []
+    for i in range(links):
+        user_id = rng.randrange(users)
+        if user_id < farm:
+            wallet = f'0xfarm{rng.randrange(farm // 20)}'
+        elif user_id < farm * 5:
+            wallet = f'0xring{user_id // 30}-{rng.randrange(3)}'
+        else:
+            wallet = f'0x{user_id:040x}' if rng.random() < 0.9 else f'0x{rng.randrange(links):039x}f'
+        out.append((user_id, wallet))
+    return out, users, farm
+
+
+# Load time and memory of the graph, and what a cluster lookup costs a
+# review card: cluster() alone and format_cluster() with usernames
+@benchmark(size=1_000_000, smoke=5_000)
+def identity_graph(links):
+    pairs, users, farm = identity_links(links)
+
+    def build():
+        graph = bot.IdentityGraph()
+        for user_id, wallet in pairs:
+            graph.link(user_id, wallet)
+        return graph
+
+    start = time.perf_counter()
+    graph = build()
+    load = time.perf_counter() - start
+    graph_bytes, _ = traced_bytes(build)
+
+    saved = bot.IDENTITY_GRAPH
+    bot.IDENTITY_GRAPH = graph
+    try:
+        rng = random.Random(23)
+        rows = [
+            ('links', f'{links:,}'),
+            ('nodes', f'{len(graph):,}'),
+            ('load', f'{load:.1f} s ({us(load / links)} per link)'),
+            ('memory', f'{graph_bytes / 2**20:,.0f} MB ({graph_bytes / len(graph):,.0f} B/node)'),
+            ('big farm', f'{max(graph.cluster(u)[0] for u in range(farm)):,} accounts'),
+        ]
+        for label, probes in (
+            ('anyone', [rng.randrange(users) for _ in range(10_000)]),
+            ('farm', [rng.randrange(farm) for _ in range(10_000)]),
+        ):
+            for name, fn in (('cluster()', graph.cluster), ('format_cluster()', bot.format_cluster)):
+                latencies = []
+                for user_id in probes:
+                    start = time.perf_counter()
+                    fn(user_id)
+                    latencies.append(time.perf_counter() - start)
+                latencies.sort()
+                rows.append((f'{name}, {label}', f'p50 {us(latencies[len(latencies) // 2])}, '
+                             f'p99 {us(latencies[int(len(latencies) * 0.99)])}, max {us(latencies[-1])}'))
+        return rows
+    finally:
+        bot.IDENTITY_GRAPH = saved
+
+
+# is_valid_wallet / is_valid_contract before chain detection
+def old_is_valid_address(address):
+    if len(address) < 26 or len(address) > 128:
+        return False
+    return all(c.isalnum() or c in '-_' for c in address)
+
+
+def base58_encode(raw):
+    n = int.from_bytes(raw, 'big')
+    out = ''
+    while n:
+        n, digit = divmod(n, 58)
+        out = bot.BASE58_ALPHABET[digit] + out
+    return '1' * (len(raw) - len(raw.lstrip(b'\x00'))) + out
+
+
+def base58check(payload):
+    return base58_encode(payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4])
+
+
+def eip55(digits):
+    hashed = bot.keccak256(digits.encode()).hex()
+    return '0x' + ''.join(c.upper() if int(h, 16) >= 8 else c for c, h in zip(digits, hashed))
+
+
+# Addresses the way submissions carry them: a third distinct, mostly EVM,
+# then Solana, Bitcoin and Tron, bech32, and the junk the old check let in
+def submitted_addresses(count, seed=23):
+    rng = random.Random(seed)
+    segwit = ['bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4', 'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0']
+    distinct = []
+    for i in range(max(count // 3, 1)):
+        kind = rng.random()
+        if kind < 0.5:
+            digits = rng.randbytes(20).hex()
+            distinct.append(eip55(digits) if i % 2 else '0x' + digits)
+        elif kind < 0.7:
+            distinct.append(base58_encode(rng.randbytes(32)))
+        elif kind < 0.85:
+            distinct.append(base58check(bytes([rng.choice((0x00, 0x05, 0x41))]) + rng.randbytes(20)))
+        elif kind < 0.9:
+            distinct.append(rng.choice(segwit))
+        else:
+            distinct.append(f'my_wallet_{rng.randrange(10**20)}')
+    return [rng.choice(distinct) for _ in range(count)], distinct
+
+
+# The old per-character check against chain detection: one address at a
+# time uncached and cached, and the bulk pass revalidate_addresses makes
+@benchmark(size=300_000, smoke=3_000)
+def addresses(count):
+    submitted, distinct = submitted_addresses(count)
+    rows = [('addresses', f'{count:,} ({len(distinct):,} distinct)')]
+
+    rows.append(('old check', us(per_call(old_is_valid_address, submitted))))
+    bot.detect_address.cache_clear()
+    rows.append(('detect, uncached', us(per_call(bot.detect_address, distinct))))
+    rows.append(('detect, cached', us(per_call(bot.detect_address, submitted))))
+    bot.detect_address.cache_clear()
+    start = time.perf_counter()
+    bot.detect_addresses(submitted)
+    bulk = time.perf_counter() - start
+    rows.append(('bulk, from cold', f'{bulk:.2f} s ({us(bulk / count)} per address)'))
+
+    junk = [a for a in distinct if a.startswith('my_wallet')]
+    rows.append(('junk accepted', f'old {sum(map(old_is_valid_address, junk))}, '
+                                  f'new {sum(bot.detect_address(a) is not None for a in junk)} of {len(junk)}'))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run microbenchmarks')
+    parser.add_argument('names', nargs='*', help=f"any of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--dsn', help='scratch Postgres database for the db benchmarks')
+    parser.add_argument('--smoke', action='store_true', help='run at smoke size')
+    args = parser.parse_args()
+
+    for name in args.names or BENCHMARKS:
+        fn, size, smoke, db = BENCHMARKS[name]
+        if db and not args.dsn:
+            print(f'{name}: skipped, needs --dsn')
+            continue
+        size = smoke if args.smoke else size
+        rows = fn(size, args.dsn) if db else fn(size)
+        print(name)
+        for label, value in rows:
+            print(f'  {label:<28} {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import uuid
+from contextlib import closing
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# bot.py reads these at import time; the database is swapped in per test
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST-TOKEN')
+os.environ.setdefault('DATABASE_URL', 'postgresql:///unused')
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+import bot
+
+
+def _free_port():
+    with closing(socket.socket()) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _admin(url, sql):
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    try:
+        conn.cursor().execute(sql)
+    finally:
+        conn.close()
+
+
+def dsn_for(url, dbname):
+    return psycopg2.extensions.make_dsn(url, dbname=dbname)
+
+
+@pytest.fixture(scope='session')
+def postgres_server(tmp_path_factory):
+    # TEST_DATABASE_URL: an existing server the tests may create databases
+    # on. Otherwise start a throwaway cluster with initdb from PATH or PG_BIN.
+    url = os.getenv('TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+
+    pg_bin = os.getenv('PG_BIN') or os.path.dirname(shutil.which('initdb') or '')
+    if not pg_bin or not os.path.exists(os.path.join(pg_bin, 'initdb')):
+        pytest.skip('needs TEST_DATABASE_URL or initdb on PATH')
+    if os.geteuid() == 0:
+        pytest.skip('initdb refuses to run as root; set TEST_DATABASE_URL')
+
+    data = tmp_path_factory.mktemp('pgdata')
+    port = _free_port()
+    pg_ctl = os.path.join(pg_bin, 'pg_ctl')
+    subprocess.run(
+        [os.path.join(pg_bin, 'initdb'), '-D', str(data), '-A', 'trust', '-U', 'postgres'],
+        check=True, capture_output=True
+    )
+    subprocess.run(
+        [pg_ctl, '-D', str(data), '-l', str(data / 'server.log'), '-w',
+         '-o', f"-p {port} -c listen_addresses=127.0.0.1 -c unix_socket_directories=''", 'start'],
+        check=True, capture_output=True
+    )
+    try:
+        yield f'postgresql://postgres@127.0.0.1:{port}/postgres'
+    finally:
+        subprocess.run([pg_ctl, '-D', str(data), '-m', 'immediate', 'stop'], capture_output=True)
+
+
+# Migrated once per run; every test gets a fresh copy
+@pytest.fixture(scope='session')
+def template_db(postgres_server):
+    name = f'rekterapy_tpl_{uuid.uuid4().hex[:8]}'
+    # UTF8 whatever the server's default, as stories and reasons carry emoji
+    _admin(postgres_server, f"CREATE DATABASE {name} TEMPLATE template0 ENCODING 'UTF8' LC_COLLATE 'C' LC_CTYPE 'C'")
+    conn = psycopg2.connect(dsn_for(postgres_server, name), cursor_factory=RealDictCursor)
+    try:
+        bot.run_migrations(conn)
+    finally:
+        conn.close()
+    yield name
+    _admin(postgres_server, f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+@pytest.fixture
+def db(postgres_server, template_db, monkeypatch):
+    name = f'rekterapy_test_{uuid.uuid4().hex[:8]}'
+    _admin(postgres_server, f'CREATE DATABASE {name} TEMPLATE {template_db}')
+    dsn = dsn_for(postgres_server, name)
+    pool = bot.DBPool(dsn, 1, bot.DB_POOL_MAX, timeout=10, check_idle=30)
+    monkeypatch.setattr(bot, 'DB_POOL', pool)
+    bot.WEEK_PARTITIONS.clear()
+    yield dsn
+    pool.closeall()
+    bot.WEEK_PARTITIONS.clear()
+    _admin(postgres_server, f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+WEEK = bot.Week(2026, 10)
+
+
+def add_submission(user_id=100, wallet='0x' + 'ab' * 20, story='A story long enough to count.', week=WEEK):
+    return bot.insert_submission(user_id, f'user{user_id}', 'rekt', wallet, wallet, '1 ETH', story, week)
+
+
+def fetch(dsn, sql, params=None):
+    conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
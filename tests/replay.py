@@ -0,0 +1,538 @@
+# Replay synthetic traffic through the real Application, against a stub Bot
+# API and a scratch Postgres database, and report latency, throughput and
+# database work per update:
+#
+#   python tests/replay.py postgresql://postgres@127.0.0.1/rekterapy_bench
+#
+# Scenarios: a Friday-night rush of users going through the whole
+# submission conversation, a Saturday review burst of reviewers scoring
+# everything that came in, and /mystats against /leaderboard readers while
+# every query is slowed down by --db-latency. Then the statements and
+# latency of each user command on its own, and last another Friday rush
+# posted to the webhook endpoint over HTTP, as Telegram would, to time the
+# server's acknowledgements separately from handling. The database is
+# migrated and keeps the rows the replay creates, so point it at a
+# throwaway one.
+#
+# The stub answers on the same event loop as the bot, so absolute numbers
+# are pessimistic; compare runs of the same build against each other.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST-TOKEN')
+os.environ.setdefault('DATABASE_URL', 'postgresql:///unused')
+
+import httpx
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from telegram import Update
+
+import bot
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Rekterapy', 'username': 'rekterapy_bot'}
+WORDS = (
+    'bought the top sold the bottom leverage liquidated rug pull memecoin airdrop bridge hack '
+    'seed phrase phishing link gas fees slippage whale dump pump moon lambo wife changing '
+    'diamond hands paper hands degen ape staking yield farm impermanent loss exit scam'
+).split()
+
+
+# Answers Bot API calls over HTTP like Telegram would, and remembers the
+# last message each chat was shown so simulated users can press its buttons
+class StubBotAPI:
+    def __init__(self):
+        self.screens = {}
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}/bot'
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                method = request_line.split()[1].decode().rsplit('/', 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                payload = json.dumps({'ok': True, 'result': self.call(method, params)}).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def call(self, method, params):
+        self.calls += 1
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            message_id = int(params.get('message_id') or next(self._message_ids))
+            markup = json.loads(params.get('reply_markup') or '{}')
+            buttons = {
+                button['text']: button['callback_data']
+                for row in markup.get('inline_keyboard', ()) for button in row
+            }
+            self.screens[chat_id] = {'message_id': message_id, 'text': params['text'], 'buttons': buttons}
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params['text'],
+            }
+        return True
+
+
+# Counts every statement sent to Postgres, across the executor's threads,
+# and optionally holds each one for a fixed time to stand in for a slow or
+# distant database
+class StatementCounter:
+    def __init__(self, latency=0.0):
+        self.count = 0
+        self.latency = latency
+        self.log = None  # set to a list to keep the SQL of each statement
+        self._lock = threading.Lock()
+
+    def cursor_factory(self):
+        counter = self
+
+        class CountingCursor(RealDictCursor):
+            def execute(self, query, vars=None):
+                with counter._lock:
+                    counter.count += 1
+                    if counter.log is not None:
+                        counter.log.append(query)
+                if counter.latency:
+                    time.sleep(counter.latency)
+                return super().execute(query, vars)
+
+        return CountingCursor
+
+
+class CountingPool(bot.DBPool):
+    def __init__(self, counter, *args, **kwargs):
+        self.counter = counter
+        super().__init__(*args, **kwargs)
+
+    def _connect(self):
+        return psycopg2.connect(
+            self.dsn, connection_factory=bot.PreparingConnection,
+            cursor_factory=self.counter.cursor_factory()
+        )
+
+
+class Replay:
+    def __init__(self, app, api, counter):
+        self.app = app
+        self.api = api
+        self.counter = counter
+        self.latencies = []
+        # Latencies by command ('/mystats'), or 'message' / 'callback_query'
+        self.by_label = defaultdict(list)
+        self._update_ids = itertools.count(1)
+
+    # Same path as PTB's update fetcher: the update processor wrapping
+    # Application.process_update
+    async def feed(self, data):
+        update = Update.de_json(data, self.app.bot)
+        start = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.by_label[update_label(data)].append(elapsed)
+
+    # One write-behind round, as PTB's periodic persistence job runs it
+    async def persist_round(self):
+        await self.app.update_persistence()
+        await self.app.persistence.flush()
+
+    # Stop the application the way a redeploy does and bring up a fresh one
+    # on the same database; only what persistence saved survives. A crash
+    # skips the final persistence round a clean stop makes.
+    async def restart(self, crash=False):
+        if crash:
+            async def lost():
+                pass
+            self.app.update_persistence = lost
+            self.app.persistence.flush = lost
+        await self.app.stop()
+        await self.app.shutdown()
+        reset_process_state()
+        await asyncio.get_running_loop().run_in_executor(None, bot.load_state)
+        self.app = bot.build_application()
+        await self.app.initialize()
+        await self.app.start()
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+
+    def _message(self, user_id, text):
+        message = {
+            'message_id': next(self.api._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return message
+
+    def message_update(self, user_id, text):
+        return {'update_id': next(self._update_ids), 'message': self._message(user_id, text)}
+
+    def callback_update(self, user_id, data, message_id=0, text=''):
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': text,
+        }
+        return {'update_id': next(self._update_ids), 'callback_query': {
+            'id': str(next(self._update_ids)),
+            'from': self._user(user_id),
+            'chat_instance': str(user_id),
+            'message': message,
+            'data': data,
+        }}
+
+    async def send(self, user_id, text):
+        await self.feed(self.message_update(user_id, text))
+
+    # Press a button, by its label, on the last message the user was shown
+    async def press(self, user_id, label):
+        screen = self.api.screens[user_id]
+        await self.feed(self.callback_update(
+            user_id, screen['buttons'][label], screen['message_id'], screen['text']
+        ))
+
+    def buttons(self, user_id):
+        return self.api.screens.get(user_id, {}).get('buttons', {})
+
+
+# Module-level state a new process starts without; load_state() refills
+# what it should from the database
+FRESH_STATE = {
+    'USER_LIMITER': bot.SlidingWindowLimiter,
+    'WALLET_LIMITER': bot.SlidingWindowLimiter,
+    'KNOWN_USERS': bot.KnownUsers,
+    'RENDER_CACHE': bot.RenderCache,
+    'REVIEW_QUEUES': dict,
+}
+
+
+def reset_process_state():
+    for name, factory in FRESH_STATE.items():
+        setattr(bot, name, factory())
+
+
+def update_label(data):
+    if 'callback_query' in data:
+        return 'callback_query'
+    text = data['message']['text']
+    return text.split()[0] if text.startswith('/') else 'message'
+
+
+# New users each run, so a reused database doesn't rate-limit the rush
+def last_user_id():
+    with bot.db_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT GREATEST(COALESCE(MAX(telegram_id), 0), 10000) AS id FROM users')
+        return cursor.fetchone()['id']
+
+
+def make_story(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(15, 60))]
+    return ' '.join(words).capitalize() + '.'
+
+
+async def submit_story(replay, user_id, rng):
+    await replay.send(user_id, '/start')
+    await replay.press(user_id, rng.choice(['📉 REKT Story', '🚀 MOON Story']))
+    await replay.send(user_id, f'0x{user_id:040x}')
+    await replay.send(user_id, '0x' + 'ab' * 20)
+    await replay.send(user_id, f'{rng.randint(1, 50)} ETH')
+    await replay.send(user_id, make_story(rng))
+    await replay.press(user_id, '✅ Submit')
+
+
+async def review_backlog(replay, reviewer_id, rng):
+    await replay.send(reviewer_id, '/pending')
+    while '✅ Approve' in replay.buttons(reviewer_id):
+        await replay.press(reviewer_id, '✅ Approve')
+        # Lost the claim to another reviewer: the next card is already up
+        if '✅ Approve' in replay.buttons(reviewer_id):
+            continue
+        for _ in bot.CRITERIA:
+            await replay.press(reviewer_id, str(rng.choice(bot.SCORE_VALUES)))
+        await replay.press(reviewer_id, '✅ Confirm')
+
+
+# Users reading /mystats (two DB round trips for a new user) alongside users
+# reading /leaderboard (served from memory). With a slow database only the
+# first group should slow down; /leaderboard must not wait behind it.
+async def read_stats(replay, user_id, command, rounds):
+    for _ in range(rounds):
+        await replay.send(user_id, command)
+
+
+USER_COMMANDS = ('/mystats', '/leaderboard', '/champions', '/week')
+
+
+# Database statements and latency of each command for one user, sent one
+# at a time so each update's statements can be told apart. The first round
+# pays for anything a command caches or prepares; the rest are steady state.
+async def command_costs(replay, user_id, commands=USER_COMMANDS, rounds=20):
+    costs = {}
+    for command in commands:
+        statements, latencies = [], []
+        for _ in range(rounds):
+            before = replay.counter.count
+            start = time.perf_counter()
+            await replay.send(user_id, command)
+            latencies.append(time.perf_counter() - start)
+            statements.append(replay.counter.count - before)
+        steady = latencies[1:] or latencies
+        costs[command] = {
+            'first_statements': statements[0],
+            'statements': max(statements[1:], default=statements[0]),
+            'p50_ms': percentile(steady, 0.50) * 1000,
+            'p99_ms': percentile(steady, 0.99) * 1000,
+        }
+    return costs
+
+
+# A Friday rush delivered the way Telegram does it in webhook mode: HTTP
+# POSTs with the secret token to the bot's own server, acknowledged as soon
+# as the update is queued. Each user's seven updates are posted back to back
+# without waiting for replies; the button presses carry the callback data
+# the keyboards would, so only per-user ordering keeps the flow intact.
+async def webhook_rush(replay, first_user, users, secret):
+    saved = bot.WEBHOOK_URL, bot.WEBHOOK_SECRET, bot.PORT
+    bot.WEBHOOK_URL, bot.WEBHOOK_SECRET, bot.PORT = 'https://bot.example', secret, free_port()
+    await bot.start_http_server(replay.app)
+    base = f'http://127.0.0.1:{bot.PORT}'
+    post_latencies = []
+    try:
+        async with httpx.AsyncClient(base_url=base, headers={'X-Telegram-Bot-Api-Secret-Token': secret}) as client:
+            async def post(update):
+                start = time.perf_counter()
+                response = await client.post(bot.WEBHOOK_PATH, json=update)
+                post_latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+            async def user_session(user_id, rng):
+                for update in (
+                    replay.message_update(user_id, '/start'),
+                    replay.callback_update(user_id, bot.encode_callback('type', 'rekt')),
+                    replay.message_update(user_id, f'0x{user_id:040x}'),
+                    replay.message_update(user_id, '0x' + 'ab' * 20),
+                    replay.message_update(user_id, f'{rng.randint(1, 50)} ETH'),
+                    replay.message_update(user_id, make_story(rng)),
+                    replay.callback_update(user_id, bot.encode_callback('confirm', 'yes')),
+                ):
+                    await post(update)
+
+            handled = bot.UPDATE_METRICS.total()
+            start = time.perf_counter()
+            await asyncio.gather(*(user_session(first_user + i, random.Random(i)) for i in range(users)))
+            posted = time.perf_counter() - start
+            # Acknowledged isn't handled: wait for the processor to finish them
+            while bot.UPDATE_METRICS.total() - handled < users * 7:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+    finally:
+        await bot.stop_http_server(replay.app)
+        bot.WEBHOOK_URL, bot.WEBHOOK_SECRET, bot.PORT = saved
+    return {
+        'scenario': 'webhook_rush',
+        'updates': users * 7,
+        'seconds': elapsed,
+        'updates_per_second': users * 7 / elapsed,
+        'posts_per_second': users * 7 / posted,
+        'post_p50_ms': percentile(post_latencies, 0.50) * 1000,
+        'post_p99_ms': percentile(post_latencies, 0.99) * 1000,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run_scenario(replay, name, sessions):
+    replay.latencies = []
+    replay.by_label.clear()
+    db_calls = bot.UPDATE_PROCESSOR.db_calls
+    statements = replay.counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*sessions)
+    elapsed = time.perf_counter() - start
+    updates = len(replay.latencies)
+    return {
+        'scenario': name,
+        'updates': updates,
+        'seconds': elapsed,
+        'updates_per_second': updates / elapsed,
+        'p50_ms': percentile(replay.latencies, 0.50) * 1000,
+        'p99_ms': percentile(replay.latencies, 0.99) * 1000,
+        'p99_ms_by_label': {
+            label: percentile(values, 0.99) * 1000 for label, values in replay.by_label.items()
+        },
+        'db_calls_per_update': (bot.UPDATE_PROCESSOR.db_calls - db_calls) / updates,
+        'statements_per_update': (replay.counter.count - statements) / updates,
+    }
+
+
+# The real Application on a scratch database and the stub Bot API, as the
+# replay scenarios and the tests drive it
+@asynccontextmanager
+async def running_bot(dsn, reviewers=1, db_latency=0.0):
+    counter = StatementCounter(db_latency)
+    pool = CountingPool(counter, dsn, 1, bot.DB_POOL_MAX, timeout=10, check_idle=30)
+    api = StubBotAPI()
+    saved = bot.DB_POOL, bot.BOT_API_BASE_URL, bot.is_submissions_open, set(bot.REVIEWER_IDS)
+    saved_state = {name: getattr(bot, name) for name in FRESH_STATE}
+    reset_process_state()
+    bot.DB_POOL = pool
+    bot.BOT_API_BASE_URL = await api.start()
+    # A Friday-night rush, whatever day the replay runs on
+    bot.is_submissions_open = lambda: True
+    bot.REVIEWER_IDS.update(bot.ADMIN_ID + i for i in range(reviewers))
+    try:
+        # Warm-up runs at full speed; the latency is for traffic
+        counter.latency = 0.0
+        await asyncio.get_running_loop().run_in_executor(None, bot.load_state)
+        counter.latency = db_latency
+        app = bot.build_application()
+        await app.initialize()
+        await app.start()
+        replay = Replay(app, api, counter)
+        try:
+            # Start statements at zero: load_state's own queries aren't traffic
+            counter.count = 0
+            yield replay
+        finally:
+            if replay.app.running:
+                await replay.app.stop()
+            await replay.app.shutdown()
+    finally:
+        await api.stop()
+        bot.DB_POOL, bot.BOT_API_BASE_URL, bot.is_submissions_open = saved[:3]
+        bot.REVIEWER_IDS.clear()
+        bot.REVIEWER_IDS.update(saved[3])
+        for name, value in saved_state.items():
+            setattr(bot, name, value)
+        pool.closeall()
+
+
+async def replay_traffic(dsn, users=200, reviewers=3, seed=18, db_latency=0.0):
+    rng = random.Random(seed)
+    async with running_bot(dsn, reviewers, db_latency) as replay:
+        first_user = await bot.run_db(last_user_id) + 1
+        reviewer_ids = [bot.ADMIN_ID + i for i in range(reviewers)]
+        friday = await run_scenario(replay, 'friday_rush', [
+            submit_story(replay, first_user + i, random.Random(rng.random())) for i in range(users)
+        ])
+        saturday = await run_scenario(replay, 'saturday_review', [
+            review_backlog(replay, reviewer_id, random.Random(rng.random())) for reviewer_id in reviewer_ids
+        ])
+        # Half the readers hit the database, half don't
+        first_reader = first_user + users
+        readers = await run_scenario(replay, 'stats_readers', [
+            read_stats(replay, first_reader + i, '/mystats' if i % 2 else '/leaderboard', 5) for i in range(users)
+        ])
+        return [friday, saturday, readers]
+
+
+async def replay_commands(dsn, db_latency=0.0):
+    async with running_bot(dsn, db_latency=db_latency) as replay:
+        return await command_costs(replay, await bot.run_db(last_user_id) + 1)
+
+
+async def replay_webhook(dsn, users=200):
+    async with running_bot(dsn) as replay:
+        first_user = await bot.run_db(last_user_id) + 1
+        return await webhook_rush(replay, first_user, users, 'replay-secret')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Friday and Saturday traffic against a scratch database')
+    parser.add_argument('dsn', help='Postgres database to migrate and fill')
+    parser.add_argument('--users', type=int, default=200, help='users submitting in the Friday rush')
+    parser.add_argument('--reviewers', type=int, default=3, help='reviewers working the Saturday backlog')
+    parser.add_argument('--seed', type=int, default=18)
+    parser.add_argument('--db-latency', type=float, default=0.0, help='seconds added to every SQL statement')
+    args = parser.parse_args()
+
+    # One event loop for every run: the update processor's locks are bound to it
+    async def replay_all():
+        results = await replay_traffic(args.dsn, args.users, args.reviewers, args.seed, args.db_latency)
+        commands = await replay_commands(args.dsn, args.db_latency)
+        return results, commands, await replay_webhook(args.dsn, args.users)
+
+    results, commands, webhook = asyncio.run(replay_all())
+    print(f"{'scenario':<16} {'updates':>8} {'upd/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'db/upd':>7} {'sql/upd':>8}")
+    for r in results:
+        print(
+            f"{r['scenario']:<16} {r['updates']:>8} {r['updates_per_second']:>8.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {r['db_calls_per_update']:>7.2f} {r['statements_per_update']:>8.2f}"
+        )
+    readers = results[2]['p99_ms_by_label']
+    print(f"stats_readers p99: /mystats {readers['/mystats']:.2f} ms, /leaderboard {readers['/leaderboard']:.2f} ms")
+    print(f"\n{'command':<16} {'first sql':>9} {'sql':>5} {'p50 ms':>8} {'p99 ms':>8}")
+    for command, c in commands.items():
+        print(f"{command:<16} {c['first_statements']:>9} {c['statements']:>5} {c['p50_ms']:>8.2f} {c['p99_ms']:>8.2f}")
+    print(
+        f"\nwebhook_rush: {webhook['updates']} updates handled at {webhook['updates_per_second']:.1f}/s, "
+        f"posted at {webhook['posts_per_second']:.1f}/s, POST p50 {webhook['post_p50_ms']:.2f} ms "
+        f"p99 {webhook['post_p99_ms']:.2f} ms"
+    )
+
+
+if __name__ == '__main__':
+    main()
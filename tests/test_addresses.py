@@ -0,0 +1,140 @@
+import pytest
+
+import bot
+from conftest import add_submission, fetch
+
+# EIP-55's own examples: mixed-case checksummed, all caps and all lower
+EIP55_VALID = [
+    '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed',
+    '0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359',
+    '0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB',
+    '0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb',
+    '0x52908400098527886E0F7030069857D2E4169EE7',
+    '0x8617E340B3D01FA5F11F306F4090FD50E238070D',
+    '0xde709f2102306220921060314715629080e2fb77',
+    '0x27b1fdb04752bbc536007a920d24acb045561c26',
+]
+
+# BIP-350's valid segwit addresses (v0 bech32, v1-16 bech32m)
+SEGWIT_VALID = [
+    'BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4',
+    'tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7',
+    'bc1pw508d6qejxtdg4y5r3zarvary0c5xw7kw508d6qejxtdg4y5r3zarvary0c5xw7kt5nd6y',
+    'BC1SW50QGDZ25J',
+    'bc1zw508d6qejxtdg4y5r3zarvaryvaxxpcs',
+    'tb1qqqqqp399et2xygdj5xreqhjjvcmzhxw4aywxecjdzew6hylgvsesrxh6hy',
+    'tb1pqqqqp399et2xygdj5xreqhjjvcmzhxw4aywxecjdzew6hylgvsesf3hn0c',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0',
+]
+
+# BIP-350's invalid segwit addresses, except the one with an unknown hrp:
+# other chains' bech32 addresses only need a valid checksum here
+SEGWIT_INVALID = [
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqh2y7hd',
+    'tb1z0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqglt7rf',
+    'BC1S0XLXVLHEMJA6C4DQV22UAPCTQUPFHLXM9H8Z3K2E72Q4K9HCZ7VQ54WELL',
+    'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kemeawh',
+    'tb1q0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vq24jc47',
+    'bc1p38j9r5y49hruaue7wxjce0updqjuyyx0kh56v8s25huc6995vvpql3jow4',
+    'BC130XLXVLHEMJA6C4DQV22UAPCTQUPFHLXM9H8Z3K2E72Q4K9HCZ7VQ7ZWS8R',
+    'bc1pw5dgrnzv',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7v8n0nx0muaewav253zgeav',
+    'BC1QR508D6QEJXTDG4Y5R3ZARVARYV98GJ9P',
+    'tb1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vq47Zagq',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7v07qwwzcrf',
+    'tb1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vpggkg4j',
+    'bc1gmk9yu',
+]
+
+# BIP-173 and BIP-350's valid bech32 / bech32m strings, checksum only
+BECH32_VALID = [
+    'A12UEL5L',
+    'a12uel5l',
+    'abcdef1qpzry9x8gf2tvdw0s3jn54khce6mua7lmqqqxw',
+    'split1checkupstagehandshakeupstreamerranterredcaperred2y9e3w',
+    'A1LQFN3A',
+    'a1lqfn3a',
+    'abcdef1l7aum6echk45nj3s0wdvt2fg8x9yrzpqzd3ryx',
+    'split1checkupstagehandshakeupstreamerranterredcaperredlc445v',
+]
+
+# BIP-173's invalid strings
+BECH32_INVALID = ['pzry9x0s0muk', '1pzry9x0s0muk', 'x1b4n0q5v', 'li1dgmt3', 'A1G7SGD8', '10a06t8', '1qzzfhee']
+
+
+def test_keccak256_matches_the_empty_input_digest():
+    assert bot.keccak256(b'').hex() == 'c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470'
+    # Longer than one 136-byte block
+    assert bot.keccak256(b'a' * 200) != bot.keccak256(b'a' * 199)
+
+
+@pytest.mark.parametrize('address', EIP55_VALID)
+def test_eip55_examples_are_accepted(address):
+    assert bot.detect_address(address) == 'evm'
+
+
+@pytest.mark.parametrize('address', EIP55_VALID[:4])
+def test_eip55_examples_with_one_case_flipped_are_rejected(address):
+    # Flip the case of the last letter, keeping the rest of the checksum
+    i = max(i for i, c in enumerate(address) if c.isalpha() and i > 1)
+    flipped = address[:i] + address[i].swapcase() + address[i + 1:]
+    assert bot.detect_address(flipped) is None
+
+
+@pytest.mark.parametrize('address', SEGWIT_VALID)
+def test_bip350_valid_segwit_addresses(address):
+    assert bot.detect_address(address) == 'bech32:' + address.lower().rpartition('1')[0]
+
+
+@pytest.mark.parametrize('address', SEGWIT_INVALID)
+def test_bip350_invalid_segwit_addresses(address):
+    assert bot.detect_address(address) is None
+
+
+@pytest.mark.parametrize('text', BECH32_VALID)
+def test_bip173_and_bip350_valid_checksums(text):
+    assert bot.bech32_valid(text)
+
+
+@pytest.mark.parametrize('text', BECH32_INVALID)
+def test_bip173_invalid_strings(text):
+    assert bot.detect_address(text) is None
+
+
+@pytest.mark.parametrize('address, chain', [
+    # The genesis block's coinbase address and BIP-13's P2SH example
+    ('1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'bitcoin'),
+    ('3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy', 'bitcoin'),
+    # USDT's TRC-20 contract
+    ('TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t', 'tron'),
+    # USDC's mint and the system program
+    ('EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v', 'solana'),
+    ('11111111111111111111111111111111', 'solana'),
+])
+def test_known_base58_addresses(address, chain):
+    assert bot.detect_address(address) == chain
+
+
+@pytest.mark.parametrize('address', [
+    # One character changed, so the base58check checksum fails
+    '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb',
+    'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6u',
+    # Right alphabet and length, but neither 32 bytes nor 25
+    '1' * 30,
+])
+def test_corrupted_base58_addresses_are_rejected(address):
+    assert bot.detect_address(address) is None
+
+
+def test_what_the_old_check_let_through_is_now_rejected():
+    for junk in ('not_a_wallet_just_some_text', 'x' * 40, '0x' + 'g' * 40, 'bc1' + 'q' * 39):
+        assert not bot.is_valid_wallet(junk)
+
+
+def test_revalidate_tags_every_stored_address(db):
+    good = add_submission(wallet=EIP55_VALID[0])
+    bad = add_submission(user_id=101, wallet=EIP55_VALID[0].swapcase().replace('0X', '0x'))
+    assert bot.revalidate_addresses(batch=1) == {'evm': 1, 'invalid': 1}
+    rows = {r['id']: r for r in fetch(db, 'SELECT id, wallet_chain, contract_chain FROM submissions')}
+    assert rows[good]['wallet_chain'] == rows[good]['contract_chain'] == 'evm'
+    assert rows[bad]['wallet_chain'] == 'invalid'
@@ -0,0 +1,167 @@
+import os
+
+import psycopg2
+import pytest
+
+import bot
+from conftest import WEEK, add_submission, fetch
+
+SCORES = {'authenticity': 5, 'emotional': 4, 'lesson': 3, 'detail': 2, 'storytelling': 1}
+# COPY escapes all of these; the reader has to undo it
+AWKWARD = ['tab\there', 'two\nlines', 'back\\slash', 'emoji 🚀 and ünïcode', '\\N is not null', '']
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(bot, 'ARCHIVE', bot.ArchiveStore(str(tmp_path)))
+    return tmp_path
+
+
+def reviewed_week(count, week=WEEK, first_user=100):
+    ids = []
+    for i in range(count):
+        submission_id = add_submission(user_id=first_user + i % 7, story=f'story {i} {AWKWARD[i % len(AWKWARD)]}', week=week)
+        if i % 3:
+            bot.approve_submission(submission_id, SCORES, bot.ADMIN_ID)
+        else:
+            bot.reject_submission(submission_id, 'Copied', bot.ADMIN_ID)
+        ids.append(submission_id)
+    return ids
+
+
+def execute(db, sql, params=None):
+    conn = psycopg2.connect(db)
+    try:
+        conn.cursor().execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def archived_stats(db):
+    return {r['user_id']: (r['total'], r['approved'], r['rejected'])
+            for r in fetch(db, 'SELECT * FROM archived_user_stats WHERE total > 0')}
+
+
+def expected_stats(rows):
+    stats = {}
+    for row in rows:
+        total, approved, rejected = stats.get(row['user_id'], (0, 0, 0))
+        stats[row['user_id']] = (total + 1, approved + (row['status'] == 'approved'), rejected + (row['status'] == 'rejected'))
+    return stats
+
+
+def files(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_writer_and_reader_round_trip_copy_text(tmp_path):
+    lines = [f'{i}\tuser{i}\t{"a" * (i % 50)}\\tx\\n\\\\\t\\N' for i in range(1, 700)]
+    path = tmp_path / 'week.arc'
+    with open(path, 'wb') as f:
+        writer = bot.ArchiveWriter(f, ['id', 'username', 'story', 'amount'], bot.Week(2026, 10))
+        data = ''.join(line + '\n' for line in lines).encode()
+        # COPY hands over chunks that split rows anywhere
+        for start in range(0, len(data), 777):
+            writer.write(data[start:start + 777])
+        writer.close()
+
+    reader = bot.ArchiveReader(str(path))
+    assert reader.verify()
+    assert (reader.week, reader.rows, reader.min_id, reader.max_id) == (bot.Week(2026, 10), 699, 1, 699)
+    assert len(reader.blocks) == 3
+    assert reader.get(300) == {'id': 300, 'username': 'user300', 'story': '\tx\n\\', 'amount': None}
+    assert reader.get(700) is None
+    assert [row['id'] for row in reader.iter_rows()] == list(range(1, 700))
+    # What restore_week feeds back to COPY is exactly what COPY wrote
+    stream = reader.stream()
+    assert b''.join(iter(lambda: stream.read(1000), b'')) == data
+
+    # Flip one byte inside the second block
+    raw = bytearray(path.read_bytes())
+    offset = reader.blocks[1][2] + 10
+    raw[offset] ^= 0xFF
+    path.write_bytes(bytes(raw))
+    assert not bot.ArchiveReader(str(path)).verify()
+
+
+def test_archive_and_restore_round_trip(db, archive_dir):
+    reviewed_week(600)
+    # Columns COPY writes as \N
+    execute(db, "UPDATE submissions SET contract_address = NULL, amount = NULL WHERE id % 5 = 0")
+    before = fetch(db, 'SELECT * FROM submissions ORDER BY id')
+
+    assert bot.archive_week(WEEK) == 600
+    assert files(archive_dir) == [os.path.basename(bot.ARCHIVE.reader(WEEK).path)]
+    assert fetch(db, "SELECT to_regclass('submissions_2026_w10') AS rel")[0]['rel'] is None
+    assert archived_stats(db) == expected_stats(before)
+
+    reader = bot.ARCHIVE.reader(WEEK)
+    assert reader.verify() and reader.rows == 600
+    for row in (before[0], before[299], before[-1]):
+        archived = bot.ARCHIVE.get(row['id'])
+        assert (archived['story'], archived['status'], archived['contract_address']) == (
+            row['story'], row['status'], row['contract_address']
+        )
+    assert [r['id'] for r in bot.ARCHIVE.search('two\nlines', limit=3)] == [r['id'] for r in before if 'two\nlines' in r['story']][:3]
+
+    assert bot.restore_week(WEEK) == 600
+    assert fetch(db, 'SELECT * FROM submissions ORDER BY id') == before
+    assert files(archive_dir) == []
+    assert fetch(db, 'SELECT * FROM archived_weeks') == []
+    assert archived_stats(db) == {}
+
+
+def test_failed_archive_publishes_nothing_and_a_retry_counts_once(db, archive_dir, monkeypatch):
+    reviewed_week(20)
+    before = fetch(db, 'SELECT * FROM submissions ORDER BY id')
+    replace = os.replace
+
+    def replace_then_fail(src, dst):
+        replace(src, dst)
+        raise OSError('disk full')
+
+    with monkeypatch.context() as m:
+        m.setattr(bot.os, 'replace', replace_then_fail)
+        with pytest.raises(OSError):
+            bot.archive_week(WEEK)
+    assert files(archive_dir) == []
+    assert fetch(db, 'SELECT * FROM submissions ORDER BY id') == before
+    assert archived_stats(db) == {}
+    assert bot.ARCHIVE.reader(WEEK) is None
+
+    assert bot.archive_week(WEEK) == 20
+    # Run again after it went through: nothing left to archive
+    assert bot.archive_week(WEEK) == 0
+    assert archived_stats(db) == expected_stats(before)
+    assert len(files(archive_dir)) == 1
+
+
+def test_rows_stranded_in_default_join_their_weeks_archive(db, archive_dir):
+    first = reviewed_week(5)
+    assert bot.archive_week(WEEK) == 5
+    old_file = bot.ARCHIVE.reader(WEEK).path
+
+    # Rows for the archived week that ended up in the default partition
+    stranded = reviewed_week(3, first_user=200)
+    execute(db, '''
+        ALTER TABLE submissions DETACH PARTITION submissions_2026_w10;
+        INSERT INTO submissions_default SELECT * FROM submissions_2026_w10;
+        DROP TABLE submissions_2026_w10
+    ''')
+    bot.WEEK_PARTITIONS.clear()
+    assert {r['part'] for r in fetch(db, 'SELECT tableoid::regclass::text AS part FROM submissions')} == {'submissions_default'}
+    rows = fetch(db, 'SELECT * FROM submissions ORDER BY id')
+
+    cutoff = bot.Week(WEEK.iso_year, WEEK.week + 1)
+    assert bot.archivable_weeks(cutoff) == [WEEK]
+    assert bot.archive_week(WEEK) == 3
+
+    reader = bot.ARCHIVE.reader(WEEK)
+    assert reader.rows == 8 and reader.verify()
+    assert [row['id'] for row in reader.iter_rows()] == first + stranded
+    assert files(archive_dir) == [os.path.basename(reader.path)] and reader.path != old_file
+    assert fetch(db, 'SELECT COUNT(*) AS n FROM submissions')[0]['n'] == 0
+    assert sum(total for total, _, _ in archived_stats(db).values()) == 8
+    assert {user: stats for user, stats in archived_stats(db).items() if user >= 200} == expected_stats(rows)
@@ -0,0 +1,10 @@
+import pytest
+
+from bench import BENCHMARKS
+
+
+@pytest.mark.parametrize('name', sorted(BENCHMARKS))
+def test_benchmark_runs_at_smoke_size(request, name):
+    fn, _, smoke, db = BENCHMARKS[name]
+    rows = fn(smoke, request.getfixturevalue('db')) if db else fn(smoke)
+    assert rows and all(len(row) == 2 for row in rows)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from collections import Counter
+
+import bot
+from bench import SinkBot, add_users, send_budget
+from conftest import fetch
+
+FIRST = 1000
+USERS = 45
+BLOCKS = {1007, 1023}
+ALREADY_BLOCKED = 1030
+
+
+class StoppingBot(SinkBot):
+    # Restart the bot (as far as the broadcast can tell) partway through
+    def __init__(self, blocked, stop_at):
+        super().__init__(blocked)
+        self.stop_at = stop_at
+        self.broadcast = None
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id == self.stop_at:
+            self.broadcast.stopping = True
+        return await super().send_message(chat_id, text, reply_markup)
+
+
+def test_broadcast_skips_blocked_users_and_resumes_without_duplicates(db, monkeypatch):
+    monkeypatch.setattr(bot, 'BROADCAST_PAGE', 10)
+    add_users(FIRST, USERS)
+    with bot.db_conn() as conn:
+        conn.cursor().execute('UPDATE users SET blocked_at = now() WHERE telegram_id = %s', (ALREADY_BLOCKED,))
+        conn.commit()
+
+    async def interrupted_then_resumed():
+        with send_budget(1e6):
+            sink = StoppingBot(BLOCKS, stop_at=1025)
+            sink.broadcast = bot.Broadcast(bot.create_broadcast('Week 10 winners are in!'))
+            await sink.broadcast.run(sink)
+            first_run = list(sink.sent)
+            [row] = await bot.run_db(bot.get_running_broadcasts)
+            await bot.Broadcast(row).run(sink)
+            return first_run, sink.sent
+
+    first_run, sent = asyncio.run(interrupted_then_resumed())
+
+    expected = set(range(FIRST, FIRST + USERS)) - BLOCKS - {ALREADY_BLOCKED}
+    assert FIRST + USERS - 1 not in first_run
+    assert Counter(sent) == Counter(expected)
+    [row] = fetch(db, 'SELECT status, total, sent, failed, blocked FROM broadcasts')
+    assert row == {'status': 'done', 'total': USERS - 1, 'sent': len(expected), 'failed': 0, 'blocked': len(BLOCKS)}
+    blocked = fetch(db, 'SELECT telegram_id FROM users WHERE blocked_at IS NOT NULL ORDER BY telegram_id')
+    assert [r['telegram_id'] for r in blocked] == sorted(BLOCKS | {ALREADY_BLOCKED})
+    assert bot.count_broadcast_recipients() == len(expected)
+
+
+def test_outbox_and_broadcast_share_the_send_budget(db):
+    rate = 100
+    add_users(FIRST, 50)
+
+    async def both():
+        with send_budget(rate) as budget:
+            sink = SinkBot()
+            queue = bot.OutboundQueue(budget, chat_interval=0)
+            worker = asyncio.create_task(queue._run(sink))
+            for i in range(50):
+                queue.send(5000 + i, 'Your story was approved!')
+            start = time.perf_counter()
+            await bot.Broadcast(bot.create_broadcast('hello')).run(sink)
+            while queue.delivered < 50:
+                await asyncio.sleep(0.001)
+            worker.cancel()
+            return len(sink.sent), time.perf_counter() - start
+
+    sends, elapsed = asyncio.run(both())
+
+    assert sends == 100
+    # 100 sends at 100/s between them, not 100/s each
+    assert elapsed >= (sends - 1) / rate * 0.95
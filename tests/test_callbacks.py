@@ -0,0 +1,123 @@
+import base64
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import bot
+
+# Every varint length up to the largest BIGINT a submission id could be
+BOUNDARIES = [0, 1, 127, 128, 16_383, 16_384, 2_097_151, 2_097_152, 2 ** 31 - 1, 2 ** 63 - 1]
+
+
+def random_callback(rng):
+    name = rng.choice(sorted(bot.CALLBACK_SCHEMAS))
+    values = []
+    for field in bot.CALLBACK_SCHEMAS[name][1]:
+        values.append(rng.choice(BOUNDARIES + [rng.randrange(2 ** 40)]) if field is int else rng.choice(field))
+    return (name, *values)
+
+
+def raw(data):
+    return bytearray(base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)))
+
+
+def pack(body):
+    return base64.urlsafe_b64encode(bytes(body)).rstrip(b'=').decode()
+
+
+def decode(data):
+    # Straight through the codec, not the decode cache
+    return bot._decode_compact(data)
+
+
+def test_every_callback_round_trips():
+    rng = random.Random(16)
+    for _ in range(2000):
+        callback = random_callback(rng)
+        data = bot.encode_callback(*callback)
+        assert decode(data) == callback
+        assert bot.decode_callback(data) == callback
+
+
+@pytest.mark.parametrize('n', BOUNDARIES)
+def test_varint_boundaries(n):
+    data = bot.encode_callback('review', 'approve', n)
+    assert decode(data) == ('review', 'approve', n)
+    # Version, tag, one choice byte, then seven bits per varint byte
+    assert len(raw(data)) == 3 + max(1, -(-n.bit_length() // 7)) + bot.CALLBACK_MAC_BYTES
+
+
+def test_every_flipped_bit_is_rejected():
+    rng = random.Random(17)
+    for _ in range(200):
+        body = raw(bot.encode_callback(*random_callback(rng)))
+        for i in range(len(body)):
+            for bit in range(8):
+                tampered = bytearray(body)
+                tampered[i] ^= 1 << bit
+                assert decode(pack(tampered)) is None
+
+
+def test_truncated_and_extended_data_is_rejected():
+    rng = random.Random(18)
+    for _ in range(200):
+        data = bot.encode_callback(*random_callback(rng))
+        body = raw(data)
+        for end in range(len(body)):
+            assert decode(pack(body[:end])) is None
+        for end in range(len(data)):
+            assert decode(data[:end]) is None
+        assert decode(pack(body + b'\0')) is None
+
+
+def test_data_signed_with_another_secret_is_rejected(monkeypatch):
+    data = bot.encode_callback('review', 'approve', 123)
+    monkeypatch.setattr(bot, 'CALLBACK_SECRET', b'some other deployment')
+    forged = bot.encode_callback('review', 'approve', 123)
+    monkeypatch.undo()
+
+    assert forged != data
+    assert decode(forged) is None
+    # Same body, MAC cut from a different message
+    assert decode(pack(raw(data)[:-4] + raw(bot.encode_callback('review', 'reject', 123))[-4:])) is None
+
+
+def test_garbage_is_rejected():
+    for data in ['', '=', '!!!!', 'review_approve_', 'A' * 64, pack(b'\x01'), pack(b'\x02\x03' + b'\0' * 8)]:
+        assert bot.decode_callback(data) is None
+
+
+def test_callback_data_fits_telegrams_limit():
+    longest = max(
+        (bot.encode_callback(name, *(2 ** 63 - 1 if f is int else f[-1] for f in fields))
+         for name, (_, fields) in bot.CALLBACK_SCHEMAS.items()),
+        key=len,
+    )
+    assert len(longest.encode()) <= bot.CALLBACK_DATA_LIMIT
+    with pytest.raises(ValueError):
+        bot.encode_callback('review', 'approve', 2 ** 400)
+    with pytest.raises(ValueError):
+        bot.encode_callback('review', 'approve', -1)
+
+
+@pytest.mark.parametrize('legacy, decoded', [
+    ('review_approve_123', ('review', 'approve', 123)),
+    ('reject_copied_7', ('reject', 'copied', 7)),
+    ('score_authenticity_600', ('score', 'authenticity', 600)),
+    ('score_confirm', ('scoring', 'confirm')),
+    ('type_rekt', ('type', 'rekt')),
+])
+def test_legacy_data_is_accepted_only_until_the_cutoff(monkeypatch, legacy, decoded):
+    monkeypatch.setattr(bot, 'CALLBACK_LEGACY_UNTIL', None)
+    assert bot.decode_callback(legacy) is None
+    monkeypatch.setattr(bot, 'CALLBACK_LEGACY_UNTIL', datetime.utcnow() + timedelta(hours=1))
+    assert bot.decode_callback(legacy) == decoded
+    monkeypatch.setattr(bot, 'CALLBACK_LEGACY_UNTIL', datetime.utcnow() - timedelta(seconds=1))
+    assert bot.decode_callback(legacy) is None
+
+
+def test_malformed_legacy_data_is_rejected_even_before_the_cutoff(monkeypatch):
+    monkeypatch.setattr(bot, 'CALLBACK_LEGACY_UNTIL', datetime.utcnow() + timedelta(hours=1))
+    for data in ['review_approve_x', 'review_publish_1', 'reject_bogus_1', 'score_authenticity', 'nope_1']:
+        assert bot.decode_callback(data) is None
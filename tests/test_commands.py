@@ -0,0 +1,32 @@
+import asyncio
+
+import bot
+from conftest import add_submission
+from replay import command_costs, running_bot
+
+DB_LATENCY = 0.05
+
+
+def test_command_round_trips(db):
+    bot.ensure_user(100, 'user100')
+    add_submission()
+
+    async def measure():
+        async with running_bot(db, db_latency=DB_LATENCY) as replay:
+            replay.counter.log = []
+            costs = await command_costs(replay, 100, rounds=3)
+            return costs, replay.counter.log
+
+    costs, log = asyncio.run(measure())
+
+    # /mystats is one statement, prepared alongside its first execution,
+    # plus the upsert for a user this process hasn't seen yet; /leaderboard
+    # is served from memory
+    assert costs['/mystats']['first_statements'] == 2
+    assert costs['/mystats']['statements'] == 1
+    assert costs['/leaderboard']['statements'] == 0
+    mystats = [sql for sql in log if 'user_stats' in sql]
+    assert mystats[0].startswith('PREPARE user_stats')
+    assert all(sql.startswith('EXECUTE user_stats') for sql in mystats[1:])
+    # Every statement costs DB_LATENCY, so one round trip shows as one
+    assert DB_LATENCY * 1000 <= costs['/mystats']['p50_ms'] < 2 * DB_LATENCY * 1000
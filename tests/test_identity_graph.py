@@ -0,0 +1,81 @@
+import random
+
+import bot
+from conftest import add_submission
+
+
+def random_links(count, seed=22):
+    rng = random.Random(seed)
+    wallets = [f'0x{i:040x}' for i in range(count // 2)]
+    return [(rng.randrange(count), rng.choice(wallets)) for _ in range(count)]
+
+
+# Connected components of the user-wallet graph by flood fill
+def brute_force(links):
+    edges = {}
+    for user_id, wallet in links:
+        edges.setdefault(('user', user_id), set()).add(('wallet', wallet))
+        edges.setdefault(('wallet', wallet), set()).add(('user', user_id))
+    clusters = {}
+    for start in edges:
+        if start in clusters:
+            continue
+        seen, todo = {start}, [start]
+        while todo:
+            for nxt in edges[todo.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    todo.append(nxt)
+        users = {key[1] for key in seen if key[0] == 'user'}
+        for key in seen:
+            clusters[key] = users
+    return clusters
+
+
+def test_clusters_match_a_flood_fill():
+    links = random_links(3000)
+    graph = bot.IdentityGraph()
+    for user_id, wallet in links:
+        graph.link(user_id, wallet)
+
+    expected = brute_force(links)
+    for user_id in {u for u, _ in links}:
+        users = expected[('user', user_id)]
+        size, others = graph.cluster(user_id, limit=len(users))
+        assert size == len(users)
+        assert sorted(others) == sorted(users - {user_id})
+    assert graph.cluster(10**9) == (1, [])
+
+
+def test_wallets_are_linked_case_insensitively_and_contracts_only_when_enabled(monkeypatch):
+    graph = bot.IdentityGraph()
+    graph.link(1, '0xABC', '0xToken')
+    graph.link(2, ' 0xabc ', None)
+    graph.link(3, '0xdef', '0xtoken')
+    assert graph.cluster(1) == (2, [2])
+    assert graph.cluster(3) == (1, [])
+
+    monkeypatch.setattr(bot, 'IDENTITY_LINK_CONTRACTS', True)
+    graph.link(3, '0xdef', '0xtoken')
+    graph.link(1, '0xabc', '0xtoken')
+    size, others = graph.cluster(3)
+    assert size == 3 and sorted(others) == [1, 2]
+
+
+def test_cluster_lists_at_most_limit_others():
+    graph = bot.IdentityGraph()
+    for user_id in range(20):
+        graph.link(user_id, '0xshared')
+    size, others = graph.cluster(0)
+    assert size == 20
+    assert len(others) == bot.IDENTITY_MAX_SHOWN and 0 not in others
+
+
+def test_cold_start_loads_every_submission(db):
+    add_submission(user_id=100, wallet='0xAA')
+    add_submission(user_id=101, wallet='0xaa')
+    add_submission(user_id=102, wallet='0xbb')
+    graph = bot.IdentityGraph()
+    bot.load_identity_graph(graph)
+    assert graph.cluster(100) == (2, [101])
+    assert graph.cluster(102) == (1, [])
@@ -0,0 +1,102 @@
+import re
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import bot
+from conftest import WEEK, add_submission
+
+# The queries each hot helper sends, captured as the server will see them
+QUERIES = []
+
+
+class RecordingCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        QUERIES.append(self.mogrify(query, vars).decode())
+        return super().execute(query, vars)
+
+
+class RecordingPool(bot.DBPool):
+    def _connect(self):
+        return psycopg2.connect(self.dsn, connection_factory=bot.PreparingConnection, cursor_factory=RecordingCursor)
+
+
+def _normalize(expr):
+    return re.sub(r'[()\s]', '', expr)
+
+
+# Scans that don't narrow by an index's leading key: seq scans, and index
+# scans that walk a whole index (which the planner falls back to once seq
+# scans are disabled, filtering on a later column). Partial indexes count
+# as narrowed by their predicate.
+def unindexed_scans(plan, leads):
+    found = []
+    kind = plan['Node Type']
+    if kind == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    elif kind in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'):
+        lead, partial = leads[plan['Index Name']]
+        cond = _normalize(plan.get('Index Cond', ''))
+        if not partial and not re.search(r'(?<![\w.])' + re.escape(lead) + r'(?!\w)', cond):
+            found.append(plan['Index Name'])
+    for child in plan.get('Plans', ()):
+        found.extend(unindexed_scans(child, leads))
+    return found
+
+
+def explain(dsn, sql):
+    conn = psycopg2.connect(dsn)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.relname, pg_get_indexdef(i.indexrelid, 1, true), i.indpred IS NOT NULL
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        ''')
+        leads = {name: (_normalize(lead), partial) for name, lead, partial in cursor.fetchall()}
+        # Any plan that can use an index will once seq scans cost 1e10
+        cursor.execute('SET enable_seqscan = off')
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+        return unindexed_scans(cursor.fetchone()[0][0]['Plan'], leads)
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def recorded(db, monkeypatch):
+    monkeypatch.setattr(bot, 'DB_POOL', RecordingPool(db, 1, 2))
+    # One approved row, so set_week_champion goes on to its champions lookup
+    submission_id = add_submission()
+    with bot.db_conn() as conn:
+        conn.cursor().execute("UPDATE submissions SET status = 'approved' WHERE id = %s", (submission_id,))
+        conn.commit()
+    QUERIES.clear()
+    return db
+
+
+HOT_CALLS = [
+    ('check_user_rate_limit', lambda: bot.check_user_rate_limit(100)),
+    ('check_wallet_rate_limit', lambda: bot.check_wallet_rate_limit('0x' + 'AB' * 20)),
+    ('count_week_submissions', lambda: bot.count_week_submissions(WEEK)),
+    ('get_admin_status', lambda: bot.get_admin_status(WEEK)),
+    ('set_week_champion', lambda: bot.set_week_champion(WEEK)),
+    ('count_pending_submissions', bot.count_pending_submissions),
+    ('get_pending_page', lambda: bot.get_pending_page('1970-01-01', 0, 25, [], 1)),
+    ('claim_submission', lambda: bot.claim_submission(1, 1)),
+]
+
+
+@pytest.mark.parametrize('name,call', HOT_CALLS, ids=[c[0] for c in HOT_CALLS])
+def test_hot_query_uses_an_index(recorded, name, call):
+    call()
+    statements = [q for q in QUERIES if q.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')]
+    assert statements, f"{name} sent no queries"
+    for sql in statements:
+        assert explain(recorded, sql) == [], f"{name} scans without an index:\n{sql}"
+
+
+def test_user_stats_statement_uses_indexes(db):
+    types, sql = bot.PREPARED_STATEMENTS['user_stats']
+    params = {f'${i}': str(100) for i in range(1, len(types) + 1)}
+    query = re.sub(r'\$\d+', lambda m: params[m.group(0)], sql)
+    assert explain(db, query) == []
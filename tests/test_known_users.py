@@ -0,0 +1,47 @@
+import asyncio
+
+import bot
+from bench import known_users_commands, replay_known_users
+from conftest import fetch
+from replay import CountingPool, StatementCounter
+
+COMMANDS = 5_000
+
+
+def test_repeat_commands_write_once_per_new_user(db, monkeypatch):
+    counter = StatementCounter()
+    pool = CountingPool(counter, db, 1, bot.DB_POOL_MAX, timeout=10, check_idle=30)
+    monkeypatch.setattr(bot, 'DB_POOL', pool)
+    traffic, names = known_users_commands(COMMANDS)
+    known = bot.KnownUsers()
+
+    try:
+        asyncio.run(replay_known_users(known, traffic))
+    finally:
+        pool.closeall()
+
+    assert known.inserts == len(names)
+    # One upsert per user; renames go out in batches, not one per command
+    assert counter.count == known.inserts + known.flushes
+    assert known.flushes <= known.renames // bot.USERNAME_FLUSH_BATCH + 2
+    rows = fetch(db, 'SELECT telegram_id, username FROM users')
+    assert {r['telegram_id']: r['username'] for r in rows} == names
+
+
+def test_forgotten_user_is_written_again(db):
+    known = bot.KnownUsers()
+
+    async def visits():
+        await known.ensure(100, 'user100')
+        with bot.db_conn() as conn:
+            conn.cursor().execute('UPDATE users SET blocked_at = now() WHERE telegram_id = 100')
+            conn.commit()
+        await known.ensure(100, 'user100')
+        blocked_while_known = fetch(db, 'SELECT blocked_at FROM users')[0]['blocked_at']
+        known.forget([100])
+        await known.ensure(100, 'user100')
+        return blocked_while_known
+
+    assert asyncio.run(visits()) is not None
+    assert known.inserts == 2
+    assert fetch(db, 'SELECT blocked_at FROM users')[0]['blocked_at'] is None
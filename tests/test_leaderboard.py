@@ -0,0 +1,57 @@
+import asyncio
+import random
+
+import bot
+from replay import running_bot
+
+
+def brute_rank(scores, user_id):
+    return 1 + sum(1 for s in scores.values() if s > scores[user_id])
+
+
+def test_rank_and_top_match_a_full_sort():
+    rng = random.Random(4)
+    board = bot.Leaderboard(size=4)
+    scores = {i: rng.randrange(0, 50) * bot.SCORE_STEP for i in range(500)}
+    board.load({'telegram_id': i, 'username': f'user{i}', 'total_moondust': s} for i, s in scores.items())
+
+    # Incremental updates, including ones that grow the tree past its size
+    for _ in range(2000):
+        user_id = rng.randrange(600)
+        delta = rng.choice([-1, 1, 3, 40]) * bot.SCORE_STEP
+        if user_id in scores and scores[user_id] + delta < 0:
+            continue
+        scores[user_id] = scores.get(user_id, 0) + delta
+        board.add(user_id, delta)
+
+    assert len(board) == len(scores)
+    for user_id in scores:
+        assert board.rank(user_id) == brute_rank(scores, user_id)
+    top = board.top(10)
+    assert [u['total_moondust'] for u in top] == sorted(scores.values(), reverse=True)[:10]
+    assert all(scores[u['telegram_id']] == u['total_moondust'] for u in top)
+
+
+def test_touch_registers_new_users_at_zero():
+    board = bot.Leaderboard()
+    board.set(1, 4 * bot.SCORE_STEP, 'alice')
+    board.touch(2, 'bob')
+    board.touch(1, 'alice2')
+    assert board.rank(2) == 2
+    assert board.score(1) == 4 * bot.SCORE_STEP
+    assert board.username(1) == 'alice2'
+
+
+def test_new_user_shows_up_on_a_cached_leaderboard(db):
+    async def run():
+        async with running_bot(db) as replay:
+            await replay.send(20_001, '/mystats')
+            await replay.send(20_001, '/leaderboard')
+            first = replay.api.screens[20_001]['text']
+            await replay.send(20_002, '/mystats')
+            await replay.send(20_001, '/leaderboard')
+            return first, replay.api.screens[20_001]['text']
+
+    before, after = asyncio.run(run())
+    assert '@user20002' not in before
+    assert '@user20002' in after
@@ -0,0 +1,81 @@
+import asyncio
+
+import bot
+from conftest import fetch
+from replay import running_bot
+
+USER = 20_001
+WALLET = '0x' + 'cd' * 20
+
+
+def test_submission_resumes_after_a_restart(db):
+    async def run():
+        async with running_bot(db) as replay:
+            await replay.send(USER, '/start')
+            await replay.press(USER, '📉 REKT Story')
+            await replay.send(USER, WALLET)
+            await replay.send(USER, '0x' + 'ab' * 20)
+            await replay.send(USER, '3 ETH')
+            # Waiting for the story when the bot is redeployed
+            await replay.restart()
+            await replay.send(USER, 'Bought the top and sold the bottom, twice in one week.')
+            await replay.press(USER, '✅ Submit')
+            return replay.api.screens[USER]['text']
+
+    reply = asyncio.run(run())
+    assert 'Submitted' in reply
+    rows = fetch(db, 'SELECT user_id, wallet_address, amount, story_type FROM submissions')
+    assert rows == [{'user_id': USER, 'wallet_address': WALLET, 'amount': '3 ETH', 'story_type': 'rekt'}]
+
+
+def test_crash_loses_only_the_steps_since_the_last_write(db):
+    async def run():
+        async with running_bot(db) as replay:
+            await replay.send(USER, '/start')
+            await replay.press(USER, '📉 REKT Story')
+            await replay.send(USER, WALLET)
+            await replay.persist_round()
+            await replay.send(USER, '0x' + 'ab' * 20)
+            await replay.send(USER, '3 ETH')
+            # Killed before the next round: the contract and amount are lost,
+            # the wallet isn't
+            await replay.restart(crash=True)
+            await replay.send(USER, 'Bought the top and sold the bottom, twice in one week.')
+            asked_again = replay.api.screens[USER]['text']
+            await replay.send(USER, '0x' + 'ab' * 20)
+            await replay.send(USER, '3 ETH')
+            await replay.send(USER, 'Bought the top and sold the bottom, twice in one week.')
+            await replay.press(USER, '✅ Submit')
+            return asked_again
+
+    assert 'Invalid contract address' in asyncio.run(run())
+    rows = fetch(db, 'SELECT user_id, wallet_address FROM submissions')
+    assert rows == [{'user_id': USER, 'wallet_address': WALLET}]
+
+
+def test_scoring_resumes_after_a_restart(db):
+    async def run():
+        async with running_bot(db) as replay:
+            await replay.send(USER, '/start')
+            await replay.press(USER, '🚀 MOON Story')
+            for text in (WALLET, '0x' + 'ab' * 20, '10x', 'Aped in early and held through every dip.'):
+                await replay.send(USER, text)
+            await replay.press(USER, '✅ Submit')
+
+            reviewer = bot.ADMIN_ID
+            await replay.send(reviewer, '/pending')
+            await replay.press(reviewer, '✅ Approve')
+            await replay.press(reviewer, '1000')
+            await replay.press(reviewer, '800')
+            # Redeployed two criteria in: the review queue is process
+            # memory and goes with it, the scores so far must not
+            await replay.restart()
+            for score in ('600', '400', '200'):
+                await replay.press(reviewer, score)
+            await replay.press(reviewer, '✅ Confirm')
+            return replay.api.screens[reviewer]['text']
+
+    reply = asyncio.run(run())
+    assert 'APPROVED: 3,000 Moondust' in reply
+    rows = fetch(db, 'SELECT status, total_moondust, score_authenticity, score_storytelling FROM submissions')
+    assert rows == [{'status': 'approved', 'total_moondust': 3000, 'score_authenticity': 1000, 'score_storytelling': 200}]
@@ -0,0 +1,60 @@
+import asyncio
+
+import bot
+from conftest import add_submission
+
+
+def test_window_slides():
+    limiter = bot.SlidingWindowLimiter(window=100, limit=2)
+    limiter.record('a', at=1000)
+    limiter.record('a', at=1050)
+    assert limiter.is_limited('a', now=1060)
+    # The first hit ages out at 1100
+    assert not limiter.is_limited('a', now=1100)
+    assert limiter.count('a', now=1149) == 1
+    assert limiter.count('a', now=1150) == 0
+    assert len(limiter) == 0
+
+
+def test_out_of_order_warm_up_rows_are_sorted():
+    limiter = bot.SlidingWindowLimiter(window=100, limit=1)
+    limiter.record('a', at=1050)
+    limiter.record('a', at=1000)
+    assert limiter.count('a', now=1120) == 1
+
+
+def test_restart_rewarms_from_the_database(db, monkeypatch):
+    add_submission(user_id=100, wallet='0x' + 'AB' * 20)
+    old = add_submission(user_id=200, wallet='0x' + 'cd' * 20)
+    with bot.db_conn() as conn:
+        conn.cursor().execute(
+            "UPDATE submissions SET submitted_at = CURRENT_TIMESTAMP - INTERVAL '25 hours' WHERE id = %s", (old,)
+        )
+        conn.commit()
+
+    # A fresh process: empty limiters until warm-up
+    monkeypatch.setattr(bot, 'USER_LIMITER', bot.SlidingWindowLimiter())
+    monkeypatch.setattr(bot, 'WALLET_LIMITER', bot.SlidingWindowLimiter())
+    bot.warm_rate_limiters()
+
+    assert bot.USER_LIMITER.warmed and bot.WALLET_LIMITER.warmed
+    assert asyncio.run(bot.is_user_rate_limited(100))
+    assert asyncio.run(bot.is_wallet_rate_limited('0x' + 'ab' * 20))
+    assert not asyncio.run(bot.is_user_rate_limited(200))
+    assert not asyncio.run(bot.is_wallet_rate_limited('0x' + 'cd' * 20))
+
+
+def test_failed_warm_up_falls_back_to_the_database(db, monkeypatch):
+    add_submission(user_id=100)
+    monkeypatch.setattr(bot, 'USER_LIMITER', bot.SlidingWindowLimiter())
+    monkeypatch.setattr(bot, 'WALLET_LIMITER', bot.SlidingWindowLimiter())
+
+    def unavailable(*args):
+        raise RuntimeError('database restarting')
+
+    monkeypatch.setattr(bot, 'get_recent_submissions', unavailable)
+    bot.warm_rate_limiters()
+
+    assert not bot.USER_LIMITER.warmed
+    assert asyncio.run(bot.is_user_rate_limited(100))
+    assert not asyncio.run(bot.is_user_rate_limited(101))
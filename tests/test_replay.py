@@ -0,0 +1,44 @@
+import asyncio
+
+from conftest import fetch
+from replay import read_stats, replay_traffic, run_scenario, running_bot
+
+USERS = 20
+
+# run_db() calls per update the replay may average before it counts as a
+# regression; a Friday submission is seven updates around one insert
+DB_CALL_BUDGET = {'friday_rush': 0.5, 'saturday_review': 1.0, 'stats_readers': 1.0}
+
+
+def test_replay_submits_and_reviews_every_story(db):
+    results = asyncio.run(replay_traffic(db, users=USERS, reviewers=2))
+
+    by_name = {r['scenario']: r for r in results}
+    assert by_name['friday_rush']['updates'] == USERS * 7
+    rows = fetch(db, 'SELECT status, reviewed_by FROM submissions')
+    assert len(rows) == USERS
+    assert {r['status'] for r in rows} == {'approved'}
+    awards = fetch(db, "SELECT COUNT(*) AS n FROM moondust_ledger WHERE action = 'award'")
+    assert awards[0]['n'] == USERS
+
+    for r in results:
+        assert r['p50_ms'] <= r['p99_ms']
+        assert r['updates_per_second'] > 0
+        assert r['db_calls_per_update'] <= DB_CALL_BUDGET[r['scenario']], r
+
+
+DB_LATENCY = 0.2
+
+
+def test_slow_database_does_not_stall_other_updates(db):
+    # Every statement takes 200ms. /mystats waits on it; /leaderboard is
+    # answered from memory and must not queue behind the blocked queries.
+    async def readers():
+        async with running_bot(db, db_latency=DB_LATENCY) as replay:
+            return await run_scenario(replay, 'stats_readers', [
+                read_stats(replay, 20_000 + i, '/mystats' if i % 2 else '/leaderboard', 3) for i in range(16)
+            ])
+
+    p99 = asyncio.run(readers())['p99_ms_by_label']
+    assert p99['/mystats'] >= DB_LATENCY * 1000
+    assert p99['/leaderboard'] < DB_LATENCY * 1000 / 2, p99
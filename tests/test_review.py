@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import psycopg2
+
+import bot
+from conftest import add_submission, fetch
+
+REVIEWERS = 6
+STORIES = 40
+SCORES = {'authenticity': 5, 'emotional': 4, 'lesson': 3, 'detail': 2, 'storytelling': 1}
+
+
+def run_threads(count, target):
+    errors = []
+
+    def wrapped(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapped, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_reviewers_never_score_the_same_story(db):
+    ids = [add_submission(user_id=100 + i) for i in range(STORIES)]
+    scoring = Counter()
+    overlaps = []
+    approved = Counter()
+    lock = threading.Lock()
+
+    # Each simulated reviewer walks the queue from the start, claiming what
+    # it can and scoring it, like several admins working Saturday's backlog
+    def reviewer(i):
+        reviewer_id = 1000 + i
+        after = ('1970-01-01', 0)
+        while True:
+            page = bot.get_pending_page(after[0], after[1], 5, [], reviewer_id)
+            if not page:
+                return
+            for row in page:
+                after = (row['submitted_at'], row['id'])
+                if not bot.claim_submission(row['id'], reviewer_id):
+                    continue
+                with lock:
+                    scoring[row['id']] += 1
+                    if scoring[row['id']] > 1:
+                        overlaps.append(row['id'])
+                time.sleep(0.002)
+                with lock:
+                    scoring[row['id']] -= 1
+                if bot.approve_submission(row['id'], SCORES, reviewer_id) is not None:
+                    with lock:
+                        approved[row['id']] += 1
+
+    run_threads(REVIEWERS, reviewer)
+
+    assert overlaps == []
+    assert approved == Counter({i: 1 for i in ids})
+    rows = fetch(db, "SELECT status, reviewed_by FROM submissions")
+    assert {r['status'] for r in rows} == {'approved'}
+    # The work was actually shared out
+    assert len({r['reviewed_by'] for r in rows}) > 1
+
+
+def test_only_one_of_many_simultaneous_claims_wins(db):
+    submission_id = add_submission()
+    barrier = threading.Barrier(REVIEWERS)
+    claims = {}
+
+    def reviewer(i):
+        barrier.wait()
+        claims[1000 + i] = bot.claim_submission(submission_id, 1000 + i)
+
+    run_threads(REVIEWERS, reviewer)
+
+    winners = [r for r, won in claims.items() if won]
+    assert len(winners) == 1
+    losers = [r for r in claims if r not in winners]
+    # Nobody else can score it while the lease holds, the holder can
+    assert all(bot.approve_submission(submission_id, SCORES, r) is None for r in losers)
+    assert bot.approve_submission(submission_id, SCORES, winners[0]) == 100
+
+
+def test_expired_lease_can_be_taken_over(db):
+    submission_id = add_submission()
+    assert bot.claim_submission(submission_id, 1000, lease=-1)
+    assert bot.claim_submission(submission_id, 1001)
+    assert not bot.claim_submission(submission_id, 1000)
+
+
+def pending_story():
+    bot.ensure_user(100, 'user100')
+    return add_submission()
+
+
+def ledger(db):
+    return fetch(db, 'SELECT action, amount FROM moondust_ledger ORDER BY id')
+
+
+def balance(db):
+    return fetch(db, 'SELECT total_moondust FROM users WHERE telegram_id = 100')[0]['total_moondust']
+
+
+def test_concurrent_duplicate_approvals_credit_once(db):
+    submission_id = pending_story()
+    barrier = threading.Barrier(REVIEWERS)
+    results = []
+
+    def tap(i):
+        barrier.wait()
+        results.append(bot.approve_submission(submission_id, SCORES, bot.ADMIN_ID))
+
+    run_threads(REVIEWERS, tap)
+
+    assert sorted(results, key=str) == [100] + [None] * (REVIEWERS - 1)
+    assert ledger(db) == [{'action': 'award', 'amount': 15}]
+    assert balance(db) == 15
+
+
+def test_concurrent_duplicate_undos_revoke_once(db):
+    submission_id = pending_story()
+    assert bot.approve_submission(submission_id, SCORES, bot.ADMIN_ID) == 100
+    barrier = threading.Barrier(REVIEWERS)
+
+    def undo(i):
+        barrier.wait()
+        bot.undo_submission(submission_id, bot.ADMIN_ID)
+
+    run_threads(REVIEWERS, undo)
+
+    assert ledger(db) == [{'action': 'award', 'amount': 15}, {'action': 'revoke', 'amount': -15}]
+    assert balance(db) == 0
+
+
+class FakeQuery:
+    def __init__(self, data, reviewer_id=bot.ADMIN_ID):
+        self.data = data
+        self.from_user = SimpleNamespace(id=reviewer_id)
+        self.message = SimpleNamespace(text='Story #1')
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_double_tapped_confirm_credits_once(db, monkeypatch):
+    submission_id = pending_story()
+    sent = []
+    monkeypatch.setattr(bot.OUTBOX, 'send', lambda user_id, text, **kwargs: sent.append(user_id))
+
+    async def no_next_review(context, reviewer_id):
+        pass
+
+    monkeypatch.setattr(bot, 'send_next_review', no_next_review)
+    # Both taps see the same scoring state, as when the second callback
+    # arrives before the first has finished saving
+    context = SimpleNamespace(user_data={
+        'scoring_submission': submission_id, 'scores': dict(SCORES), 'current_criteria': len(bot.CRITERIA) - 1,
+    })
+    confirm = bot.encode_callback('scoring', 'confirm')
+    queries = [FakeQuery(confirm) for _ in range(2)]
+
+    async def double_tap():
+        await asyncio.gather(*(
+            bot.handle_scoring(SimpleNamespace(callback_query=q), context) for q in queries
+        ))
+
+    asyncio.run(double_tap())
+
+    assert ledger(db) == [{'action': 'award', 'amount': 15}]
+    assert balance(db) == 15
+    assert sent == [100]
+    # The other tap either reports the story as already approved or, if it
+    # found scoring already finished, leaves the message alone
+    edits = [text for q in queries for text in q.edits]
+    assert sum('APPROVED' in text for text in edits) == 1
+    assert all('APPROVED' in text or 'Already approved' in text for text in edits), edits
+
+
+def test_queue_comes_back_for_stories_released_behind_its_cursor(db):
+    first, second, third = (add_submission(user_id=100 + i) for i in range(3))
+    other = bot.ADMIN_ID + 1
+    assert bot.claim_submission(first, other)
+
+    async def walk():
+        queue = bot.ReviewQueue(bot.ADMIN_ID)
+        seen = []
+        while (sub := await queue.next()) is not None:
+            seen.append(sub['id'])
+            await bot.run_db(bot.approve_submission, sub['id'], SCORES, bot.ADMIN_ID)
+            if sub['id'] == second:
+                # The other reviewer gives up on the first story after the
+                # cursor has already gone past it
+                await bot.run_db(bot.release_claim, first, other)
+        return seen
+
+    assert asyncio.run(walk()) == [second, third, first]
+
+
+def scoring_context(submission_id, claimed_at):
+    return SimpleNamespace(user_data={
+        'scoring_submission': submission_id, 'claimed_at': claimed_at, 'scores': {}, 'current_criteria': 0,
+    })
+
+
+def tap_score(context, reviewer_id=bot.ADMIN_ID):
+    query = FakeQuery(bot.encode_callback('score', bot.CRITERIA[0], 1000), reviewer_id)
+    asyncio.run(bot.handle_scoring(SimpleNamespace(callback_query=query), context))
+    return query
+
+
+def test_score_taps_keep_the_lease_alive(db):
+    submission_id = pending_story()
+    assert bot.claim_submission(submission_id, bot.ADMIN_ID, lease=-1)
+    # Half the lease is gone by the reviewer's clock; the tap renews it
+    context = scoring_context(submission_id, time.time() - bot.REVIEW_LEASE_SECONDS)
+    tap_score(context)
+
+    assert context.user_data['current_criteria'] == 1
+    assert time.time() - context.user_data['claimed_at'] < 5
+    assert not bot.claim_submission(submission_id, bot.ADMIN_ID + 1)
+
+
+def test_renewal_blocked_by_the_reviewers_own_twin_tap_keeps_scoring(db):
+    submission_id = pending_story()
+    assert bot.claim_submission(submission_id, bot.ADMIN_ID)
+    # The other tap of a double tap is mid-renewal, holding the row lock,
+    # so this tap's claim skips the row
+    twin = psycopg2.connect(db)
+    try:
+        twin.cursor().execute('SELECT id FROM submissions WHERE id = %s FOR UPDATE', (submission_id,))
+        context = scoring_context(submission_id, time.time() - bot.REVIEW_LEASE_SECONDS)
+        query = tap_score(context)
+    finally:
+        twin.close()
+
+    assert query.edits and 'Score not saved' not in query.edits[0]
+    assert context.user_data['scoring_submission'] == submission_id
+    assert context.user_data['current_criteria'] == 1
+
+
+def test_score_tap_after_the_lease_was_taken_over_stops_scoring(db, monkeypatch):
+    async def no_next_review(context, reviewer_id):
+        pass
+
+    monkeypatch.setattr(bot, 'send_next_review', no_next_review)
+    submission_id = pending_story()
+    assert bot.claim_submission(submission_id, bot.ADMIN_ID, lease=-1)
+    assert bot.claim_submission(submission_id, bot.ADMIN_ID + 1)
+    context = scoring_context(submission_id, time.time() - bot.REVIEW_LEASE_SECONDS)
+    query = tap_score(context)
+
+    assert query.edits == [f'Story #{submission_id}: 🔒 Claimed by reviewer {bot.ADMIN_ID + 1}. Score not saved.']
+    assert 'scoring_submission' not in context.user_data
+
+
+def test_rejecting_a_reviewed_story_says_what_happened_to_it(db, monkeypatch):
+    async def no_next_review(context, reviewer_id):
+        pass
+
+    monkeypatch.setattr(bot, 'send_next_review', no_next_review)
+    approved, rejected = pending_story(), add_submission(user_id=101)
+    assert bot.approve_submission(approved, SCORES, bot.ADMIN_ID + 1) == 100
+    assert bot.reject_submission(rejected, 'Spam', bot.ADMIN_ID + 2) == 101
+
+    edits = []
+    for submission_id in (approved, rejected):
+        query = FakeQuery(bot.encode_callback('reject', next(iter(bot.REJECTION_REASONS)), submission_id))
+        asyncio.run(bot.handle_rejection(SimpleNamespace(callback_query=query), SimpleNamespace(user_data={})))
+        edits += query.edits
+
+    assert edits == [
+        f'Story #1\n\n✅ Already approved by {bot.ADMIN_ID + 1}',
+        f'Story #1\n\n❌ Already rejected by {bot.ADMIN_ID + 2}',
+    ]
@@ -0,0 +1,115 @@
+import asyncio
+import random
+
+import bot
+from conftest import add_submission
+
+WORDS = [f'w{i}' for i in range(400)]
+STORIES = 1000
+
+
+def stories(count, seed=21):
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        if out and rng.random() < 0.2:
+            # A copy of an earlier story with a few words changed
+            words = rng.choice(out).split()
+            for _ in range(rng.randrange(1, 6)):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            out.append(' '.join(words))
+        else:
+            out.append(' '.join(rng.choice(WORDS) for _ in range(rng.randrange(20, 120))))
+    return out
+
+
+def brute_force(sigs, sig, before):
+    matches = []
+    for other, (user_id, other_sig) in sigs.items():
+        score = sum(map(int.__eq__, sig, other_sig)) / bot.MINHASH_BINS
+        if other < before and score >= bot.SIMILAR_THRESHOLD:
+            matches.append((score, other, user_id))
+    matches.sort(key=lambda m: (-m[0], m[1]))
+    return [(other, score, user_id) for score, other, user_id in matches[:bot.SIMILAR_MAX_SHOWN]]
+
+
+def test_index_finds_what_a_full_scan_finds():
+    # Unsized, so the bucket table is re-chained several times on the way
+    index = bot.StoryIndex()
+    sigs = {}
+    flagged = 0
+    for i, story in enumerate(stories(STORIES)):
+        submission_id, user_id = i + 1, 10_000 + i % 300
+        sig = bot.story_signature(story)
+        expected = brute_force(sigs, sig, submission_id)
+        assert index.add(submission_id, user_id, story) == expected
+        flagged += bool(expected)
+        sigs[submission_id] = (user_id, sig)
+
+    assert len(index) == STORIES
+    assert flagged > STORIES // 10
+    assert len(index._heads) > 1024
+    for submission_id in (1, STORIES // 2, STORIES):
+        user_id, sig = sigs[submission_id]
+        assert index.owner(submission_id) == user_id
+        assert index.similar_to(submission_id) == brute_force(sigs, sig, submission_id)
+
+
+def test_out_of_order_and_repeated_ids():
+    index = bot.StoryIndex()
+    story = ' '.join(WORDS[:60])
+    index.add(5, 500, story)
+    index.add(3, 300, story)
+    # A second add of the same id is ignored
+    index.add(3, 999, 'something else entirely different words here')
+
+    assert len(index) == 2
+    assert index.owner(3) == 300
+    assert index.similar_to(5) == [(3, 1.0, 300)]
+    assert index.similar_to(3) == []
+    assert index.owner(4) is None and index.similar_to(4) == []
+
+
+def test_replace_keeps_stories_added_during_a_rebuild():
+    live = bot.StoryIndex()
+    live.add(1, 100, ' '.join(WORDS[:50]))
+    live.journal = []
+    live.add(2, 200, ' '.join(WORDS[:50]))
+    rebuilt = bot.StoryIndex()
+    rebuilt.add(1, 100, ' '.join(WORDS[:50]))
+    live.replace(rebuilt)
+
+    assert len(live) == 2 and live.journal is None
+    assert live.similar_to(2) == [(1, 1.0, 100)]
+
+
+def test_rebuild_hashes_with_no_connection_held(db, monkeypatch):
+    texts = stories(60, seed=22)
+    for i, story in enumerate(texts):
+        add_submission(user_id=100 + i, story=story)
+    monkeypatch.setattr(bot, 'STORY_INDEX_CHUNK', 25)
+    held = []
+    signature = bot.story_signature
+
+    def watched(story):
+        held.append(bot.DB_POOL._size - len(bot.DB_POOL._idle))
+        return signature(story)
+
+    monkeypatch.setattr(bot, 'story_signature', watched)
+    live = bot.StoryIndex()
+    monkeypatch.setattr(bot, 'STORY_INDEX', live)
+
+    class Message:
+        def __init__(self):
+            self.replies = []
+
+        async def reply_text(self, text):
+            self.replies.append(text)
+
+    message = Message()
+    update = type('Update', (), {'effective_user': type('User', (), {'id': bot.ADMIN_ID}), 'message': message})
+    asyncio.run(bot.admin_reindex(update, None))
+
+    assert len(live) == len(texts)
+    assert held == [0] * len(texts)
+    assert message.replies[-1].startswith(f'✅ Story index rebuilt: {len(texts)} stories')
@@ -0,0 +1,77 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+import bot
+
+USERS = 8
+PER_USER = 20
+HANDLER_TIME = 0.01
+
+
+def make_update(update_id, user_id, text):
+    user = User(user_id, f'user{user_id}', False)
+    chat = Chat(user_id, Chat.PRIVATE)
+    message = Message(update_id, datetime.now(timezone.utc), chat, from_user=user, text=text)
+    return Update(update_id, message=message)
+
+
+async def replay(processor, handler_time):
+    seen = {}
+    peak = 0
+
+    async def handle(user_id, seq):
+        nonlocal peak
+        peak = max(peak, processor.active)
+        # Uneven handler times, so a later update would overtake an
+        # earlier one for the same user if nothing kept them in order
+        await asyncio.sleep(random.uniform(0, 2 * handler_time))
+        seen.setdefault(user_id, []).append(seq)
+
+    # Round-robin across users, the way a busy Friday interleaves them
+    tasks = []
+    update_id = 0
+    for seq in range(PER_USER):
+        for user_id in range(1, USERS + 1):
+            update_id += 1
+            update = make_update(update_id, user_id, f'message {seq}')
+            tasks.append(asyncio.create_task(processor.process_update(update, handle(user_id, seq))))
+            # Let the task reach its lock, as PTB's fetch loop would
+            await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return seen, peak, time.perf_counter() - start
+
+
+def test_interleaved_updates_keep_per_user_order():
+    random.seed(9)
+    processor = bot.PerUserUpdateProcessor(max_concurrent_updates=USERS, backlog=USERS * PER_USER)
+    seen, peak, _ = asyncio.run(replay(processor, HANDLER_TIME))
+
+    assert seen == {user_id: list(range(PER_USER)) for user_id in range(1, USERS + 1)}
+    # Never two updates from one user at once, but users did run side by side
+    assert 1 < peak <= USERS
+    assert processor.queued_users() == 0
+
+
+def test_users_are_processed_concurrently():
+    random.seed(9)
+    processor = bot.PerUserUpdateProcessor(max_concurrent_updates=USERS, backlog=USERS * PER_USER)
+    _, _, elapsed = asyncio.run(replay(processor, HANDLER_TIME))
+
+    # One at a time this would take USERS * PER_USER * HANDLER_TIME (1.6s);
+    # with every user's chain running in parallel it's about one chain's worth
+    serial = USERS * PER_USER * HANDLER_TIME
+    assert elapsed < serial / 3, f'{USERS * PER_USER / elapsed:.0f} updates/s'
+
+
+def test_concurrency_limit_caps_parallel_users():
+    random.seed(9)
+    processor = bot.PerUserUpdateProcessor(max_concurrent_updates=2, backlog=USERS * PER_USER)
+    seen, peak, _ = asyncio.run(replay(processor, 0.001))
+
+    assert all(seqs == list(range(PER_USER)) for seqs in seen.values())
+    assert peak <= 2
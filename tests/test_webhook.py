@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+
+import bot
+from conftest import fetch
+from replay import free_port, running_bot, webhook_rush
+
+USERS = 10
+SECRET = 'test-secret'
+
+
+def test_webhook_rush_lands_every_submission(db):
+    async def rush():
+        async with running_bot(db) as replay:
+            return await webhook_rush(replay, 30_000, USERS, SECRET)
+
+    result = asyncio.run(rush())
+
+    assert result['updates'] == USERS * 7
+    assert result['post_p50_ms'] <= result['post_p99_ms']
+    rows = fetch(db, 'SELECT user_id, status FROM submissions ORDER BY user_id')
+    assert rows == [{'user_id': 30_000 + i, 'status': 'pending'} for i in range(USERS)]
+
+
+def test_webhook_checks_secret_and_refuses_after_stop(db, monkeypatch):
+    monkeypatch.setattr(bot, 'WEBHOOK_URL', 'https://bot.example')
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', SECRET)
+    monkeypatch.setattr(bot, 'PORT', free_port())
+
+    async def exchange():
+        async with running_bot(db) as replay:
+            update = replay.message_update(30_100, '/start')
+            await bot.start_http_server(replay.app)
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{bot.PORT}') as client:
+                secret = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+                codes = {
+                    'health': (await client.get('/health')).status_code,
+                    'ready': (await client.get('/ready')).status_code,
+                    'no secret': (await client.post(bot.WEBHOOK_PATH, json=update)).status_code,
+                    'wrong secret': (await client.post(
+                        bot.WEBHOOK_PATH, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': 'nope'}
+                    )).status_code,
+                    'get': (await client.get(bot.WEBHOOK_PATH, headers=secret)).status_code,
+                    'bad body': (await client.post(bot.WEBHOOK_PATH, content=b'{', headers=secret)).status_code,
+                    'update': (await client.post(bot.WEBHOOK_PATH, json=update, headers=secret)).status_code,
+                }
+                # Telegram only retries what wasn't acknowledged, so once
+                # stopping nothing may be accepted and then dropped
+                await bot.stop_http_server(replay.app)
+                try:
+                    response = await client.post(bot.WEBHOOK_PATH, json=update, headers=secret)
+                    codes['after stop'] = response.status_code
+                except httpx.TransportError:
+                    codes['after stop'] = None
+            for _ in range(200):
+                if 30_100 in replay.api.screens:
+                    break
+                await asyncio.sleep(0.01)
+            return codes, replay.api.screens.get(30_100)
+
+    codes, screen = asyncio.run(exchange())
+
+    assert codes.pop('after stop') in (503, None)
+    assert codes == {
+        'health': 200, 'ready': 200, 'no secret': 403, 'wrong secret': 403,
+        'get': 405, 'bad body': 400, 'update': 200,
+    }
+    assert screen is not None and '📉 REKT Story' in screen['buttons']
@@ -0,0 +1,145 @@
+import uuid
+from datetime import datetime
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import bot
+from conftest import _admin, add_submission, dsn_for, fetch
+
+
+def test_calendar_keys_week_53_and_the_year_rollover():
+    calendar = bot.CompetitionCalendar()
+    # 2026 has an ISO week 53; its week opens Sunday 27 December
+    week = calendar.at(datetime(2026, 12, 27, 0, 0))
+    assert week.key == bot.Week(2026, 53)
+    assert (week.opens_at, week.closes_at) == (datetime(2026, 12, 27), datetime(2027, 1, 2))
+    assert calendar.at(datetime(2027, 1, 1, 23, 59)).key == bot.Week(2026, 53)
+    # Saturday review day still belongs to it, Sunday opens 2027's week 1
+    assert calendar.at(datetime(2027, 1, 2, 12, 0)).key == bot.Week(2026, 53)
+    assert calendar.at(datetime(2027, 1, 3, 0, 0)).key == bot.Week(2027, 1)
+    # The Sunday before 2026's first Monday is already 2026's week 1
+    assert calendar.at(datetime(2025, 12, 28, 9, 0)).key == bot.Week(2026, 1)
+    assert calendar.at(datetime(2025, 12, 27, 9, 0)).key == bot.Week(2025, 52)
+
+
+def partition_of(db, submission_id):
+    return fetch(db, 'SELECT tableoid::regclass::text AS part FROM submissions WHERE id = %s', (submission_id,))[0]['part']
+
+
+def test_week_53_and_the_next_years_weeks_get_their_own_partitions(db):
+    ids = {week: add_submission(week=week) for week in (bot.Week(2026, 53), bot.Week(2027, 1), bot.Week(2027, 5))}
+    assert {week: partition_of(db, i) for week, i in ids.items()} == {
+        bot.Week(2026, 53): 'submissions_2026_w53',
+        bot.Week(2027, 1): 'submissions_2027_w01',
+        bot.Week(2027, 5): 'submissions_2027_w05',
+    }
+
+
+def test_same_week_number_in_two_years_gets_two_champions(db):
+    for week in (bot.Week(2026, 5), bot.Week(2027, 5)):
+        submission_id = add_submission(week=week)
+        assert bot.approve_submission(submission_id, {'authenticity': 1000}, bot.ADMIN_ID) == 100
+        winner, existing = bot.set_week_champion(week)
+        assert winner['id'] == submission_id and existing is None
+    assert [(r['week_year'], r['week_number']) for r in fetch(db, 'SELECT * FROM champions ORDER BY id')] == [
+        (2026, 5), (2027, 5)
+    ]
+
+
+def test_inserts_leave_stray_rows_in_default_until_the_job_adopts_them(db):
+    week = bot.Week(2026, 20)
+    stray = add_submission(week=week)
+    # As if the week's partition had been dropped with a row left behind
+    conn = psycopg2.connect(db)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('ALTER TABLE submissions DETACH PARTITION submissions_2026_w20')
+        cursor.execute('INSERT INTO submissions_default SELECT * FROM submissions_2026_w20')
+        cursor.execute('DROP TABLE submissions_2026_w20')
+        conn.commit()
+    finally:
+        conn.close()
+    bot.WEEK_PARTITIONS.clear()
+
+    new = add_submission(week=week)
+    assert partition_of(db, new) == partition_of(db, stray) == 'submissions_default'
+    assert week not in bot.WEEK_PARTITIONS
+
+    bot.ensure_week_partitions()
+    assert partition_of(db, new) == partition_of(db, stray) == 'submissions_2026_w20'
+    assert fetch(db, 'SELECT COUNT(*) AS n FROM submissions_default')[0]['n'] == 0
+    assert week in bot.WEEK_PARTITIONS
+    assert partition_of(db, add_submission(week=week)) == 'submissions_2026_w20'
+
+
+@pytest.fixture
+def v10_db(postgres_server):
+    name = f'rekterapy_v10_{uuid.uuid4().hex[:8]}'
+    _admin(postgres_server, f"CREATE DATABASE {name} TEMPLATE template0 ENCODING 'UTF8' LC_COLLATE 'C' LC_CTYPE 'C'")
+    conn = psycopg2.connect(dsn_for(postgres_server, name), cursor_factory=RealDictCursor)
+    # Far from UTC, so a backfill that ignored the time zone would misfile
+    # the rows near midnight
+    conn.cursor().execute("SET TIME ZONE 'Asia/Tokyo'")
+    conn.commit()
+    try:
+        bot.run_migrations(conn, [m for m in bot.MIGRATIONS if m[0] <= 10])
+        yield conn
+    finally:
+        conn.close()
+        _admin(postgres_server, f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+def test_migration_backfills_weeks_of_a_populated_v10_schema(v10_db):
+    cursor = v10_db.cursor()
+    # (local submitted_at, week_number the bot filed it under), Tokyo time
+    rows = [
+        ('2026-12-31 10:00', 53),
+        ('2027-01-01 10:00', 53),
+        # Monday 05:00 in Tokyo is still Sunday in UTC, week 53
+        ('2027-01-04 05:00', 53),
+        ('2027-01-04 10:00', 1),
+        ('2025-12-29 10:00', 1),
+        # Filed before week numbers were stored
+        ('2027-01-04 05:00', None),
+        ('2026-06-01 12:00', None),
+    ]
+    ids = []
+    for submitted_at, week_number in rows:
+        cursor.execute('''
+            INSERT INTO submissions (user_id, story_type, wallet_address, story, week_number, submitted_at)
+            VALUES (100, 'rekt', '0xab', 'story', %s, %s) RETURNING id
+        ''', (week_number, submitted_at))
+        ids.append(cursor.fetchone()['id'])
+    champions = [
+        # Its story's week decides, not the January announcement
+        (53, ids[1], '2027-01-09 12:00'),
+        (1, None, '2027-01-09 12:00'),
+        (52, None, '2027-01-05 12:00'),
+    ]
+    for week_number, submission_id, announced_at in champions:
+        cursor.execute(
+            'INSERT INTO champions (week_number, user_id, submission_id, announced_at) VALUES (%s, 100, %s, %s)',
+            (week_number, submission_id, announced_at)
+        )
+    v10_db.commit()
+
+    bot.run_migrations(v10_db)
+
+    cursor.execute('SELECT id, week_year, week_number, tableoid::regclass::text AS part FROM submissions ORDER BY id')
+    migrated = cursor.fetchall()
+    assert [r['id'] for r in migrated] == ids
+    assert [(r['week_year'], r['week_number']) for r in migrated] == [
+        (2026, 53), (2026, 53), (2026, 53), (2027, 1), (2026, 1), (2026, 53), (2026, 23),
+    ]
+    assert all(r['part'] == bot.week_partition_name(bot.Week(r['week_year'], r['week_number'])) for r in migrated)
+    cursor.execute('SELECT week_year, week_number FROM champions ORDER BY id')
+    assert [(r['week_year'], r['week_number']) for r in cursor.fetchall()] == [(2026, 53), (2027, 1), (2026, 52)]
+    # The sequence carries on past the copied ids
+    cursor.execute('''
+        INSERT INTO submissions (user_id, story_type, wallet_address, week_year, week_number)
+        VALUES (100, 'rekt', '0xab', 2027, 1) RETURNING id
+    ''')
+    assert cursor.fetchone()['id'] == ids[-1] + 1
+    v10_db.rollback()